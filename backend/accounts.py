@@ -0,0 +1,180 @@
+"""Bot state of every account with an active trading bot, as arrays.
+
+Each row of the book is one account, with four parts:
+
+- its bot settings, as a row of the ``settings`` matrix (columns SETTINGS);
+- its wallet balance;
+- its bot trades today;
+- its open positions, as a row of the ``quantity`` and ``avg_price`` matrices,
+  with one column per symbol.
+
+For each symbol and tick, ``orders`` applies the bot rules of execute_bot_trade
+to all accounts at once with array operations, against the one signal and
+price of that symbol. It applies the resulting fills to the book and returns
+them for the caller to write to the ledger in one batch. The cost of a tick is
+a few vector operations over the accounts, plus the fills, not a database
+round trip per account.
+
+The database stays the source of truth. The book is loaded from it, and an
+account whose wallet, positions or settings changed outside the bot is
+reloaded before the next evaluation (``invalidate``). The whole book is
+reloaded every MAX_AGE seconds, which picks up changes made by other
+processes, such as ``sweep.py apply``.
+"""
+import time
+import threading
+
+import numpy as np
+
+SETTINGS = ('max_investment_per_trade', 'profit_target_percentage', 'stop_loss_percentage',
+            'max_trades_per_day', 'max_open_positions')
+MAX_INVESTMENT, PROFIT_TARGET, STOP_LOSS, MAX_TRADES, MAX_OPEN = range(len(SETTINGS))
+
+# Sell reasons, in the order execute_bot_trade checks them
+SELL_SIGNAL, PROFIT_TAKEN, STOP_LOSS_HIT = range(3)
+MAX_AGE = 60.0
+
+
+class Orders:
+    """Fills of one symbol at one price, one entry per account that traded.
+
+    reason is -1 for buys and one of the sell reasons for sells; balance is the
+    account's wallet balance after the fill.
+    """
+    __slots__ = ('accounts', 'buy', 'quantity', 'reason', 'balance', 'settings')
+
+    def __init__(self, accounts, buy, quantity, reason, balance, settings):
+        self.accounts = accounts
+        self.buy = buy
+        self.quantity = quantity
+        self.reason = reason
+        self.balance = balance
+        self.settings = settings
+
+    def __len__(self):
+        return len(self.accounts)
+
+
+class AccountBook:
+    """Settings, balances, trade counts and positions of the accounts with an active bot."""
+
+    def __init__(self, max_age=MAX_AGE, clock=time.monotonic):
+        self.max_age = max_age
+        self.clock = clock
+        self.loaded_at = None
+        self.accounts = []
+        self._rows = {}
+        self.settings = np.empty((0, len(SETTINGS)))
+        self.balance = np.empty(0)
+        self.trades_today = np.empty(0, dtype=np.int64)
+        self.open_positions = np.empty(0, dtype=np.int64)
+        self.symbols = {}
+        self.quantity = np.empty((0, 0), dtype=np.int64)
+        self.avg_price = np.empty((0, 0))
+        self.day = None
+        self.loaded = False
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def invalidate(self, account_id=None):
+        """Reload an account (or, without one, the whole book) before the next evaluation."""
+        with self._lock:
+            if account_id is None:
+                self.loaded = False
+            else:
+                self._stale.add(account_id)
+
+    def take_stale(self):
+        """Accounts to reload, or None when the whole book needs loading."""
+        with self._lock:
+            stale, self._stale = self._stale, set()
+            if not self.loaded or self.clock() - self.loaded_at >= self.max_age:
+                return None
+            return stale
+
+    def _column(self, symbol):
+        column = self.symbols.get(symbol)
+        if column is None:
+            column = self.symbols[symbol] = len(self.symbols)
+            if column >= self.quantity.shape[1]:
+                # Grow in steps, not one column per new symbol
+                extra = max(16, self.quantity.shape[1])
+                self.quantity = np.pad(self.quantity, ((0, 0), (0, extra)))
+                self.avg_price = np.pad(self.avg_price, ((0, 0), (0, extra)))
+        return column
+
+    def load(self, accounts, positions, trades_today, day, only=None):
+        """Replace the given accounts (all of them if only is None) with freshly read rows.
+
+        accounts holds (account_id, settings tuple, balance) for accounts with an
+        active bot, positions (account_id, symbol, quantity, average price), and
+        trades_today maps account_id to bot trades made on day.
+        """
+        if only is None:
+            keep = np.zeros(len(self.accounts), dtype=bool)
+            self.day = day
+            self.loaded_at = self.clock()
+        else:
+            keep = np.array([account_id not in only for account_id in self.accounts], dtype=bool)
+        self.accounts = [account_id for account_id, kept in zip(self.accounts, keep) if kept]
+        count = len(accounts)
+        self.settings = np.vstack([self.settings[keep], np.array([row[1] for row in accounts], dtype=float)
+                                   .reshape(count, len(SETTINGS))])
+        self.balance = np.concatenate([self.balance[keep], [row[2] for row in accounts]])
+        self.trades_today = np.concatenate([self.trades_today[keep],
+                                            [trades_today.get(row[0], 0) for row in accounts]]).astype(np.int64)
+        self.quantity = np.vstack([self.quantity[keep], np.zeros((count, self.quantity.shape[1]), dtype=np.int64)])
+        self.avg_price = np.vstack([self.avg_price[keep], np.zeros((count, self.avg_price.shape[1]))])
+        self.accounts += [row[0] for row in accounts]
+        self._rows = {account_id: row for row, account_id in enumerate(self.accounts)}
+
+        for account_id, symbol, quantity, price in positions:
+            row = self._rows.get(account_id)
+            if row is not None and quantity > 0:
+                column = self._column(symbol)
+                self.quantity[row, column] = quantity
+                self.avg_price[row, column] = price
+        self.open_positions = (self.quantity > 0).sum(axis=1)
+        self.loaded = True
+
+    def orders(self, symbol, signal, price, day):
+        """Apply the bot rules of every account to a symbol's signal and price; returns the fills, or None."""
+        if day != self.day:
+            self.trades_today[:] = 0
+            self.day = day
+        column = self._column(symbol)
+        quantity = self.quantity[:, column]
+        cost = self.avg_price[:, column]
+        settings = self.settings
+        held = quantity > 0
+        can_trade = self.trades_today < settings[:, MAX_TRADES]
+
+        if signal == 'Buy':
+            budget = np.minimum(settings[:, MAX_INVESTMENT], self.balance)
+            buy_quantity = np.floor(budget / price).astype(np.int64)
+            buy = can_trade & ~held & (self.open_positions < settings[:, MAX_OPEN]) & (buy_quantity > 0)
+        else:
+            buy_quantity = np.zeros(len(self.accounts), dtype=np.int64)
+            buy = np.zeros(len(self.accounts), dtype=bool)
+
+        # A held symbol is sold on a Sell signal, or at the profit target or the stop loss whatever the signal
+        profit = price >= cost * (1 + settings[:, PROFIT_TARGET] / 100)
+        stop = price <= cost * (1 - settings[:, STOP_LOSS] / 100)
+        sell = can_trade & held & ((signal == 'Sell') | profit | stop)
+        reason = np.where(signal == 'Sell', SELL_SIGNAL, np.where(profit, PROFIT_TAKEN, STOP_LOSS_HIT))
+
+        rows = np.flatnonzero(buy | sell)
+        if not len(rows):
+            return None
+        is_buy = buy[rows]
+        filled = np.where(is_buy, buy_quantity[rows], quantity[rows])
+        self.balance[rows] += np.where(is_buy, -filled * price, filled * price)
+        self.quantity[rows, column] = np.where(is_buy, filled, 0)
+        self.avg_price[rows, column] = np.where(is_buy, price, 0.0)
+        self.open_positions[rows] += np.where(is_buy, 1, -1)
+        self.trades_today[rows] += 1
+        return Orders([self.accounts[row] for row in rows], is_buy, filled, np.where(is_buy, -1, reason[rows]),
+                      self.balance[rows], settings[rows])
@@ -1,34 +1,82 @@
-from flask import Flask, jsonify, request, send_from_directory
-from flask_socketio import SocketIO
+from flask import Flask, jsonify, request, g, Response
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, inspect, text, update, bindparam, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
 from flask_cors import CORS
 import json
+import logging
 import threading
 import time
-import joblib
 import uuid
+import hmac
+import re
+import functools
+import model_store
+import risk
+import intraday
+import scheduler
+import market_calendar
+import broadcaster
+import metrics
+import logs
+import profiling
+import quotes
+import charts
+import offload
+import market_data
+import wire
+import static_assets
+import warmup
+import accounts
+import orders
+from metrics import STAGE_SECONDS, TICK_SECONDS, CACHE_LOOKUPS
+from indicators import (calculate_technical_indicators, calculate_adx, compute_indicators,
+                        RULE_FEATURES, MARKET_FEATURES)
 
-app = Flask(__name__, static_folder='static', static_url_path='')
+# The React build under static/ is served by serve_react_app, not by Flask's static route
+app = Flask(__name__, static_folder=None)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app, cors_allowed_origins="*")
+# threading (default) serves with Werkzeug and a thread per connection; server.py sets ASYNC_MODE=gevent
+ASYNC_MODE = os.getenv('ASYNC_MODE', 'threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
+offload.configure(ASYNC_MODE, int(os.getenv('OFFLOAD_THREADS', offload.THREADS)))
+if offload.active():
+    # yfinance runs on the download thread, which must not queue log records, and logs outside the trader loggers.
+    # Its failures come back as empty frames, which the loop logs.
+    logging.getLogger('yfinance').setLevel(logging.CRITICAL + 1)
+# Emits from the update threads, which in gevent mode are handed to the event loop
+loop_socketio = offload.LoopEmitter(socketio)
 CORS(app)
 load_dotenv()
+logs.configure()
+predict_log = logs.get_logger('predict')
+trade_log = logs.get_logger('trade')
+update_log = logs.get_logger('update')
 Base = declarative_base()
 engine = create_engine('sqlite:///data.db')
 Session = sessionmaker(bind=engine)
 
+# Every row belongs to one paper-trading account; rows from before accounts existed belong to the default one
+DEFAULT_ACCOUNT = 'default'
+ACCOUNT_ID = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+def account_column(unique=False):
+    return Column(String, nullable=False, default=DEFAULT_ACCOUNT, server_default=DEFAULT_ACCOUNT,
+                  index=True, unique=unique)
+
 
 class Portfolio(Base):
     __tablename__ = 'portfolio'
     id = Column(Integer, primary_key=True)
+    account_id = account_column()
     symbol = Column(String)
     quantity = Column(Integer)
     buy_price = Column(Float)
@@ -38,12 +86,14 @@ class Portfolio(Base):
 class Wallet(Base):
     __tablename__ = 'wallet'
     id = Column(Integer, primary_key=True)
+    account_id = account_column(unique=True)
     balance = Column(Float, default=0.0)
     
 
 class Transaction(Base):
     __tablename__ = 'transactions'
     id = Column(Integer, primary_key=True)
+    account_id = account_column()
     transaction_id = Column(String, unique=True)
     type = Column(String)  # 'deposit', 'withdrawal', 'buy', 'sell'
     amount = Column(Float)
@@ -57,6 +107,7 @@ class Transaction(Base):
 class TradingBot(Base):
     __tablename__ = 'trading_bot'
     id = Column(Integer, primary_key=True)
+    account_id = account_column(unique=True)
     is_active = Column(Integer, default=0)  # 0 = inactive, 1 = active
     max_investment_per_trade = Column(Float, default=5000.0)  # Maximum amount to invest in a single trade
     profit_target_percentage = Column(Float, default=5.0)  # Target profit percentage
@@ -66,232 +117,313 @@ class TradingBot(Base):
     last_updated = Column(DateTime, default=datetime.now)
 
 
+class Order(Base):
+    """A resting limit, stop, take-profit or trailing-stop order; see orders.py."""
+    __tablename__ = 'orders'
+    id = Column(Integer, primary_key=True)
+    account_id = account_column()
+    symbol = Column(String, index=True)
+    side = Column(String)  # 'buy' or 'sell'
+    type = Column(String)  # 'limit', 'stop', 'take_profit', 'trailing_stop'
+    quantity = Column(Integer)
+    trigger_price = Column(Float, nullable=True)  # For trailing stops, the stop as of the last checkpoint
+    trail_percent = Column(Float, nullable=True)  # For trailing stops
+    peak_price = Column(Float, nullable=True)  # Best price a trailing stop has seen (high for sells, low for buys)
+    status = Column(String, default='open', index=True)  # 'open', 'filled', 'rejected', 'cancelled'
+    fill_price = Column(Float, nullable=True)
+    note = Column(Text, nullable=True)  # Why a triggered order was rejected
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, nullable=True)
+
+
+def add_account_columns():
+    """Add account_id to tables created before accounts existed; create_all does not alter tables."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for model in (Portfolio, Wallet, Transaction, TradingBot):
+            table = model.__tablename__
+            if 'account_id' in {column['name'] for column in inspector.get_columns(table)}:
+                continue
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN account_id VARCHAR NOT NULL "
+                                    f"DEFAULT '{DEFAULT_ACCOUNT}'"))
+            unique = 'UNIQUE ' if model.__table__.c.account_id.unique else ''
+            connection.execute(text(f"CREATE {unique}INDEX ix_{table}_account_id ON {table} (account_id)"))
+
+
+def ensure_account(session, account_id, create=True):
+    """The account's wallet and trading bot; an account without them gets an empty wallet and an inactive bot.
+
+    Those are only saved with create. Reads pass create=False, so looking at an account does not add it.
+    """
+    wallet = session.query(Wallet).filter_by(account_id=account_id).first()
+    if not wallet:
+        wallet = Wallet(account_id=account_id, balance=0.0)
+        if create:
+            session.add(wallet)
+    bot = session.query(TradingBot).filter_by(account_id=account_id).first()
+    if not bot:
+        bot = TradingBot(
+            account_id=account_id,
+            is_active=0,
+            max_investment_per_trade=5000.0,
+            profit_target_percentage=5.0,
+            stop_loss_percentage=3.0,
+            max_trades_per_day=5,
+            max_open_positions=30,
+            last_updated=datetime.now()
+        )
+        if create:
+            session.add(bot)
+    if session.new:
+        session.commit()
+    return wallet, bot
+
+
+def buy_shares(session, wallet, symbol, quantity, price, description, when):
+    """Pay for shares from the wallet and add them as a portfolio lot; raises ValueError without the funds."""
+    total_cost = quantity * price
+    if wallet.balance < total_cost:
+        raise ValueError(f'Insufficient funds in wallet. Required: ₹{total_cost:.2f}, Available: ₹{wallet.balance:.2f}')
+    wallet.balance -= total_cost
+    session.add(Portfolio(account_id=wallet.account_id, symbol=symbol, quantity=quantity, buy_price=price,
+                          buy_date=when))
+    transaction = Transaction(account_id=wallet.account_id, transaction_id=str(uuid.uuid4()), type='buy',
+                              amount=total_cost, symbol=symbol, quantity=quantity, price=price,
+                              description=description, timestamp=when)
+    session.add(transaction)
+    return transaction
+
+
+def sell_shares(session, wallet, symbol, quantity, price, description, when):
+    """Sell shares from the oldest lots into the wallet; raises ValueError if the account holds fewer."""
+    entries = session.query(Portfolio).filter_by(account_id=wallet.account_id, symbol=symbol).order_by(Portfolio.id).all()
+    total_quantity = sum(entry.quantity for entry in entries)
+    if total_quantity < quantity:
+        raise ValueError(f'Insufficient quantity. You have {total_quantity} shares of {symbol}')
+
+    remaining_to_sell = quantity
+    for entry in entries:
+        if remaining_to_sell <= 0:
+            break
+        if entry.quantity <= remaining_to_sell:
+            # Sell all shares in this entry
+            remaining_to_sell -= entry.quantity
+            session.delete(entry)
+        else:
+            # Sell part of the shares in this entry
+            entry.quantity -= remaining_to_sell
+            remaining_to_sell = 0
+
+    total_value = quantity * price
+    wallet.balance += total_value
+    transaction = Transaction(account_id=wallet.account_id, transaction_id=str(uuid.uuid4()), type='sell',
+                              amount=total_value, symbol=symbol, quantity=quantity, price=price,
+                              description=description, timestamp=when)
+    session.add(transaction)
+    return transaction
+
+
 Base.metadata.create_all(engine)
+add_account_columns()
 
-# Initialize wallet and trading bot if they don't exist
+# Initialize wallet and trading bot of the default account if they don't exist
 session = Session()
-wallet = session.query(Wallet).first()
-if not wallet:
-    wallet = Wallet(balance=0.0)
-    session.add(wallet)
-    session.commit()
-
-trading_bot = session.query(TradingBot).first()
-if not trading_bot:
-    trading_bot = TradingBot(
-        is_active=0,
-        max_investment_per_trade=5000.0,
-        profit_target_percentage=5.0,
-        stop_loss_percentage=3.0,
-        max_trades_per_day=5,
-        max_open_positions=30
-    )
-    session.add(trading_bot)
-    session.commit()
+ensure_account(session, DEFAULT_ACCOUNT)
 session.close()
 
 
-def calculate_technical_indicators(data):
-    # Basic Moving Averages
-    data['SMA5'] = data['Close'].rolling(window=5).mean()
-    data['SMA10'] = data['Close'].rolling(window=10).mean()
-    data['SMA20'] = data['Close'].rolling(window=20).mean()
-    data['SMA50'] = data['Close'].rolling(window=50).mean()
-    data['SMA200'] = data['Close'].rolling(window=200).mean()
-    
-    # Exponential Moving Averages
-    data['EMA5'] = data['Close'].ewm(span=5, adjust=False).mean()
-    data['EMA10'] = data['Close'].ewm(span=10, adjust=False).mean()
-    data['EMA20'] = data['Close'].ewm(span=20, adjust=False).mean()
-    
-    # RSI Calculation
-    delta = data['Close'].diff()
-    gain = delta.where(delta > 0, 0).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    data['RSI'] = 100 - (100 / (1 + rs))
-    
-    # MACD
-    exp1 = data['Close'].ewm(span=12, adjust=False).mean()
-    exp2 = data['Close'].ewm(span=26, adjust=False).mean()
-    data['MACD'] = exp1 - exp2
-    data['Signal_Line'] = data['MACD'].ewm(span=9, adjust=False).mean()
-    data['MACD_Hist'] = data['MACD'] - data['Signal_Line']
-    
-    # Bollinger Bands
-    data['BB_Mid'] = data['Close'].rolling(window=20).mean()
-    data['BB_Std'] = data['Close'].rolling(window=20).std()
-    data['BB_Upper'] = data['BB_Mid'] + 2 * data['BB_Std']
-    data['BB_Lower'] = data['BB_Mid'] - 2 * data['BB_Std']
-    data['BB_Width'] = (data['BB_Upper'] - data['BB_Lower']) / data['BB_Mid']
-    data['BB_Pct'] = (data['Close'] - data['BB_Lower']) / (data['BB_Upper'] - data['BB_Lower'])
-    
-    # Stochastic Oscillator
-    data['14-high'] = data['High'].rolling(14).max()
-    data['14-low'] = data['Low'].rolling(14).min()
-    data['%K'] = (data['Close'] - data['14-low']) * 100 / (data['14-high'] - data['14-low'])
-    data['%D'] = data['%K'].rolling(3).mean()
-    
-    # Average True Range (ATR)
-    data['TR'] = np.maximum(
-        data['High'] - data['Low'],
-        np.maximum(
-            abs(data['High'] - data['Close'].shift(1)),
-            abs(data['Low'] - data['Close'].shift(1))
-        )
-    )
-    data['ATR'] = data['TR'].rolling(14).mean()
-    
-    # On-Balance Volume (OBV)
-    data['OBV'] = (np.sign(data['Close'].diff()) * data['Volume']).fillna(0).cumsum()
-    
-    # Price and Volume Metrics
-    for lag in range(1, 6):
-        data[f'Close_Lag_{lag}'] = data['Close'].shift(lag)
-        data[f'Volume_Lag_{lag}'] = data['Volume'].shift(lag)
-    
-    data['Pct_Change'] = data['Close'].pct_change()
-    data['Volume_Pct_Change'] = data['Volume'].pct_change()
-    
-    # Price Momentum
-    data['ROC_5'] = data['Close'].pct_change(periods=5) * 100  # 5-day Rate of Change
-    data['ROC_10'] = data['Close'].pct_change(periods=10) * 100  # 10-day Rate of Change
-    data['ROC_20'] = data['Close'].pct_change(periods=20) * 100  # 20-day Rate of Change
-    
-    # Volatility Indicators
-    data['Daily_Return'] = data['Close'].pct_change()
-    data['Volatility_20'] = data['Daily_Return'].rolling(window=20).std() * np.sqrt(252)  # Annualized
-    
-    # Volume Indicators
-    data['Volume_SMA_20'] = data['Volume'].rolling(window=20).mean()
-    data['Volume_Ratio'] = data['Volume'] / data['Volume_SMA_20']
-    
-    # Trend Indicators
-    data['ADX'] = calculate_adx(data)
-    
-    # Support and Resistance
-    data['Support_Level'] = data['Low'].rolling(window=20).min()
-    data['Resistance_Level'] = data['High'].rolling(window=20).max()
-    
-    return data
+class Clock:
+    """Wall clock used by the update loop and the bot; the replay harness swaps in a virtual one."""
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+clock = Clock()
+
+# Daily bars per symbol kept by the update loop: {symbol: {'data': DataFrame, 'timestamp': datetime}}
+price_cache = {}
+
+
+# Upstream (Yahoo Finance) traffic, and the calls avoided by idling and by reusing cached bars
+upstream_stats = {'calls': 0, 'idle_seconds': 0.0, 'idle_calls_saved': 0.0, 'cache_calls_saved': 0}
+upstream_lock = threading.Lock()
+
+
+def count_upstream(key, amount=1):
+    with upstream_lock:
+        upstream_stats[key] += amount
 
-def calculate_adx(data, period=14):
-    """Calculate the Average Directional Index (ADX)"""
+
+def yahoo_history(symbol, kwargs):
+    return yf.Ticker(symbol + ".NS").history(**kwargs)
+
+
+def download_history(symbol, **kwargs):
+    """Daily bars for an NSE symbol from Yahoo Finance; kwargs are passed to Ticker.history."""
+    count_upstream('calls')
     try:
-        # True Range
-        data['TR'] = np.maximum(
-            data['High'] - data['Low'],
-            np.maximum(
-                abs(data['High'] - data['Close'].shift(1)),
-                abs(data['Low'] - data['Close'].shift(1))
-            )
-        )
-        
-        # Directional Movement
-        data['DM_plus'] = np.where(
-            (data['High'] - data['High'].shift(1)) > (data['Low'].shift(1) - data['Low']),
-            np.maximum(data['High'] - data['High'].shift(1), 0),
-            0
-        )
-        
-        data['DM_minus'] = np.where(
-            (data['Low'].shift(1) - data['Low']) > (data['High'] - data['High'].shift(1)),
-            np.maximum(data['Low'].shift(1) - data['Low'], 0),
-            0
-        )
-        
-        # Smoothed TR and DM
-        data['ATR'] = data['TR'].rolling(window=period).mean()
-        data['DM_plus_smooth'] = data['DM_plus'].rolling(window=period).mean()
-        data['DM_minus_smooth'] = data['DM_minus'].rolling(window=period).mean()
-        
-        # Directional Indicators
-        data['DI_plus'] = 100 * data['DM_plus_smooth'] / data['ATR']
-        data['DI_minus'] = 100 * data['DM_minus_smooth'] / data['ATR']
-        
-        # Directional Index
-        data['DX'] = 100 * abs(data['DI_plus'] - data['DI_minus']) / (data['DI_plus'] + data['DI_minus'])
-        
-        # Average Directional Index
-        data['ADX'] = data['DX'].rolling(window=period).mean()
-        
-        return data['ADX']
-    except Exception as e:
-        print(f"Error calculating ADX: {e}")
-        return pd.Series(np.nan, index=data.index)
+        # yfinance blocks in curl_cffi, so with gevent it runs on the download thread
+        data = offload.download(yahoo_history, symbol, kwargs)
+    except Exception:
+        metrics.UPSTREAM_REQUESTS.labels('error').inc()
+        raise
+    metrics.UPSTREAM_REQUESTS.labels('empty' if data.empty else 'ok').inc()
+    return data
+
+
+# Identical concurrent requests share one download, repeats within MARKET_DATA_TTL seconds are
+# served from memory, and downloads are capped at MARKET_DATA_RATE per second (bursts of MARKET_DATA_BURST)
+market_data_gateway = market_data.Gateway(
+    download_history,
+    rate=float(os.getenv('MARKET_DATA_RATE', market_data.RATE)),
+    burst=int(os.getenv('MARKET_DATA_BURST', market_data.BURST)),
+    ttl=float(os.getenv('MARKET_DATA_TTL', market_data.TTL)),
+)
+
+
+def fetch_history(symbol, **kwargs):
+    """Bars for an NSE symbol through the market-data gateway; raises market_data.Throttled when rate limited."""
+    return market_data_gateway.history(symbol, **kwargs)
 
 
-def predict_signal(symbol, data):
+def merge_bars(cached, latest):
+    """Append newer bars, replacing cached bars of the same date (today's bar changes during the session)."""
+    merged = pd.concat([cached, latest])
+    return merged[~merged.index.duplicated(keep='last')].sort_index()
+
+
+def cached_history(symbol):
+    """Daily bars from the update loop's cache, fetching a year of them if the loop has not yet."""
+    entry = price_cache.get(symbol)
+    CACHE_LOOKUPS.labels('price', 'miss' if entry is None else 'hit').inc()
+    if entry is None:
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=365)
+        data = fetch_history(symbol, start=start_date, end=end_date)
+        if data.empty:
+            return None
+        entry = price_cache.setdefault(symbol, {'data': data, 'timestamp': datetime.now()})
+    return entry['data']
+
+
+def market_history(symbol, days):
+    """The last `days` calendar days of cached daily bars, as a copy safe to add columns to."""
+    cached = symbol in price_cache
+    data = cached_history(symbol)
+    if data is None:
+        return pd.DataFrame()
+    if cached:
+        count_upstream('cache_calls_saved')
+    start_date = clock.now() - timedelta(days=days)
+    return data[data.index.tz_localize(None) >= pd.Timestamp(start_date.date())].copy()
+
+
+risk_engine = risk.RiskEngine(cached_history)
+
+# Current-session 1m/5m candles built from the quotes the update loop polls
+intraday_store = intraday.IntradayStore()
+
+# Update workers each own one shard of the universe; UPDATE_SHARD=i/n splits it across processes
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '4'))
+UPDATE_SHARD = scheduler.parse_shard(os.getenv('UPDATE_SHARD'))
+UNIVERSE_SYNC_SECONDS = 30
+
+# Outside NSE hours the loop idles; MARKET_HOURS=0 polls around the clock
+MARKET_HOURS = os.getenv('MARKET_HOURS', '1') != '0'
+IDLE_CHECK_SECONDS = 300
+trading_calendar = market_calendar.MarketCalendar.load() if MARKET_HOURS else None
+refresh_scheduler = scheduler.RefreshScheduler(shards=UPDATE_WORKERS)
+universe_synced_at = None
+universe_lock = threading.Lock()
+# Bot trades and the account endpoints write the same wallets and positions, so they take turns
+trade_lock = threading.Lock()
+# Latest price, signal and indicators per symbol, served in bulk by /api/quotes
+quote_table = quotes.QuoteTable()
+# Pending cProfile captures of single symbols, requested through /api/admin/profile/<symbol>
+symbol_profiles = profiling.SymbolProfiles()
+
+# Changed prices and signals go out as one stock_updates batch per pass;
+# Clients that never subscribe get the old per-symbol stock_update events. On by default, because the
+# committed backend/static build predates subscriptions; LEGACY_STOCK_UPDATES=0 once it is rebuilt
+stock_broadcaster = broadcaster.Broadcaster(loop_socketio, legacy=os.getenv('LEGACY_STOCK_UPDATES', '1') == '1')
+# Trade and wallet events go to the account's room rather than to every client
+def account_room(account_id):
+    return f'account:{account_id}'
+
+
+# Bot settings, balances and positions of the accounts with an active bot, evaluated per symbol as arrays
+account_book = accounts.AccountBook()
+
+
+# predict_signal looks the symbol's model up itself unless it is passed one
+LOOKUP = object()
+
+
+def signal_features(symbol, model=LOOKUP):
+    """Indicator columns predict_signal reads for a symbol: its model's features plus the rule inputs."""
+    if model is LOOKUP:
+        model = model_store.get_model(symbol)
+    return RULE_FEATURES + (model.features if model else [])
+
+
+def score(symbol, bars, extra_features=(), details=None):
+    """Indicator frame of daily bars (a copy) and its signal.
+
+    With gevent both run on a worker thread, which gets the model looked up here (see offload.py).
+    """
+    model = model_store.get_model(symbol)
+    data = offload.run(compute_indicators, bars.copy(), signal_features(symbol, model) + list(extra_features))
+    return data, offload.run(predict_signal, symbol, data, details=details, model=model)
+
+
+def predict_signal(symbol, data, interval='1d', details=None, model=LOOKUP):
+    """Buy, Sell or Hold for the latest bar; pass a dict as details to get the model and rule components.
+
+    model is the symbol's model (or None) if the caller has looked it up already.
+    """
+    if details is None:
+        details = {}
     try:
         # Try to use the pre-trained model if available
         try:
-            model_data = joblib.load(f'models/{symbol}_model.pkl')
+            if interval != '1d':
+                raise ValueError(f"models are trained on daily bars, not {interval}")
+            if model is LOOKUP:
+                model = model_store.get_model(symbol)
+            if model is None:
+                raise FileNotFoundError(f"No model saved for {symbol}")
+            features = model.features
             
-            # Handle both old model format (direct model) and new format (dict with model and features)
-            if isinstance(model_data, dict) and 'model' in model_data:
-                model = model_data['model']
-                features = model_data['features']
-                print(f"Using new model format for {symbol} (type: {model_data.get('model_type', 'Unknown')})")
+            # Models saved as a dict carry their own feature list; bare estimators use the original 18
+            if model.model_type != 'original':
+                predict_log.debug("Using new model format for %s (type: %s)", symbol, model.model_type, extra={'symbol': symbol})
             else:
-                model = model_data
-                features = [
-                    'SMA50', 'SMA200', 'RSI', 'MACD', 'Signal_Line', 'BB_Upper', 'BB_Lower',
-                    'Close_Lag_1', 'Close_Lag_2', 'Close_Lag_3', 'Close_Lag_4', 'Close_Lag_5',
-                    'Volume_Lag_1', 'Volume_Lag_2', 'Volume_Lag_3', 'Volume_Lag_4', 'Volume_Lag_5',
-                    'Pct_Change'
-                ]
-                print(f"Using original model format for {symbol}")
+                predict_log.debug("Using original model format for %s", symbol, extra={'symbol': symbol})
             
             # Ensure all required features exist in the data
-            for feature in features:
-                if feature not in data.columns:
-                    print(f"Warning: Feature {feature} not found in data for {symbol}, calculating it")
-                    # Calculate missing features on-the-fly if possible
-                    if feature == 'SMA5':
-                        data['SMA5'] = data['Close'].rolling(window=5).mean()
-                    elif feature == 'SMA20':
-                        data['SMA20'] = data['Close'].rolling(window=20).mean()
-                    elif feature == 'MACD_Hist':
-                        if 'MACD' in data.columns and 'Signal_Line' in data.columns:
-                            data['MACD_Hist'] = data['MACD'] - data['Signal_Line']
-                    elif feature == 'BB_Width':
-                        if 'BB_Upper' in data.columns and 'BB_Lower' in data.columns and 'BB_Mid' in data.columns:
-                            data['BB_Width'] = (data['BB_Upper'] - data['BB_Lower']) / data['BB_Mid']
-                    elif feature.startswith('Close_Change_'):
-                        lag = int(feature.split('_')[-1])
-                        lag_col = f'Close_Lag_{lag}'
-                        if lag_col in data.columns:
-                            data[feature] = data['Close'] / data[lag_col] - 1
-                    elif feature == 'Volatility_20':
-                        data['Volatility_20'] = data['Pct_Change'].rolling(window=20).std()
-                    elif feature == '%K':
-                        data['Lowest_14'] = data['Low'].rolling(window=14).min()
-                        data['Highest_14'] = data['High'].rolling(window=14).max()
-                        data['%K'] = 100 * ((data['Close'] - data['Lowest_14']) / 
-                                        (data['Highest_14'] - data['Lowest_14']))
-                    elif feature == '%D':
-                        if '%K' in data.columns:
-                            data['%D'] = data['%K'].rolling(window=3).mean()
-                    elif feature == 'ROC_5':
-                        data['ROC_5'] = data['Close'].pct_change(periods=5)
-                    elif feature == 'ROC_20':
-                        data['ROC_20'] = data['Close'].pct_change(periods=20)
-                    elif feature == 'Volume_Ratio':
-                        data['Volume_Ratio'] = data['Volume'] / data['Volume'].rolling(window=20).mean()
+            missing = [feature for feature in features if feature not in data.columns]
+            if missing:
+                predict_log.warning("Features %s not found in data for %s, calculating them", missing, symbol, extra={'symbol': symbol})
+                compute_indicators(data, missing)
             
             # Get the latest data with required features
             latest_data = data.tail(1)[features]
             
             if not latest_data.isna().any().any():
-                prediction = model.predict(latest_data)[0]
+                prediction = model.predict(latest_data.values)[0]
                 model_signal = 'Buy' if prediction == 1 else 'Sell' if prediction == -1 else 'Hold'
-                print(f"Model prediction for {symbol}: {model_signal}")
+                predict_log.debug("Model prediction for %s: %s", symbol, model_signal, extra={'symbol': symbol})
             else:
-                print(f"Warning: NaN values in latest data for {symbol}, defaulting to Hold")
+                predict_log.warning("NaN values in latest data for %s, defaulting to Hold", symbol, extra={'symbol': symbol})
                 model_signal = 'Hold'
         except Exception as model_error:
-            print(f"Model error for {symbol}, using advanced rule-based system: {model_error}")
+            predict_log.debug("Model error for %s, using advanced rule-based system: %s", symbol, model_error, extra={'symbol': symbol})
             model_signal = 'Hold'
+        details['model_signal'] = model_signal
         
         # Advanced rule-based system as a fallback and to enhance model predictions
         if len(data) < 50:  # Need enough data for reliable signals
@@ -322,7 +454,7 @@ def predict_signal(symbol, data):
             elif latest['SMA50'] < latest['SMA200'] and prev['SMA50'] >= prev['SMA200']:
                 sell_score += 3  # Death Cross
         except Exception as e:
-            print(f"MA analysis error for {symbol}: {e}")
+            predict_log.warning("MA analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
         
         # 2. RSI Conditions
         try:
@@ -341,7 +473,7 @@ def predict_signal(symbol, data):
             elif latest['RSI'] < prev['RSI'] and latest['Close'] > prev['Close']:
                 sell_score += 1  # Bearish divergence
         except Exception as e:
-            print(f"RSI analysis error for {symbol}: {e}")
+            predict_log.warning("RSI analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # 3. MACD Signal
         try:
@@ -357,7 +489,7 @@ def predict_signal(symbol, data):
                 elif latest['MACD_Hist'] < 0 and prev['MACD_Hist'] >= 0:
                     sell_score += 1  # MACD histogram turns negative
         except Exception as e:
-            print(f"MACD analysis error for {symbol}: {e}")
+            predict_log.warning("MACD analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # 4. Bollinger Bands
         try:
@@ -376,7 +508,7 @@ def predict_signal(symbol, data):
                     else:
                         sell_score += 1  # Potential downside breakout
         except Exception as e:
-            print(f"BB analysis error for {symbol}: {e}")
+            predict_log.warning("BB analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # 5. Stochastic Oscillator
         try:
@@ -386,7 +518,7 @@ def predict_signal(symbol, data):
                 elif latest['%K'] > 80 and latest['%K'] < latest['%D']:
                     sell_score += 1  # Stochastic in overbought territory and falling
         except Exception as e:
-            print(f"Stochastic analysis error for {symbol}: {e}")
+            predict_log.warning("Stochastic analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # 6. Volume Analysis
         try:
@@ -404,7 +536,7 @@ def predict_signal(symbol, data):
                 elif latest['OBV'] < obv_sma.iloc[-1] and prev['OBV'] >= obv_sma.iloc[-2]:
                     sell_score += 1  # OBV crosses below its average
         except Exception as e:
-            print(f"Volume analysis error for {symbol}: {e}")
+            predict_log.warning("Volume analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # 7. Price Momentum
         try:
@@ -414,7 +546,7 @@ def predict_signal(symbol, data):
                 elif latest['ROC_5'] < 0 and latest['ROC_20'] < 0:
                     sell_score += 1  # Negative momentum on multiple timeframes
         except Exception as e:
-            print(f"Momentum analysis error for {symbol}: {e}")
+            predict_log.warning("Momentum analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # 8. Support/Resistance Levels
         try:
@@ -426,7 +558,7 @@ def predict_signal(symbol, data):
                 elif prev['Close'] > latest['Support_Level'] and latest['Close'] < latest['Support_Level']:
                     sell_score += 2
         except Exception as e:
-            print(f"Support/Resistance analysis error for {symbol}: {e}")
+            predict_log.warning("Support/Resistance analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # 9. ADX (Trend Strength)
         try:
@@ -438,7 +570,7 @@ def predict_signal(symbol, data):
                     elif latest['SMA5'] < latest['SMA20']:
                         sell_score += 1  # Strong downtrend
         except Exception as e:
-            print(f"ADX analysis error for {symbol}: {e}")
+            predict_log.warning("ADX analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # 10. Volatility-based decision
         try:
@@ -449,7 +581,7 @@ def predict_signal(symbol, data):
                     buy_score = max(0, buy_score - 1)
                     sell_score = max(0, sell_score - 1)
         except Exception as e:
-            print(f"Volatility analysis error for {symbol}: {e}")
+            predict_log.warning("Volatility analysis error for %s: %s", symbol, e, extra={'symbol': symbol})
             
         # Make final decision based on scores
         rule_signal = 'Hold'
@@ -458,7 +590,8 @@ def predict_signal(symbol, data):
         elif sell_score - buy_score >= 3:  # Strong sell signal
             rule_signal = 'Sell'
             
-        print(f"Rule-based signal for {symbol}: {rule_signal} (Buy: {buy_score}, Sell: {sell_score})")
+        predict_log.debug("Rule-based signal for %s: %s (Buy: %s, Sell: %s)", symbol, rule_signal, buy_score, sell_score, extra={'symbol': symbol})
+        details.update(rule_signal=rule_signal, buy_score=buy_score, sell_score=sell_score)
         
         # Combine model and rule-based signals
         if model_signal == rule_signal:
@@ -476,327 +609,506 @@ def predict_signal(symbol, data):
             return rule_signal
             
     except Exception as e:
-        print(f"Prediction error for {symbol}: {e}")
+        predict_log.error("Prediction error for %s: %s", symbol, e, extra={'symbol': symbol})
         return 'Hold'
 
 
-def execute_bot_trade(symbol, signal, current_price, session):
-    """Execute a trade based on the trading bot settings and current signal"""
+def bot_signal(symbol, signal):
+    """The signal the bot trades on: predict_signal's, held back where market conditions advise against it."""
+    # Get historical data for better decision making; the update loop's cache
+    # already holds it, so this costs no extra download
     try:
-        # Get trading bot settings
-        bot = session.query(TradingBot).first()
-        
-        # If bot is not active, don't trade
-        if not bot or bot.is_active != 1:
-            return
+        hist_data = market_history(symbol, days=60)  # Look at last 60 days for more context
+        if not hist_data.empty:
+            # Calculate comprehensive indicators for better decision making
+            hist_data = offload.run(compute_indicators, hist_data, MARKET_FEATURES)
             
-        # Get historical data for better decision making
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=60)  # Look at last 60 days for more context
-        
-        try:
-            hist_data = yf.Ticker(symbol + ".NS").history(start=start_date, end=end_date)
-            if not hist_data.empty:
-                # Calculate comprehensive indicators for better decision making
-                hist_data = calculate_technical_indicators(hist_data)
+            # Extract key metrics
+            latest = hist_data.iloc[-1] if len(hist_data) > 0 else None
+            
+            if latest is not None:
+                # Calculate volatility
+                volatility = hist_data['Daily_Return'].std() * 100 if 'Daily_Return' in hist_data.columns else None
                 
-                # Extract key metrics
-                latest = hist_data.iloc[-1] if len(hist_data) > 0 else None
+                # Determine market conditions
+                market_conditions = {}
                 
-                if latest is not None:
-                    # Calculate volatility
-                    volatility = hist_data['Daily_Return'].std() * 100 if 'Daily_Return' in hist_data.columns else None
-                    
-                    # Determine market conditions
-                    market_conditions = {}
-                    
-                    # Trend analysis
-                    if 'SMA5' in latest and 'SMA20' in latest and 'SMA50' in latest:
-                        strong_uptrend = latest['SMA5'] > latest['SMA20'] > latest['SMA50']
-                        strong_downtrend = latest['SMA5'] < latest['SMA20'] < latest['SMA50']
-                        market_conditions['trend'] = 'strong_up' if strong_uptrend else 'strong_down' if strong_downtrend else 'neutral'
-                    
-                    # Volatility analysis
-                    if volatility is not None:
-                        market_conditions['volatility'] = 'high' if volatility > 3 else 'low'
-                    
-                    # Momentum analysis
-                    if 'RSI' in latest:
-                        market_conditions['momentum'] = 'overbought' if latest['RSI'] > 70 else 'oversold' if latest['RSI'] < 30 else 'neutral'
-                    
-                    # Support/Resistance analysis
-                    if 'BB_Upper' in latest and 'BB_Lower' in latest:
-                        if latest['Close'] > latest['BB_Upper']:
-                            market_conditions['price_level'] = 'above_resistance'
-                        elif latest['Close'] < latest['BB_Lower']:
-                            market_conditions['price_level'] = 'below_support'
-                        else:
-                            market_conditions['price_level'] = 'within_range'
-                    
-                    # Volume analysis
-                    if 'Volume_Ratio' in latest:
-                        market_conditions['volume'] = 'high' if latest['Volume_Ratio'] > 1.5 else 'low' if latest['Volume_Ratio'] < 0.5 else 'normal'
-                    
-                    print(f"Market conditions for {symbol}: {market_conditions}")
-                    
-                    # Advanced signal modification based on market conditions
-                    if signal == 'Sell':
-                        # Don't sell in strong uptrends with low volatility unless overbought
-                        if (market_conditions.get('trend') == 'strong_up' and 
-                            market_conditions.get('volatility') == 'low' and 
-                            market_conditions.get('momentum') != 'overbought'):
-                            print(f"Trading bot: Modified signal from Sell to Hold for {symbol} due to strong uptrend with low volatility")
-                            signal = 'Hold'
-                        
-                        # Don't sell when price is at support levels and not in strong downtrend
-                        elif (market_conditions.get('price_level') == 'below_support' and 
-                              market_conditions.get('trend') != 'strong_down'):
-                            print(f"Trading bot: Modified signal from Sell to Hold for {symbol} due to price at support level")
-                            signal = 'Hold'
-                    
-                    elif signal == 'Buy':
-                        # Don't buy in strong downtrends with high volatility unless oversold
-                        if (market_conditions.get('trend') == 'strong_down' and 
-                            market_conditions.get('volatility') == 'high' and 
-                            market_conditions.get('momentum') != 'oversold'):
-                            print(f"Trading bot: Modified signal from Buy to Hold for {symbol} due to strong downtrend with high volatility")
-                            signal = 'Hold'
-                        
-                        # Don't buy when price is at resistance levels and not in strong uptrend
-                        elif (market_conditions.get('price_level') == 'above_resistance' and 
-                              market_conditions.get('trend') != 'strong_up'):
-                            print(f"Trading bot: Modified signal from Buy to Hold for {symbol} due to price at resistance level")
-                            signal = 'Hold'
-                        
-                        # Don't buy on low volume unless at strong support
-                        elif (market_conditions.get('volume') == 'low' and 
-                              market_conditions.get('price_level') != 'below_support'):
-                            print(f"Trading bot: Modified signal from Buy to Hold for {symbol} due to low volume")
-                            signal = 'Hold'
-        except Exception as e:
-            print(f"Error in advanced market analysis for {symbol}: {e}")
-            # Continue with original signal if additional analysis fails
-        
-        # Get wallet balance
-        wallet = session.query(Wallet).first()
-        if not wallet:
-            print("No wallet found for trading bot")
-            return
-        
-        # Check if we've reached the maximum trades for today
-        today = datetime.now().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_end = datetime.combine(today, datetime.max.time())
-        
-        trades_today = session.query(Transaction).filter(
-            Transaction.timestamp.between(today_start, today_end),
-            Transaction.type.in_(['buy', 'sell']),
-            Transaction.description.like('%[BOT]%')
-        ).count()
-        
-        if trades_today >= bot.max_trades_per_day:
-            print(f"Trading bot: Maximum trades per day ({bot.max_trades_per_day}) reached")
-            return
-        
-        # Count current open positions
-        open_positions = session.query(Portfolio).all()
-        open_position_count = len(open_positions)
-        
-        # Check if this stock is already in portfolio
-        stock_in_portfolio = False
-        stock_quantity = 0
-        stock_avg_price = 0
-        
-        for position in open_positions:
-            if position.symbol == symbol:
-                stock_in_portfolio = True
-                stock_quantity += position.quantity
-                stock_avg_price = position.buy_price  # Simplified, should calculate weighted average
-        
-        # Handle BUY signal
-        if signal == 'Buy' and not stock_in_portfolio:
-            # Check if we've reached max open positions
-            if open_position_count >= bot.max_open_positions:
-                print(f"Trading bot: Maximum open positions ({bot.max_open_positions}) reached")
-                return
-            
-            # Calculate quantity to buy based on max investment per trade
-            max_investment = min(bot.max_investment_per_trade, wallet.balance)
-            if max_investment < current_price:
-                print(f"Trading bot: Insufficient funds for {symbol}")
-                return
+                # Trend analysis
+                if 'SMA5' in latest and 'SMA20' in latest and 'SMA50' in latest:
+                    strong_uptrend = latest['SMA5'] > latest['SMA20'] > latest['SMA50']
+                    strong_downtrend = latest['SMA5'] < latest['SMA20'] < latest['SMA50']
+                    market_conditions['trend'] = 'strong_up' if strong_uptrend else 'strong_down' if strong_downtrend else 'neutral'
                 
-            quantity = int(max_investment / current_price)
-            if quantity <= 0:
-                return
+                # Volatility analysis
+                if volatility is not None:
+                    market_conditions['volatility'] = 'high' if volatility > 3 else 'low'
                 
-            total_cost = quantity * current_price
-            
-            # Execute buy
-            wallet.balance -= total_cost
-            
-            # Add to portfolio
-            entry = Portfolio(
-                symbol=symbol,
-                quantity=quantity,
-                buy_price=current_price,
-                buy_date=datetime.now()
-            )
-            session.add(entry)
-            
-            # Record transaction
-            transaction = Transaction(
-                transaction_id=str(uuid.uuid4()),
-                type='buy',
-                amount=total_cost,
-                symbol=symbol,
-                quantity=quantity,
-                price=current_price,
-                description=f'[BOT] Bought {quantity} shares of {symbol} at ₹{current_price:.2f} per share',
-                timestamp=datetime.now()
-            )
-            session.add(transaction)
-            session.commit()
-            
-            # Emit trade event
-            socketio.emit('trade_executed', {
-                'type': 'buy',
-                'symbol': symbol,
-                'quantity': quantity,
-                'price': current_price,
-                'total': total_cost,
-                'wallet_balance': wallet.balance,
-                'timestamp': datetime.now().isoformat(),
-                'description': f'[BOT] Bought {quantity} shares of {symbol} at ₹{current_price:.2f} per share'
-            })
-            
-            print(f"Trading bot: Bought {quantity} shares of {symbol} at ₹{current_price:.2f}")
-            
-        # Handle SELL signal or profit target/stop loss
-        elif stock_in_portfolio:
-            should_sell = False
-            sell_reason = ""
-            
-            # Check if it's a sell signal
-            if signal == 'Sell':
-                should_sell = True
-                sell_reason = "sell signal"
-            
-            # Check profit target
-            elif current_price >= stock_avg_price * (1 + bot.profit_target_percentage / 100):
-                should_sell = True
-                sell_reason = f"profit target of {bot.profit_target_percentage}% reached"
-            
-            # Check stop loss
-            elif current_price <= stock_avg_price * (1 - bot.stop_loss_percentage / 100):
-                should_sell = True
-                sell_reason = f"stop loss of {bot.stop_loss_percentage}% triggered"
-            
-            if should_sell:
-                # Calculate total value
-                total_value = stock_quantity * current_price
+                # Momentum analysis
+                if 'RSI' in latest:
+                    market_conditions['momentum'] = 'overbought' if latest['RSI'] > 70 else 'oversold' if latest['RSI'] < 30 else 'neutral'
                 
-                # Process the sell order - find all entries for this symbol
-                entries = session.query(Portfolio).filter_by(symbol=symbol).all()
-                for entry in entries:
-                    session.delete(entry)
+                # Support/Resistance analysis
+                if 'BB_Upper' in latest and 'BB_Lower' in latest:
+                    if latest['Close'] > latest['BB_Upper']:
+                        market_conditions['price_level'] = 'above_resistance'
+                    elif latest['Close'] < latest['BB_Lower']:
+                        market_conditions['price_level'] = 'below_support'
+                    else:
+                        market_conditions['price_level'] = 'within_range'
                 
-                # Add to wallet
-                wallet.balance += total_value
+                # Volume analysis
+                if 'Volume_Ratio' in latest:
+                    market_conditions['volume'] = 'high' if latest['Volume_Ratio'] > 1.5 else 'low' if latest['Volume_Ratio'] < 0.5 else 'normal'
                 
-                # Record transaction
-                transaction = Transaction(
-                    transaction_id=str(uuid.uuid4()),
-                    type='sell',
-                    amount=total_value,
-                    symbol=symbol,
-                    quantity=stock_quantity,
-                    price=current_price,
-                    description=f'[BOT] Sold {stock_quantity} shares of {symbol} at ₹{current_price:.2f} per share ({sell_reason})',
-                    timestamp=datetime.now()
-                )
-                session.add(transaction)
-                session.commit()
+                trade_log.debug("Market conditions for %s: %s", symbol, market_conditions, extra={'symbol': symbol})
                 
-                # Emit trade event
-                socketio.emit('trade_executed', {
-                    'type': 'sell',
-                    'symbol': symbol,
-                    'quantity': stock_quantity,
-                    'price': current_price,
-                    'total': total_value,
-                    'wallet_balance': wallet.balance,
-                    'timestamp': datetime.now().isoformat(),
-                    'description': f'[BOT] Sold {stock_quantity} shares of {symbol} at ₹{current_price:.2f} per share ({sell_reason})'
-                })
+                # Advanced signal modification based on market conditions
+                if signal == 'Sell':
+                    # Don't sell in strong uptrends with low volatility unless overbought
+                    if (market_conditions.get('trend') == 'strong_up' and 
+                        market_conditions.get('volatility') == 'low' and 
+                        market_conditions.get('momentum') != 'overbought'):
+                        trade_log.debug("Modified signal from Sell to Hold for %s due to strong uptrend with low volatility", symbol, extra={'symbol': symbol})
+                        signal = 'Hold'
+                    
+                    # Don't sell when price is at support levels and not in strong downtrend
+                    elif (market_conditions.get('price_level') == 'below_support' and 
+                          market_conditions.get('trend') != 'strong_down'):
+                        trade_log.debug("Modified signal from Sell to Hold for %s due to price at support level", symbol, extra={'symbol': symbol})
+                        signal = 'Hold'
                 
-                print(f"Trading bot: Sold {stock_quantity} shares of {symbol} at ₹{current_price:.2f} ({sell_reason})")
-    
+                elif signal == 'Buy':
+                    # Don't buy in strong downtrends with high volatility unless oversold
+                    if (market_conditions.get('trend') == 'strong_down' and 
+                        market_conditions.get('volatility') == 'high' and 
+                        market_conditions.get('momentum') != 'oversold'):
+                        trade_log.debug("Modified signal from Buy to Hold for %s due to strong downtrend with high volatility", symbol, extra={'symbol': symbol})
+                        signal = 'Hold'
+                    
+                    # Don't buy when price is at resistance levels and not in strong uptrend
+                    elif (market_conditions.get('price_level') == 'above_resistance' and 
+                          market_conditions.get('trend') != 'strong_up'):
+                        trade_log.debug("Modified signal from Buy to Hold for %s due to price at resistance level", symbol, extra={'symbol': symbol})
+                        signal = 'Hold'
+                    
+                    # Don't buy on low volume unless at strong support
+                    elif (market_conditions.get('volume') == 'low' and 
+                          market_conditions.get('price_level') != 'below_support'):
+                        trade_log.debug("Modified signal from Buy to Hold for %s due to low volume", symbol, extra={'symbol': symbol})
+                        signal = 'Hold'
     except Exception as e:
-        print(f"Trading bot error for {symbol}: {e}")
+        trade_log.warning("Error in advanced market analysis for %s: %s", symbol, e, extra={'symbol': symbol})
+        # Continue with original signal if additional analysis fails
+    return signal
+
+
+# Above this many accounts changed since the last evaluation, the whole book is reloaded
+RELOAD_ALL_ACCOUNTS = 500
+# Account ids per IN (...) list when deleting sold positions, well under SQLite's bound-parameter limit
+DELETE_CHUNK = 500
+
+
+def load_account_book(session, only=None):
+    """Read the accounts with an active bot, or only the given accounts, into account_book."""
+    today = clock.now().date()
+    bots = (session.query(TradingBot.account_id, *[getattr(TradingBot, name) for name in accounts.SETTINGS],
+                          Wallet.balance)
+            .join(Wallet, Wallet.account_id == TradingBot.account_id)
+            .filter(TradingBot.is_active == 1))
+    positions = (session.query(Portfolio.account_id, Portfolio.symbol, func.sum(Portfolio.quantity),
+                               func.sum(Portfolio.quantity * Portfolio.buy_price) / func.sum(Portfolio.quantity))
+                 .join(TradingBot, TradingBot.account_id == Portfolio.account_id)
+                 .filter(TradingBot.is_active == 1)
+                 .group_by(Portfolio.account_id, Portfolio.symbol))
+    trades = (session.query(Transaction.account_id, func.count(Transaction.id))
+              .filter(Transaction.timestamp.between(datetime.combine(today, datetime.min.time()),
+                                                    datetime.combine(today, datetime.max.time())),
+                      Transaction.type.in_(['buy', 'sell']),
+                      Transaction.description.like('%[BOT]%'))
+              .group_by(Transaction.account_id))
+    if only is not None:
+        bots = bots.filter(TradingBot.account_id.in_(only))
+        positions = positions.filter(Portfolio.account_id.in_(only))
+        trades = trades.filter(Transaction.account_id.in_(only))
+    account_book.load([(row[0], tuple(row[1:-1]), row[-1]) for row in bots], positions.all(), dict(trades.all()),
+                      today, only)
+
+
+def sell_reason(reason, settings):
+    if reason == accounts.PROFIT_TAKEN:
+        return f"profit target of {float(settings[accounts.PROFIT_TARGET])}% reached"
+    if reason == accounts.STOP_LOSS_HIT:
+        return f"stop loss of {float(settings[accounts.STOP_LOSS])}% triggered"
+    return "sell signal"
+
+
+def record_bot_orders(symbol, price, orders, session):
+    """Write one symbol's bot fills to the ledger in a single transaction, and send each to its account."""
+    now = clock.now()
+    transactions, bought, sold, deltas, events = [], [], [], [], []
+    for account_id, buy, quantity, reason, balance, settings in zip(
+            orders.accounts, orders.buy, orders.quantity.tolist(), orders.reason, orders.balance.tolist(), orders.settings):
+        total = quantity * price
+        if buy:
+            description = f'[BOT] Bought {quantity} shares of {symbol} at ₹{price:.2f} per share'
+            bought.append({'account_id': account_id, 'symbol': symbol, 'quantity': quantity, 'buy_price': price,
+                           'buy_date': now})
+        else:
+            description = (f'[BOT] Sold {quantity} shares of {symbol} at ₹{price:.2f} per share '
+                           f'({sell_reason(reason, settings)})')
+            sold.append(account_id)
+        action = 'buy' if buy else 'sell'
+        transactions.append({'account_id': account_id, 'transaction_id': str(uuid.uuid4()), 'type': action,
+                             'amount': total, 'symbol': symbol, 'quantity': quantity, 'price': price,
+                             'description': description, 'timestamp': now})
+        deltas.append({'account': account_id, 'delta': -total if buy else total})
+        events.append((account_id, {'type': action, 'symbol': symbol, 'quantity': quantity, 'price': price,
+                                    'total': total, 'wallet_balance': balance, 'timestamp': now.isoformat(),
+                                    'description': description}))
+
+    session.execute(Transaction.__table__.insert(), transactions)
+    if bought:
+        session.execute(Portfolio.__table__.insert(), bought)
+    # A sell closes the whole position, so every lot of the symbol goes
+    for index in range(0, len(sold), DELETE_CHUNK):
+        session.query(Portfolio).filter(Portfolio.symbol == symbol,
+                                        Portfolio.account_id.in_(sold[index:index + DELETE_CHUNK])
+                                        ).delete(synchronize_session=False)
+    wallets = Wallet.__table__
+    session.execute(update(wallets).where(wallets.c.account_id == bindparam('account'))
+                    .values(balance=wallets.c.balance + bindparam('delta')), deltas)
+    session.commit()
+
+    for account_id, event in events:
+        loop_socketio.emit('trade_executed', event, to=account_room(account_id))
+    trade_log.info("Bot bought %s and sold %s positions of %s at ₹%.2f", len(bought), len(sold), symbol, price,
+                   extra={'symbol': symbol})
+
+
+def execute_bot_trade(symbol, signal, current_price, session):
+    """Apply the rules of every account's active bot to a symbol's signal and price, and record the fills."""
+    try:
+        stale = account_book.take_stale()
+        if stale is None or len(stale) > RELOAD_ALL_ACCOUNTS:
+            load_account_book(session)
+        elif stale:
+            load_account_book(session, stale)
+        if not len(account_book):
+            return
+
+        orders = account_book.orders(symbol, bot_signal(symbol, signal), current_price, clock.now().date())
+        if orders is not None:
+            record_bot_orders(symbol, current_price, orders, session)
+    except Exception as e:
+        trade_log.error("Trading bot error for %s: %s", symbol, e, extra={'symbol': symbol})
         session.rollback()
+        # The book may hold fills that were never written
+        account_book.invalidate()
 
 
-def update_stock_data():
-    cache = {}
-    while True:
+# Resting orders of every account, indexed by trigger price per symbol
+order_books = orders.OrderBooks()
+# Trailing stops' best prices are written back at most this often rather than on every tick
+ORDER_CHECKPOINT_SECONDS = 60
+order_checkpointed_at = time.monotonic()
+
+
+def load_order_books(session):
+    order_books.load(session.query(Order.id, Order.symbol, Order.side, Order.type, Order.trigger_price,
+                                   Order.trail_percent, Order.peak_price).filter(Order.status == 'open').all())
+
+
+def order_json(order):
+    result = {
+        'id': order.id,
+        'symbol': order.symbol,
+        'side': order.side,
+        'type': order.type,
+        'quantity': order.quantity,
+        'trigger_price': order.trigger_price,
+        'trail_percent': order.trail_percent,
+        'peak_price': order.peak_price,
+        'status': order.status,
+        'fill_price': order.fill_price,
+        'note': order.note,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None
+    }
+    state = order_books.trailing_state(order.id) if order.status == 'open' else None
+    if state:
+        result['peak_price'], result['trigger_price'] = round(state[0], 2), round(state[1], 2)
+    return result
+
+
+def checkpoint_trailing_stops(session):
+    """Write the moved trailing stops' best and stop prices, in one statement, once per ORDER_CHECKPOINT_SECONDS."""
+    global order_checkpointed_at
+    if time.monotonic() - order_checkpointed_at < ORDER_CHECKPOINT_SECONDS:
+        return
+    order_checkpointed_at = time.monotonic()
+    changed = order_books.changed_trailing()
+    if changed:
+        table = Order.__table__
+        session.execute(update(table).where(table.c.id == bindparam('order'))
+                        .values(peak_price=bindparam('peak'), trigger_price=bindparam('stop')),
+                        [{'order': order_id, 'peak': peak, 'stop': stop} for order_id, (peak, stop) in changed.items()])
+        session.commit()
+
+
+def fill_orders(symbol, price, session):
+    """Fill the symbol's resting orders that the price crossed, through the same ledger as /api/trade."""
+    try:
+        if not order_books.loaded:
+            load_order_books(session)
+        fired = order_books.cross(symbol, price)
+        checkpoint_trailing_stops(session)
+        if not fired:
+            return
+
+        now = clock.now()
+        filled = []
+        for order in session.query(Order).filter(Order.id.in_(list(fired)), Order.status == 'open').order_by(Order.id):
+            wallet = session.query(Wallet).filter_by(account_id=order.account_id).one()
+            label = order.type.replace('_', ' ')
+            if fired[order.id] is not None:
+                # Where the trailing stop stood when it fired, not as of the last checkpoint
+                order.peak_price, order.trigger_price = (round(value, 2) for value in fired[order.id])
+            try:
+                if order.side == 'buy':
+                    transaction = buy_shares(session, wallet, symbol, order.quantity, price,
+                                             f'[ORDER] Bought {order.quantity} shares of {symbol} at ₹{price:.2f} '
+                                             f'per share ({label} order {order.id})', now)
+                else:
+                    transaction = sell_shares(session, wallet, symbol, order.quantity, price,
+                                              f'[ORDER] Sold {order.quantity} shares of {symbol} at ₹{price:.2f} '
+                                              f'per share ({label} order {order.id})', now)
+                order.status, order.fill_price = 'filled', price
+                filled.append((order, transaction, wallet.balance))
+            except ValueError as e:
+                order.status, order.note = 'rejected', str(e)
+                filled.append((order, None, wallet.balance))
+            order.updated_at = now
+        session.commit()
+    except Exception as e:
+        trade_log.error("Order fill error for %s: %s", symbol, e, extra={'symbol': symbol})
+        session.rollback()
+        # The crossed orders are still open in the database
+        order_books.loaded = False
+        return
+
+    for order, transaction, balance in filled:
+        account_book.invalidate(order.account_id)
+        room = account_room(order.account_id)
+        loop_socketio.emit('order_updated', order_json(order), to=room)
+        if transaction is not None:
+            loop_socketio.emit('trade_executed', {
+                'type': order.side,
+                'symbol': symbol,
+                'quantity': order.quantity,
+                'price': price,
+                'total': transaction.amount,
+                'wallet_balance': balance,
+                'timestamp': now.isoformat(),
+                'description': transaction.description,
+                'order_id': order.id
+            }, to=room)
+            trade_log.info("Filled %s order %s: %s %s %s at ₹%.2f", order.type, order.id, order.side, order.quantity,
+                           symbol, price, extra={'symbol': symbol})
+        else:
+            trade_log.info("Rejected %s order %s for %s: %s", order.type, order.id, symbol, order.note,
+                           extra={'symbol': symbol})
+
+
+def load_universe():
+    """This process's shard of stocks.json plus the held and ordered symbols, and those symbols in it."""
+    with open('stocks.json') as f:
+        symbols = [stock['symbol'] for stock in json.load(f)]
+    session = Session()
+    try:
+        held = [row[0] for row in session.query(Portfolio.symbol).distinct()]
+        held += [row[0] for row in session.query(Order.symbol).filter(Order.status == 'open').distinct()]
+    finally:
+        session.close()
+
+    # Held positions and resting orders are refreshed, in the held tier, even if they are no longer in stocks.json
+    index, count = UPDATE_SHARD
+    universe = [s for s in dict.fromkeys(symbols + held) if scheduler.shard_of(s, count) == index]
+    return universe, [s for s in dict.fromkeys(held) if s in universe]
+
+
+def sync_universe(now):
+    """Reload stocks.json and the held symbols into the scheduler at most every UNIVERSE_SYNC_SECONDS."""
+    global universe_synced_at
+    if not universe_lock.acquire(blocking=False):
+        return
+    try:
+        if universe_synced_at is not None and now - universe_synced_at < UNIVERSE_SYNC_SECONDS:
+            return
+        universe, held = load_universe()
+        refresh_scheduler.set_universe(universe, now)
+        refresh_scheduler.set_held(held, now)
+        stock_broadcaster.retain(universe)
+        quote_table.retain(universe)
+        universe_synced_at = now
+    finally:
+        universe_lock.release()
+
+
+def stock_update(data, signal):
+    """Fields of a symbol's stock_updates entry for its latest bar."""
+    # Get previous day price if available
+    previous_day_price = None
+    if len(data) > 1:
+        previous_day_price = round(data['Close'].iloc[-2], 2)
+    return {
+        'current_price': round(data['Close'].iloc[-1], 2),
+        'previous_day_price': previous_day_price,
+        'signal': signal
+    }
+
+
+def refresh_symbol(symbol, session):
+    """Fetch, score, broadcast and trade one symbol; returns its indicator frame or None."""
+    cache = price_cache
+    for attempt in range(3):
         try:
-            with open('stocks.json') as f:
-                stocks = json.load(f)
+            CACHE_LOOKUPS.labels('price', 'hit' if symbol in cache else 'miss').inc()
+            with metrics.timer(STAGE_SECONDS.labels('fetch')):
+                if symbol not in cache:
+                    end_date = clock.now()
+                    start_date = end_date - timedelta(days=365)
+                    data = fetch_history(symbol, start=start_date, end=end_date)
+                    if data.empty:
+                        update_log.warning("No data for %s", symbol, extra={'symbol': symbol})
+                        return None
+                    cache[symbol] = {'data': data, 'timestamp': clock.now()}
+                elif (clock.now() - cache[symbol]['timestamp']).total_seconds() > 3600:
+                    # Hourly, re-read the last week to pick up corrected bars instead of the whole year
+                    end_date = clock.now()
+                    start_date = cache[symbol]['data'].index[-1].tz_localize(None) - timedelta(days=7)
+                    recent = fetch_history(symbol, start=start_date, end=end_date)
+                    if not recent.empty:
+                        cache[symbol]['data'] = merge_bars(cache[symbol]['data'], recent)
+                    cache[symbol]['timestamp'] = clock.now()
+                else:
+                    latest = fetch_history(symbol, period='1d')
+                    if not latest.empty:
+                        cache[symbol]['data'] = merge_bars(cache[symbol]['data'], latest)
+
+            # With gevent, indicators and predictions run on a worker thread while the loop serves others
+            model = model_store.get_model(symbol)
+            with metrics.timer(STAGE_SECONDS.labels('indicators')):
+                data = offload.run(compute_indicators, cache[symbol]['data'].copy(), signal_features(symbol, model))
+            current_price = round(data['Close'].iloc[-1], 2)
+            intraday_store.add_quote(symbol, clock.now(), data['Close'].iloc[-1], data['Volume'].iloc[-1])
+            details = {}
+            with metrics.timer(STAGE_SECONDS.labels('predict')):
+                signal = offload.run(predict_signal, symbol, data, details=details, model=model)
+            quote_table.update(symbol, quotes.build_quote(symbol, data, signal, details, clock.now()))
             
-            session = Session()
+            # Queue the update for clients; unchanged prices and signals are not sent again
+            if stock_broadcaster.update(symbol, stock_update(data, signal)):
+                update_log.debug("Queued update for %s: ₹%s, Signal: %s", symbol, current_price, signal, extra={'symbol': symbol})
             
-            for stock in stocks:
-                symbol = stock['symbol']
-                for attempt in range(3):
-                    try:
-                        if symbol not in cache or (datetime.now() - cache[symbol]['timestamp']).seconds > 3600:
-                            end_date = datetime.now()
-                            start_date = end_date - timedelta(days=365)
-                            data = yf.Ticker(symbol + ".NS").history(start=start_date, end=end_date)
-                            if data.empty:
-                                print(f"No data for {symbol}")
-                                break
-                            cache[symbol] = {'data': data, 'timestamp': datetime.now()}
-                        else:
-                            latest = yf.Ticker(symbol + ".NS").history(period='1d')
-                            if not latest.empty:
-                                cache[symbol]['data'] = pd.concat([cache[symbol]['data'], latest]).drop_duplicates()
-
-                        data = calculate_technical_indicators(cache[symbol]['data'].copy())
-                        current_price = round(data['Close'].iloc[-1], 2)
-                        signal = predict_signal(symbol, data)
-                        
-                        # Emit update to clients
-                        # Get previous day price if available
-                        previous_day_price = None
-                        if len(data) > 1:
-                            previous_day_price = round(data['Close'].iloc[-2], 2)
-                        
-                        socketio.emit('stock_update', {
-                            'symbol': symbol,
-                            'current_price': current_price,
-                            'previous_day_price': previous_day_price,
-                            'signal': signal
-                        }, namespace=None)
-                        print(f"Emitted update for {symbol}: ₹{current_price}, Signal: {signal}")
-                        
-                        # Execute bot trade if applicable
-                        execute_bot_trade(symbol, signal, current_price, session)
-                        
-                        break
-                    except Exception as e:
-                        print(f"Error fetching {symbol} (attempt {attempt + 1}): {e}")
-                        if attempt < 2:
-                            time.sleep(2 ** attempt)
-                        else:
-                            print(f"Failed to fetch {symbol} after 3 attempts")
+            # Fill resting orders the price crossed, then execute bot trade if applicable
+            with trade_lock, metrics.timer(STAGE_SECONDS.labels('trade')):
+                fill_orders(symbol, current_price, session)
+                execute_bot_trade(symbol, signal, current_price, session)
             
-            session.close()
+            return data
         except Exception as e:
-            print(f"Update error: {e}")
-            time.sleep(10)
-        time.sleep(5)
+            update_log.warning("Error fetching %s (attempt %s): %s", symbol, attempt + 1, e, extra={'symbol': symbol})
+            if attempt < 2:
+                clock.sleep(2 ** attempt)
+            else:
+                update_log.error("Failed to fetch %s after 3 attempts", symbol, extra={'symbol': symbol})
+    return None
+
+
+def update_stock_data(shard=None):
+    """Refresh loop for one scheduler shard, or for every shard when shard is None."""
+    while True:
+        try:
+            sync_universe(clock.now().timestamp())
+            if trading_calendar is not None and not trading_calendar.is_polling(clock.now()):
+                # Market closed: no upstream calls, but wake in time for the next pre-open
+                wait = min(trading_calendar.seconds_until_polling(clock.now()), IDLE_CHECK_SECONDS)
+                count_upstream('idle_seconds', wait)
+                count_upstream('idle_calls_saved', refresh_scheduler.expected_refreshes(wait, clock.now().timestamp(), shard))
+                clock.sleep(max(wait, scheduler.MIN_WAIT))
+                continue
+
+            symbols = refresh_scheduler.due(clock.now().timestamp(), shard)
+            if symbols:
+                started = time.perf_counter()
+                session = Session()
+                try:
+                    for symbol in symbols:
+                        volatility = None
+                        try:
+                            data = symbol_profiles.run(symbol, refresh_symbol, symbol, session)
+                            metrics.TICK_SYMBOLS.labels('failed' if data is None else 'ok').inc()
+                            volatility = data['Volatility_20'].iloc[-1] if data is not None else None
+                        except Exception as e:
+                            metrics.TICK_SYMBOLS.labels('failed').inc()
+                            update_log.error("Update error for %s: %s", symbol, e, extra={'symbol': symbol})
+                            session.rollback()
+                        finally:
+                            # due() left the symbol in flight; only record() schedules it again
+                            refresh_scheduler.record(symbol, clock.now().timestamp(), volatility)
+                        # With gevent, the database and broadcast work runs on the loop: let requests in between symbols
+                        offload.cooperate()
+                finally:
+                    session.close()
+                    with metrics.timer(STAGE_SECONDS.labels('emit')):
+                        stock_broadcaster.flush()
+                TICK_SECONDS.labels('all' if shard is None else str(shard)).observe(time.perf_counter() - started)
+            clock.sleep(refresh_scheduler.wait(clock.now().timestamp(), shard))
+        except Exception as e:
+            update_log.error("Update error: %s", e)
+            clock.sleep(10)
+
+
+def start_update_workers():
+    """Start one update worker per scheduler shard: a thread, or with gevent a greenlet."""
+    if UPDATE_WORKERS == 1:
+        offload.spawn(update_stock_data, name='update')
+        return
+    for shard in range(UPDATE_WORKERS):
+        offload.spawn(update_stock_data, shard, name=f'update-{shard}')
+
+
+def warm_symbol(symbol):
+    """Load a symbol's model, bars and quote as its first loop pass would; False if it has no data."""
+    data = cached_history(symbol)
+    if data is None:
+        return False
+    details = {}
+    data, signal = score(symbol, data, details=details)
+    quote_table.update(symbol, quotes.build_quote(symbol, data, signal, details, clock.now()))
+    stock_broadcaster.update(symbol, stock_update(data, signal))
+    if symbol in chart_warmup_symbols:
+        # Right after cached_history, the chart's year of bars comes from the market data cache
+        chart_store.get(symbol, clock.now() - timedelta(days=charts.PERIODS['1y']))
+    return True
+
+
+# Until the startup warm-up is done /readyz is 503 and, with WARMUP_GATE on, so is the API
+startup_warmup = warmup.Warmup(warm_symbol, workers=int(os.getenv('WARMUP_THREADS', warmup.WORKERS)),
+                               timeout=float(os.getenv('WARMUP_TIMEOUT', warmup.TIMEOUT)))
+WARMUP_GATE = os.getenv('WARMUP_GATE', '1') != '0'
+# Paths served while warming: status and admin endpoints
+WARMUP_OPEN_PATHS = ('/api/system/', '/api/admin/')
+# Symbols whose chart history is also built; the chart store keeps only this many
+chart_warmup_symbols = set()
+
+
+def start_server():
+    """Warm the held symbols, then the rest of this shard's universe, and start the update workers after."""
+    universe, held = load_universe()
+    hot = list(dict.fromkeys(held + universe))
+    chart_warmup_symbols.update(hot[:chart_store.capacity])
+    startup_warmup.start(hot, on_ready=start_update_workers)
 
 
 @app.route('/api/stocks')
@@ -809,40 +1121,405 @@ def get_stock_list():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/quotes')
+def get_quotes():
+    """Latest quotes from the update loop for ?symbols=A,B (default all), without any upstream call."""
+    symbols = request.args.get('symbols')
+    symbols = [s.strip().upper() for s in symbols.split(',') if s.strip()] if symbols else None
+    return Response(quote_table.to_json(symbols), content_type='application/json')
+
+
+def build_chart(symbol, bars):
+    """Indicator frame and latest signal of a symbol's chart history."""
+    return score(symbol, bars, charts.FIELDS.values())
+
+
+chart_store = charts.ChartStore(lambda symbol, start, end: fetch_history(symbol, start=start, end=end),
+                                build_chart, clock=lambda: clock.now())
+
+
+def intraday_chart(symbol, interval, fields, points, columnar, label='date'):
+    """(rows, total rows, current price, rule signal) of the session's candles, or None if there are none."""
+    data = intraday_store.frame(symbol, interval)
+    if data is None:
+        return None
+    return offload.run(render_intraday, symbol, data, interval, fields, points, columnar, label)
+
+
+def render_intraday(symbol, data, interval, fields, points, columnar, label):
+    data = compute_indicators(data, RULE_FEATURES + list(charts.FIELDS.values()))
+    times, columns = charts.frame_arrays(data)
+    rows, total = charts.render(times, columns, fields, points, daily=False, columnar=columnar, label=label)
+    return rows, total, round(float(data['Close'].iloc[-1]), 2), predict_signal(symbol, data, interval)
+
+
+def series_response(payload):
+    """JSON, or MessagePack if the client asked for it (its series already in columns)."""
+    if wire.wants_msgpack(request.accept_mimetypes):
+        response = Response(wire.packb(payload), content_type=wire.MSGPACK)
+    else:
+        response = jsonify(payload)
+    response.vary.add('Accept')
+    return response
+
+
 @app.route('/api/stock/<symbol>')
 def get_stock_data(symbol):
+    """Chart history of a symbol.
+
+    Without a range this is the last 100 bars. Query parameters:
+    period (1mo ... 10y, ytd, max) or from/to ISO dates, resolution (1d, 1wk, 1mo,
+    or 1m/5m for today's intraday candles), fields (comma separated) and points
+    (maximum rows, downsampled with LTTB).
+    """
+    refresh_scheduler.watch(symbol, clock.now().timestamp())
     try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        stock = yf.Ticker(symbol + ".NS")
-        data = stock.history(start=start_date, end=end_date)
-        if data.empty:
-            return jsonify({'error': 'No data found for symbol'}), 404
+        fields = charts.parse_fields(request.args.get('fields'))
+        resolution = request.args.get('resolution', '1d')
+        points = min(request.args.get('points', charts.DEFAULT_POINTS, type=int), charts.MAX_POINTS)
+        period, start, end = request.args.get('period'), request.args.get('from'), request.args.get('to')
+        ranged = bool(period or start or end)
+        columnar = wire.wants_msgpack(request.accept_mimetypes)
+        if points < 3:
+            raise ValueError("points must be at least 3")
 
-        data = calculate_technical_indicators(data)
-        latest_signal = predict_signal(symbol, data)
-        prices = [
-            {
-                'date': str(index.date()),
-                'close': round(row['Close'], 2),
-                'volume': int(row['Volume']),
-                'sma50': round(row['SMA50'], 2) if pd.notna(row['SMA50']) else None,
-                'rsi': round(row['RSI'], 2) if pd.notna(row['RSI']) else None,
-                'macd': round(row['MACD'], 2) if pd.notna(row['MACD']) else None
-            }
-            for index, row in data.tail(100).iterrows()
-        ]
-        current_price = round(data['Close'].iloc[-1], 2)
-        return jsonify({
+        if resolution in intraday.INTERVALS:
+            chart = intraday_chart(symbol, resolution, fields, points, columnar)
+            if chart is None:
+                return jsonify({'error': f'No {resolution} candles for {symbol} in the current session'}), 404
+            prices, total, current_price, signal = chart
+        elif resolution in charts.DAILY_RESOLUTIONS:
+            range_start, range_end = charts.parse_range(period, start, end, clock.now())
+            entry = chart_store.get(symbol, range_start)
+            if entry is None:
+                return jsonify({'error': 'No data found for symbol'}), 404
+            if ranged:
+                prices, total = offload.run(charts.query, entry, range_start, range_end, resolution, fields, points,
+                                            columnar)
+            else:
+                # The last 100 bars of the cached year, as before ranges existed
+                times, columns = entry['times'], entry['columns']
+                if resolution != '1d':
+                    times, columns = charts.aggregate(times, columns, resolution)
+                prices, total = charts.render(times[-100:], {f: v[-100:] for f, v in columns.items()}, fields, points,
+                                              columnar=columnar)
+            # The update loop's quote is fresher than the cached chart history
+            quote = quote_table.get(symbol)
+            current_price, signal = (quote['price'], quote['signal']) if quote else (entry['current_price'], entry['signal'])
+        else:
+            raise ValueError(f"Unknown resolution {resolution}; use 1d, 1wk, 1mo, "
+                             f"{', '.join(intraday.INTERVALS)}")
+
+        return series_response({
             'prices': prices,
             'current_price': current_price,
-            'signal': latest_signal
+            'signal': signal,
+            'resolution': resolution,
+            'total_points': total,
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except market_data.Throttled as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/stock/<symbol>/intraday')
+def get_intraday_data(symbol):
+    """The session's candles; the same data as /api/stock/<symbol>?resolution=<interval>, keyed by 'time'."""
+    try:
+        interval = request.args.get('interval', '5m')
+        chart = intraday_chart(symbol, interval, charts.INTRADAY_FIELDS, charts.MAX_POINTS,
+                               wire.wants_msgpack(request.accept_mimetypes), label='time')
+        if chart is None:
+            return jsonify({'error': f'No {interval} candles for {symbol} in the current session'}), 404
+        candles, _, current_price, signal = chart
+        return series_response({
+            'interval': interval,
+            'candles': candles,
+            'current_price': current_price,
+            'signal': signal
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/system/refresh')
+def get_refresh_status():
+    now = clock.now().timestamp()
+    status = refresh_scheduler.summary(now)
+    if request.args.get('detail'):
+        status['staleness'] = refresh_scheduler.staleness(now)
+    status['broadcast'] = dict(stock_broadcaster.stats, seq=stock_broadcaster.seq,
+                               subscribers=stock_broadcaster.subscriber_counts())
+    return jsonify(status)
+
+
+def update_subscribers():
+    refresh_scheduler.set_subscribers(stock_broadcaster.subscriber_counts(), clock.now().timestamp())
+
+
+def requested_symbols(data):
+    """Symbols of a subscribe/unsubscribe message: {'symbols': [...]} or a single symbol string."""
+    symbols = data.get('symbols', []) if isinstance(data, dict) else data
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    return [str(symbol).upper() for symbol in symbols or []]
+
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    # The account is named in the connect auth ({'account': ...}) or the ?account= query parameter
+    account_id = (auth or {}).get('account') if isinstance(auth, dict) else None
+    account_id = account_id or request.args.get('account') or DEFAULT_ACCOUNT
+    if not ACCOUNT_ID.match(account_id):
+        return False
+    join_room(account_room(account_id))
+    join_room(broadcaster.LEGACY_ROOM)
+
+
+@socketio.on('disconnect')
+def handle_disconnect(reason=None):
+    if stock_broadcaster.unsubscribe(request.sid):
+        update_subscribers()
+
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Start sending a client stock_updates for symbols, beginning with a snapshot of them.
+
+    {'symbols': [...], 'binary': true} switches the client to MessagePack binary frames.
+    """
+    binary = data.get('binary') if isinstance(data, dict) else None
+    added = stock_broadcaster.subscribe(request.sid, requested_symbols(data), binary)
+    leave_room(broadcaster.LEGACY_ROOM)
+    for symbol in added:
+        join_room(broadcaster.symbol_room(symbol))
+    if added:
+        update_subscribers()
+    emit('stock_snapshot', stock_broadcaster.encode(stock_broadcaster.snapshot(added),
+                                                    stock_broadcaster.is_binary(request.sid)))
+
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    removed = stock_broadcaster.unsubscribe(request.sid, requested_symbols(data))
+    for symbol in removed:
+        leave_room(broadcaster.symbol_room(symbol))
+    if removed:
+        update_subscribers()
+
+
+@socketio.on('stock_snapshot')
+def resend_stock_snapshot():
+    # Snapshot of everything the client is subscribed to, e.g. after it reloaded its view
+    snapshot = stock_broadcaster.snapshot(stock_broadcaster.subscriptions(request.sid))
+    emit('stock_snapshot', stock_broadcaster.encode(snapshot, stock_broadcaster.is_binary(request.sid)))
+
+
+@app.route('/api/system/market')
+def get_market_status():
+    status = trading_calendar.describe(clock.now()) if trading_calendar else {'state': 'always_polling'}
+    with upstream_lock:
+        status['upstream'] = dict(upstream_stats, idle_calls_saved=round(upstream_stats['idle_calls_saved']))
+    return jsonify(status)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Under gevent the sampling profiler finds request greenlets through this
+    offload.track_request()
+
+
+# Registered after start_request_timer so that rejected requests are timed too
+@app.before_request
+def gate_until_warm():
+    if (WARMUP_GATE and not startup_warmup.ready and request.path.startswith('/api/')
+            and not request.path.startswith(WARMUP_OPEN_PATHS)):
+        response = jsonify({'error': 'Server is warming up', 'warmup': startup_warmup.status()})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+
+@app.before_request
+def select_account():
+    """The request's account: the X-Account-Id header or ?account=, else the default account."""
+    account_id = request.headers.get('X-Account-Id') or request.args.get('account') or DEFAULT_ACCOUNT
+    if not ACCOUNT_ID.match(account_id):
+        return jsonify({'error': 'Account ids are 1-64 letters, digits, dots, dashes or underscores'}), 400
+    g.account_id = account_id
+
+
+def changes_account(view):
+    """Write the account's ledger or bot settings in turn with the bot, which reloads the account after."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'GET':
+            return view(*args, **kwargs)
+        with trade_lock:
+            try:
+                return view(*args, **kwargs)
+            finally:
+                account_book.invalidate(g.account_id)
+    return wrapper
+
+
+@app.route('/healthz')
+def liveness():
+    """Liveness: the process serves requests. Restart on failure, but never for being cold."""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readiness():
+    """Readiness: 200 once the startup warm-up is done, 503 with its progress until then."""
+    status = startup_warmup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@app.after_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by route template, not path, so /api/stock/<symbol> is one series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - started)
+    return response
+
+
+# Registered after observe_request so that it runs first and the timing includes compression
+@app.after_request
+def compress_response(response):
+    return wire.compress(response, request.accept_encodings)
+
+
+def upstream_counters():
+    with upstream_lock:
+        return {(key,): value for key, value in upstream_stats.items()}
+
+
+metrics.Gauge('stock_trader_upstream_stats', 'Upstream calls made, and idle time and calls saved', ['key'],
+              function=upstream_counters)
+metrics.Gauge('stock_trader_market_data_in_flight', 'History downloads in progress, each shared by its waiting callers',
+              function=lambda: market_data_gateway.stats()['in_flight'])
+metrics.Gauge('stock_trader_ready', '1 once the startup warm-up is done',
+              function=lambda: int(startup_warmup.ready))
+metrics.Gauge('stock_trader_warmup_symbols', 'Symbols of the startup warm-up by outcome', ['state'],
+              function=lambda: {('warmed',): startup_warmup.done, ('without_data',): startup_warmup.failed,
+                                ('pending',): startup_warmup.total - startup_warmup.done - startup_warmup.failed})
+metrics.Gauge('stock_trader_open_orders', 'Resting orders waiting for their trigger',
+              function=lambda: len(order_books))
+metrics.Gauge('stock_trader_price_cache_symbols', 'Symbols with daily bars in the price cache',
+              function=lambda: len(price_cache))
+metrics.Gauge('stock_trader_intraday_bytes', 'Memory used by the intraday candle rings',
+              function=lambda: intraday_store.nbytes)
+metrics.Gauge('stock_trader_broadcast_stats', 'Stock updates queued, suppressed, batched and sent', ['key'],
+              function=lambda: {(key,): value for key, value in stock_broadcaster.stats.items()})
+metrics.Gauge('stock_trader_subscribed_symbols', 'Symbols with at least one subscribed client',
+              function=lambda: len(stock_broadcaster.subscriber_counts()))
+metrics.Gauge('stock_trader_staleness_p95_seconds', 'Seconds since the last refresh per scheduler tier (p95)', ['tier'],
+              function=lambda: {(tier,): stats['staleness_p95'] for tier, stats in
+                                refresh_scheduler.summary(clock.now().timestamp())['tiers'].items()
+                                if stats['staleness_p95'] is not None})
+
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+# Admin endpoints need this value in the X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+
+def admin_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Admin endpoints are disabled; set ADMIN_TOKEN to enable them'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            return jsonify({'error': 'Invalid admin token'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.route('/api/admin/logging', methods=['GET', 'PUT'])
+@admin_required
+def logging_settings():
+    if request.method == 'GET':
+        return jsonify(logs.get_config())
+    try:
+        return jsonify(logs.update_config(request.get_json(silent=True) or {}))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/admin/profile', methods=['POST'])
+@admin_required
+def profile_threads():
+    """Sample the update and request threads for ?seconds= (default 10, at most 60)."""
+    group = request.args.get('threads')
+    if group not in (None, 'update', 'requests', 'other'):
+        return jsonify({'error': 'threads must be update, requests or other'}), 400
+    try:
+        report = profiling.sample(request.args.get('seconds', 10, type=float),
+                                  request.args.get('interval', profiling.DEFAULT_INTERVAL, type=float), group)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    if request.args.get('format') == 'collapsed':
+        return Response(report['collapsed'] + '\n', content_type='text/plain; charset=utf-8')
+    return jsonify(report)
+
+
+@app.route('/api/admin/profile/<symbol>', methods=['POST'])
+@admin_required
+def profile_symbol(symbol):
+    """cProfile the update loop's next pass of one symbol, moving it to the front of the queue."""
+    symbol = symbol.upper()
+    slot = symbol_profiles.request(symbol)
+    if not refresh_scheduler.expedite(symbol, clock.now().timestamp()):
+        symbol_profiles.cancel(symbol, slot)
+        return jsonify({'error': f'{symbol} is not refreshed by this server'}), 404
+    timeout = min(request.args.get('timeout', 30, type=float), profiling.MAX_SECONDS)
+    if not slot['done'].wait(timeout):
+        symbol_profiles.cancel(symbol, slot)
+        return jsonify({'error': f'No pass of {symbol} within {timeout:g}s; is the market open?'}), 504
+    return jsonify(dict(slot['report'], symbol=symbol))
+
+
+@app.route('/api/system/memory')
+def get_memory_usage():
+    return jsonify(dict(model_store.memory_usage(), intraday_bytes=intraday_store.nbytes))
+
+
+@app.route('/api/risk')
+def get_portfolio_risk():
+    session = Session()
+    try:
+        holdings = {}
+        for entry in session.query(Portfolio).filter_by(account_id=g.account_id):
+            holdings[entry.symbol] = holdings.get(entry.symbol, 0) + entry.quantity
+        with open('stocks.json') as f:
+            sectors = {stock['symbol']: stock.get('sector', 'Unknown') for stock in json.load(f)}
+
+        confidence = request.args.get('confidence', risk.DEFAULT_CONFIDENCE, type=float)
+        scenarios = request.args.get('scenarios', risk.DEFAULT_SCENARIOS, type=int)
+        # Histories and the returns window are brought up to date here; with gevent the simulations run on a worker thread
+        inputs = risk_engine.prepare(holdings)
+        return jsonify(offload.run(risk.simulate, inputs, holdings, sectors, confidence, scenarios))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+
 @app.route('/api/portfolio', methods=['GET', 'POST', 'DELETE'])
+@changes_account
 def portfolio():
     session = Session()
     try:
@@ -854,11 +1531,7 @@ def portfolio():
             total_cost = quantity * buy_price
             
             # Get wallet
-            wallet = session.query(Wallet).first()
-            if not wallet:
-                wallet = Wallet(balance=0.0)
-                session.add(wallet)
-                session.commit()
+            wallet, _ = ensure_account(session, g.account_id)
             
             # Check if wallet has enough funds
             if wallet.balance < total_cost:
@@ -871,6 +1544,7 @@ def portfolio():
             
             # Add to portfolio
             entry = Portfolio(
+                account_id=g.account_id,
                 symbol=symbol,
                 quantity=quantity,
                 buy_price=buy_price,
@@ -880,6 +1554,7 @@ def portfolio():
             
             # Record transaction
             transaction = Transaction(
+                account_id=g.account_id,
                 transaction_id=str(uuid.uuid4()),
                 type='buy',
                 amount=total_cost,
@@ -898,11 +1573,11 @@ def portfolio():
             })
         elif request.method == 'DELETE':
             # Delete all entries from the portfolio
-            session.query(Portfolio).delete()
+            session.query(Portfolio).filter_by(account_id=g.account_id).delete()
             session.commit()
             return jsonify({'message': 'Portfolio cleared successfully'})
         else:
-            entries = session.query(Portfolio).all()
+            entries = session.query(Portfolio).filter_by(account_id=g.account_id).all()
             portfolio_data = [
                 {
                     'id': e.id,
@@ -925,11 +1600,7 @@ def portfolio():
 def get_wallet():
     session = Session()
     try:
-        wallet = session.query(Wallet).first()
-        if not wallet:
-            wallet = Wallet(balance=0.0)
-            session.add(wallet)
-            session.commit()
+        wallet, _ = ensure_account(session, g.account_id, create=False)
         
         return jsonify({
             'balance': wallet.balance
@@ -941,6 +1612,7 @@ def get_wallet():
 
 
 @app.route('/api/wallet/deposit', methods=['POST'])
+@changes_account
 def deposit_to_wallet():
     session = Session()
     try:
@@ -951,15 +1623,13 @@ def deposit_to_wallet():
         if amount <= 0:
             return jsonify({'error': 'Deposit amount must be greater than 0'}), 400
         
-        wallet = session.query(Wallet).first()
-        if not wallet:
-            wallet = Wallet(balance=0.0)
-            session.add(wallet)
+        wallet, _ = ensure_account(session, g.account_id)
         
         wallet.balance += amount
         
         # Record transaction
         transaction = Transaction(
+            account_id=g.account_id,
             transaction_id=str(uuid.uuid4()),
             type='deposit',
             amount=amount,
@@ -976,7 +1646,7 @@ def deposit_to_wallet():
             'wallet_balance': wallet.balance,
             'timestamp': datetime.now().isoformat(),
             'description': description
-        })
+        }, to=account_room(g.account_id))
         
         return jsonify({
             'message': f'Successfully deposited ₹{amount:.2f}',
@@ -990,6 +1660,7 @@ def deposit_to_wallet():
 
 
 @app.route('/api/wallet/withdraw', methods=['POST'])
+@changes_account
 def withdraw_from_wallet():
     session = Session()
     try:
@@ -1000,7 +1671,7 @@ def withdraw_from_wallet():
         if amount <= 0:
             return jsonify({'error': 'Withdrawal amount must be greater than 0'}), 400
         
-        wallet = session.query(Wallet).first()
+        wallet = session.query(Wallet).filter_by(account_id=g.account_id).first()
         if not wallet:
             return jsonify({'error': 'Wallet not found'}), 404
         
@@ -1011,6 +1682,7 @@ def withdraw_from_wallet():
         
         # Record transaction
         transaction = Transaction(
+            account_id=g.account_id,
             transaction_id=str(uuid.uuid4()),
             type='withdrawal',
             amount=amount,
@@ -1027,7 +1699,7 @@ def withdraw_from_wallet():
             'wallet_balance': wallet.balance,
             'timestamp': datetime.now().isoformat(),
             'description': description
-        })
+        }, to=account_room(g.account_id))
         
         return jsonify({
             'message': f'Successfully withdrew ₹{amount:.2f}',
@@ -1044,7 +1716,7 @@ def withdraw_from_wallet():
 def get_transactions():
     session = Session()
     try:
-        transactions = session.query(Transaction).order_by(Transaction.timestamp.desc()).all()
+        transactions = session.query(Transaction).filter_by(account_id=g.account_id).order_by(Transaction.timestamp.desc()).all()
         
         transaction_list = [
             {
@@ -1069,15 +1741,17 @@ def get_transactions():
 
 
 @app.route('/api/trading-bot', methods=['GET', 'PUT'])
+@changes_account
 def trading_bot_settings():
     session = Session()
     try:
-        bot = session.query(TradingBot).first()
+        _, bot = ensure_account(session, g.account_id, create=request.method != 'GET')
         
         # Handle reset performance metrics
         if request.method == 'PUT' and request.json.get('reset_performance', False):
             # Delete all bot transactions
             bot_transactions = session.query(Transaction).filter(
+                Transaction.account_id == g.account_id,
                 Transaction.description.like('%[BOT]%')
             ).all()
             
@@ -1149,6 +1823,7 @@ def trading_bot_settings():
 
 
 @app.route('/api/trade', methods=['POST'])
+@changes_account
 def trade():
     session = Session()
     try:
@@ -1159,82 +1834,21 @@ def trade():
         current_price = float(data['current_price'])
         
         # Get wallet
-        wallet = session.query(Wallet).first()
-        if not wallet:
-            wallet = Wallet(balance=0.0)
-            session.add(wallet)
-            session.commit()
+        wallet, _ = ensure_account(session, g.account_id)
         
         total_cost = quantity * current_price
         
-        if action == 'buy':
-            # Check if wallet has enough funds
-            if wallet.balance < total_cost:
-                return jsonify({'error': f'Insufficient funds in wallet. Required: ₹{total_cost:.2f}, Available: ₹{wallet.balance:.2f}'}), 400
-            
-            # Deduct from wallet
-            wallet.balance -= total_cost
-            
-            # Add to portfolio
-            entry = Portfolio(
-                symbol=symbol,
-                quantity=quantity,
-                buy_price=current_price,
-                buy_date=datetime.now()
-            )
-            session.add(entry)
-            
-            # Record transaction
-            transaction = Transaction(
-                transaction_id=str(uuid.uuid4()),
-                type='buy',
-                amount=total_cost,
-                symbol=symbol,
-                quantity=quantity,
-                price=current_price,
-                description=f'Bought {quantity} shares of {symbol} at ₹{current_price:.2f} per share',
-                timestamp=datetime.now()
-            )
-            session.add(transaction)
-            
-        elif action == 'sell':
-            # Check if user has the stock
-            entries = session.query(Portfolio).filter_by(symbol=symbol).all()
-            total_quantity = sum(entry.quantity for entry in entries)
-            
-            if total_quantity < quantity:
-                return jsonify({'error': f'Insufficient quantity. You have {total_quantity} shares of {symbol}'}), 400
-            
-            # Process the sell order
-            remaining_to_sell = quantity
-            for entry in entries:
-                if remaining_to_sell <= 0:
-                    break
-                    
-                if entry.quantity <= remaining_to_sell:
-                    # Sell all shares in this entry
-                    remaining_to_sell -= entry.quantity
-                    session.delete(entry)
-                else:
-                    # Sell part of the shares in this entry
-                    entry.quantity -= remaining_to_sell
-                    remaining_to_sell = 0
-            
-            # Add to wallet
-            wallet.balance += total_cost
-            
-            # Record transaction
-            transaction = Transaction(
-                transaction_id=str(uuid.uuid4()),
-                type='sell',
-                amount=total_cost,
-                symbol=symbol,
-                quantity=quantity,
-                price=current_price,
-                description=f'Sold {quantity} shares of {symbol} at ₹{current_price:.2f} per share',
-                timestamp=datetime.now()
-            )
-            session.add(transaction)
+        try:
+            if action == 'buy':
+                transaction = buy_shares(session, wallet, symbol, quantity, current_price,
+                                         f'Bought {quantity} shares of {symbol} at ₹{current_price:.2f} per share',
+                                         datetime.now())
+            elif action == 'sell':
+                transaction = sell_shares(session, wallet, symbol, quantity, current_price,
+                                          f'Sold {quantity} shares of {symbol} at ₹{current_price:.2f} per share',
+                                          datetime.now())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
             
         session.commit()
         
@@ -1248,7 +1862,7 @@ def trade():
             'wallet_balance': wallet.balance,
             'timestamp': datetime.now().isoformat(),
             'description': transaction.description
-        })
+        }, to=account_room(g.account_id))
         
         return jsonify({
             'message': f'{action.capitalize()} executed for {symbol}',
@@ -1261,12 +1875,100 @@ def trade():
         session.close()
 
 
+@app.route('/api/orders', methods=['GET', 'POST'])
+@changes_account
+def resting_orders():
+    """Place a resting order, or list the account's orders (?status=open for the working ones)."""
+    session = Session()
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Expected a JSON object'}), 400
+            symbol = str(data['symbol']).upper()
+            side = data.get('side')
+            order_type = data.get('type')
+            quantity = int(data['quantity'])
+            trigger_price = float(data['trigger_price']) if data.get('trigger_price') is not None else None
+            trail_percent = float(data['trail_percent']) if data.get('trail_percent') is not None else None
+            orders.validate(side, order_type, quantity, trigger_price, trail_percent)
+
+            peak_price = None
+            if order_type == 'trailing_stop':
+                quote = quote_table.get(symbol)
+                if quote is None:
+                    raise ValueError(f'No current price of {symbol} to trail from yet')
+                peak_price = quote['price']
+                trigger_price = round(peak_price * (1 - trail_percent / 100 if side == 'sell' else 1 + trail_percent / 100), 2)
+            if side == 'sell':
+                held = session.query(func.sum(Portfolio.quantity)).filter_by(account_id=g.account_id, symbol=symbol).scalar() or 0
+                if held < quantity:
+                    raise ValueError(f'Insufficient quantity. You have {held} shares of {symbol}')
+
+            ensure_account(session, g.account_id)
+            if not order_books.loaded:
+                load_order_books(session)
+            order = Order(account_id=g.account_id, symbol=symbol, side=side, type=order_type, quantity=quantity,
+                          trigger_price=trigger_price, trail_percent=trail_percent, peak_price=peak_price,
+                          status='open', created_at=datetime.now())
+            session.add(order)
+            session.commit()
+            order_books.add(order.id, symbol, side, order_type, trigger_price, trail_percent, peak_price)
+            return jsonify(order_json(order))
+
+        query = session.query(Order).filter_by(account_id=g.account_id)
+        if request.args.get('status'):
+            query = query.filter_by(status=request.args['status'])
+        return jsonify([order_json(order) for order in query.order_by(Order.id.desc())])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+
+@app.route('/api/orders/<int:order_id>', methods=['DELETE'])
+@changes_account
+def cancel_order(order_id):
+    session = Session()
+    try:
+        order = session.query(Order).filter_by(id=order_id, account_id=g.account_id).first()
+        if not order:
+            return jsonify({'error': 'Order not found'}), 404
+        if order.status != 'open':
+            return jsonify({'error': f'Order {order_id} is already {order.status}'}), 400
+        order.status = 'cancelled'
+        order.updated_at = datetime.now()
+        session.commit()
+        # Only once the cancellation is stored, so a failed commit leaves the order live in its book
+        order_books.cancel(order.id)
+        socketio.emit('order_updated', order_json(order), to=account_room(g.account_id))
+        return jsonify(order_json(order))
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+
+# Hashed build files are cached by browsers for a year and sent precompressed from memory
+asset_server = static_assets.AssetServer(os.path.join(app.root_path, 'static'))
+
+
 @app.route('/')
 @app.route('/<path:path>')
-def serve_react_app(path='index.html'):
-    return send_from_directory(app.static_folder, path)
+def serve_react_app(path=''):
+    """The React build; paths without an extension are client-side routes and get index.html."""
+    if path.startswith('api/'):
+        return jsonify({'error': 'Not found'}), 404
+    response = asset_server.response(path, request)
+    if response is None:
+        return jsonify({'error': 'Not found'}), 404
+    return response
 
 
 if __name__ == '__main__':
-    threading.Thread(target=update_stock_data, daemon=True).start()
+    start_server()
     socketio.run(app, debug=True)
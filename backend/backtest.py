@@ -0,0 +1,422 @@
+"""Historical backtest of the trading bot.
+
+Replays the rules of ``app.execute_bot_trade`` over daily bars for every
+symbol in stocks.json: the combined model and rule-based signal of
+``predict_signal``, the market-condition overrides, ``max_trades_per_day``,
+``max_open_positions``, ``max_investment_per_trade``, profit target and stop
+loss. Signals do not depend on the bot settings, so they are precomputed for
+the whole history with vectorized pandas/numpy code; only the stateful
+portfolio simulation runs as a loop over days.
+
+The bot is evaluated once per daily bar at its close. Predictions come from the
+currently saved models, which were trained on part of the same history, so
+model-driven results are optimistic.
+
+Usage:
+    python backtest.py --years 5 --cash 100000 --data-dir bars
+"""
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import model_store
+from history import load_history, load_symbols
+from indicators import compute_indicators, RULE_FEATURES, MARKET_FEATURES
+
+# TradingBot column defaults
+DEFAULT_SETTINGS = {
+    'max_investment_per_trade': 5000.0,
+    'profit_target_percentage': 5.0,
+    'stop_loss_percentage': 3.0,
+    'max_trades_per_day': 5,
+    'max_open_positions': 3,
+}
+
+SETTING_NAMES = list(DEFAULT_SETTINGS)
+
+BUY, HOLD, SELL = 1, 0, -1
+
+# execute_bot_trade looks at the last 60 calendar days when judging market conditions
+MARKET_WINDOW = '60D'
+
+
+def _prev(values):
+    """Values shifted forward one bar, NaN for the first."""
+    return np.concatenate(([np.nan], values[:-1]))
+
+
+def _crossed_above(a, b):
+    return (a > b) & (_prev(a) <= _prev(b))
+
+
+def _crossed_below(a, b):
+    return (a < b) & (_prev(a) >= _prev(b))
+
+
+def rule_scores(data):
+    """Vectorized buy/sell scores of the rule-based system in predict_signal, one per bar."""
+    col = {name: data[name].to_numpy(dtype=float) for name in RULE_FEATURES + ['Close']}
+    close = col['Close']
+    prev_close = _prev(close)
+    buy = np.zeros(len(data), dtype=np.int64)
+    sell = np.zeros(len(data), dtype=np.int64)
+
+    # 1. Moving Average Crossovers
+    for fast, slow, weight in (('SMA5', 'SMA20', 2), ('SMA20', 'SMA50', 1), ('SMA50', 'SMA200', 3)):
+        up = _crossed_above(col[fast], col[slow])
+        buy += weight * up
+        sell += weight * (~up & _crossed_below(col[fast], col[slow]))
+
+    # 2. RSI Conditions and divergence
+    rsi = col['RSI']
+    oversold = rsi < 30
+    overbought = ~oversold & (rsi > 70)
+    leaning_buy = ~oversold & ~overbought & (rsi >= 30) & (rsi < 45)
+    leaning_sell = ~oversold & ~overbought & ~leaning_buy & (rsi > 55) & (rsi <= 70)
+    buy += 2 * oversold + leaning_buy
+    sell += 2 * overbought + leaning_sell
+    bullish = (rsi > _prev(rsi)) & (close < prev_close)
+    buy += bullish
+    sell += ~bullish & (rsi < _prev(rsi)) & (close > prev_close)
+
+    # 3. MACD Signal and histogram
+    up = _crossed_above(col['MACD'], col['Signal_Line'])
+    buy += 2 * up
+    sell += 2 * (~up & _crossed_below(col['MACD'], col['Signal_Line']))
+    hist = col['MACD_Hist']
+    turned_up = (hist > 0) & (_prev(hist) <= 0)
+    buy += turned_up
+    sell += ~turned_up & (hist < 0) & (_prev(hist) >= 0)
+
+    # 4. Bollinger Bands and squeeze
+    below = close < col['BB_Lower']
+    buy += below
+    sell += ~below & (close > col['BB_Upper'])
+    width_avg = data['BB_Width'].rolling(window=20).mean().to_numpy()
+    squeeze = col['BB_Width'] < width_avg * 0.8
+    breakout_up = close > col['BB_Mid']
+    buy += squeeze & breakout_up
+    sell += squeeze & ~breakout_up
+
+    # 5. Stochastic Oscillator
+    k, d = col['%K'], col['%D']
+    stoch_buy = (k < 20) & (k > d)
+    buy += stoch_buy
+    sell += ~stoch_buy & (k > 80) & (k < d)
+
+    # 6. Volume and On-Balance Volume
+    heavy = col['Volume_Ratio'] > 1.5
+    volume_buy = heavy & (col['Pct_Change'] > 0)
+    buy += volume_buy
+    sell += ~volume_buy & heavy & (col['Pct_Change'] < 0)
+    obv = col['OBV']
+    obv_sma = data['OBV'].rolling(window=20).mean().to_numpy()
+    obv_up = (obv > obv_sma) & (_prev(obv) <= _prev(obv_sma))
+    buy += obv_up
+    sell += ~obv_up & (obv < obv_sma) & (_prev(obv) >= _prev(obv_sma))
+
+    # 7. Price Momentum
+    momentum_up = (col['ROC_5'] > 0) & (col['ROC_20'] > 0)
+    buy += momentum_up
+    sell += ~momentum_up & (col['ROC_5'] < 0) & (col['ROC_20'] < 0)
+
+    # 8. Support/Resistance breakouts
+    breakout = (prev_close < col['Resistance_Level']) & (close > col['Resistance_Level'])
+    buy += 2 * breakout
+    sell += 2 * (~breakout & (prev_close > col['Support_Level']) & (close < col['Support_Level']))
+
+    # 9. ADX (Trend Strength)
+    trending = col['ADX'] > 25
+    buy += trending & (col['SMA5'] > col['SMA20'])
+    sell += trending & (col['SMA5'] < col['SMA20'])
+
+    # 10. High volatility reduces conviction in both directions
+    volatile = col['Volatility_20'] > 0.4
+    buy = np.where(volatile, np.maximum(0, buy - 1), buy)
+    sell = np.where(volatile, np.maximum(0, sell - 1), sell)
+    return buy, sell
+
+
+def model_signals(symbol, data):
+    """Model prediction per bar (Hold where features are missing or there is no model)."""
+    signals = np.zeros(len(data), dtype=np.int8)
+    model = model_store.get_model(symbol)
+    if model is None:
+        return signals
+    missing = [feature for feature in model.features if feature not in data.columns]
+    if missing:
+        compute_indicators(data, missing)
+    X = data[model.features].to_numpy(dtype=float)
+    valid = ~np.isnan(X).any(axis=1)
+    if valid.any():
+        signals[valid] = model.predict(X[valid]).astype(np.int8)
+    return signals
+
+
+def market_overrides(data, signal):
+    """Apply the market-condition overrides of execute_bot_trade to a signal array."""
+    close = data['Close']
+    window = data['Close'].rolling(MARKET_WINDOW)
+    # The 60-day lookback rarely holds 50 bars, in which case SMA50 is NaN and the trend is neutral
+    has_sma50 = window.count() >= 50
+    strong_up = has_sma50 & (data['SMA5'] > data['SMA20']) & (data['SMA20'] > data['SMA50'])
+    strong_down = has_sma50 & (data['SMA5'] < data['SMA20']) & (data['SMA20'] < data['SMA50'])
+    high_volatility = data['Daily_Return'].rolling(MARKET_WINDOW).std() * 100 > 3
+    overbought = data['RSI'] > 70
+    oversold = data['RSI'] < 30
+    above_resistance = close > data['BB_Upper']
+    below_support = ~above_resistance & (close < data['BB_Lower'])
+    low_volume = data['Volume_Ratio'] < 0.5
+
+    hold_sell = (strong_up & ~high_volatility & ~overbought) | (below_support & ~strong_down)
+    hold_buy = ((strong_down & high_volatility & ~oversold)
+                | (above_resistance & ~strong_up)
+                | (low_volume & ~below_support))
+
+    signal = signal.copy()
+    signal[(signal == SELL) & hold_sell.to_numpy()] = HOLD
+    signal[(signal == BUY) & hold_buy.to_numpy()] = HOLD
+    return signal
+
+
+def symbol_signals(symbol, bars):
+    """Final bot signal for every bar of one symbol."""
+    model = model_store.get_model(symbol)
+    features = RULE_FEATURES + MARKET_FEATURES + (model.features if model else [])
+    data = compute_indicators(bars.copy(), features)
+
+    buy, sell = rule_scores(data)
+    rule = np.where(buy - sell >= 3, BUY, np.where(sell - buy >= 3, SELL, HOLD)).astype(np.int8)
+    # Agreement, a neutral model or a disagreement all resolve to the rule signal
+    # unless it is Hold, in which case the model decides
+    signal = np.where(rule != HOLD, rule, model_signals(symbol, data)).astype(np.int8)
+    # predict_signal holds until it has 50 bars of history
+    signal[:49] = HOLD
+    return market_overrides(data, signal)
+
+
+class SignalSet:
+    """Closes and bot signals for many symbols on a shared daily calendar."""
+
+    def __init__(self, symbols, dates, close, signal):
+        self.symbols = symbols
+        self.dates = dates
+        self.close = close
+        self.signal = signal
+
+
+def prepare_signals(histories):
+    """Build a SignalSet from {symbol: bars}, preserving the symbols' order."""
+    symbols = [symbol for symbol, bars in histories.items() if bars is not None and not bars.empty]
+    dates = pd.DatetimeIndex(sorted(set().union(*(histories[s].index.normalize() for s in symbols))))
+    close = np.full((len(dates), len(symbols)), np.nan)
+    signal = np.zeros((len(dates), len(symbols)), dtype=np.int8)
+    for j, symbol in enumerate(symbols):
+        bars = histories[symbol]
+        rows = dates.get_indexer(bars.index.normalize())
+        close[rows, j] = bars['Close'].round(2).to_numpy()
+        signal[rows, j] = symbol_signals(symbol, bars)
+    return SignalSet(symbols, dates, close, signal)
+
+
+def simulate(signals, settings, initial_cash=100000.0, record_trades=True):
+    """Run the bot's portfolio rules day by day over precomputed signals."""
+    max_investment = float(settings['max_investment_per_trade'])
+    profit_target = 1 + settings['profit_target_percentage'] / 100
+    stop_loss = 1 - settings['stop_loss_percentage'] / 100
+    max_trades = int(settings['max_trades_per_day'])
+    max_open = int(settings['max_open_positions'])
+
+    n_days, n_symbols = signals.close.shape
+    # Plain lists index much faster than numpy scalars inside the loop
+    close_rows = signals.close.tolist()
+    signal_rows = signals.signal.tolist()
+    quantity = [0] * n_symbols
+    buy_price = [0.0] * n_symbols
+    last_price = [0.0] * n_symbols
+    cash = float(initial_cash)
+    open_positions = 0
+    trade_count = 0
+    equity = np.empty(n_days)
+    trades = []
+
+    for t in range(n_days):
+        prices = close_rows[t]
+        day_signals = signal_rows[t]
+        trades_today = 0
+        for j in range(n_symbols):
+            price = prices[j]
+            if price != price:  # no bar for this symbol today
+                continue
+            last_price[j] = price
+            signal = day_signals[j]
+            held = quantity[j]
+            if not held and signal != BUY:
+                continue
+            if trades_today >= max_trades:
+                break
+
+            if signal == BUY and not held:
+                if open_positions >= max_open:
+                    continue
+                budget = min(max_investment, cash)
+                if budget < price:
+                    continue
+                qty = int(budget / price)
+                if qty <= 0:
+                    continue
+                cash -= qty * price
+                quantity[j] = qty
+                buy_price[j] = price
+                open_positions += 1
+                trades_today += 1
+                trade_count += 1
+                if record_trades:
+                    trades.append((t, j, 'buy', qty, price, 'buy signal', 0.0))
+            elif held:
+                if signal == SELL:
+                    reason = 'sell signal'
+                elif price >= buy_price[j] * profit_target:
+                    reason = 'profit target'
+                elif price <= buy_price[j] * stop_loss:
+                    reason = 'stop loss'
+                else:
+                    continue
+                cash += held * price
+                quantity[j] = 0
+                open_positions -= 1
+                trades_today += 1
+                trade_count += 1
+                if record_trades:
+                    trades.append((t, j, 'sell', held, price, reason, held * (price - buy_price[j])))
+
+        equity[t] = cash + sum(q * p for q, p in zip(quantity, last_price) if q)
+
+    return BacktestResult(signals, equity, trades, trade_count, initial_cash)
+
+
+class BacktestResult:
+    """Equity curve, drawdown, trade log and per-symbol statistics of one run."""
+
+    def __init__(self, signals, equity, trades, trade_count, initial_cash):
+        self.signals = signals
+        self.equity = equity
+        self.trades = trades
+        self.trade_count = trade_count
+        self.initial_cash = initial_cash
+        peak = np.maximum.accumulate(equity) if len(equity) else equity
+        self.drawdown = equity / peak - 1 if len(equity) else equity
+
+    @property
+    def total_return(self):
+        return self.equity[-1] / self.initial_cash - 1 if len(self.equity) else 0.0
+
+    @property
+    def max_drawdown(self):
+        return float(self.drawdown.min()) if len(self.drawdown) else 0.0
+
+    def summary(self):
+        return {
+            'total_return_pct': round(self.total_return * 100, 2),
+            'max_drawdown_pct': round(self.max_drawdown * 100, 2),
+            'trades': self.trade_count,
+            'final_equity': round(float(self.equity[-1]), 2) if len(self.equity) else self.initial_cash,
+        }
+
+    def equity_frame(self):
+        return pd.DataFrame({'equity': self.equity, 'drawdown': self.drawdown},
+                            index=self.signals.dates.rename('date'))
+
+    def trades_frame(self):
+        rows = [
+            {
+                'date': self.signals.dates[t].date(),
+                'symbol': self.signals.symbols[j],
+                'type': side,
+                'quantity': qty,
+                'price': price,
+                'reason': reason,
+                'pnl': round(pnl, 2),
+            }
+            for t, j, side, qty, price, reason, pnl in self.trades
+        ]
+        return pd.DataFrame(rows, columns=['date', 'symbol', 'type', 'quantity', 'price', 'reason', 'pnl'])
+
+    def symbol_stats(self):
+        trades = self.trades_frame()
+        sells = trades[trades['type'] == 'sell']
+        stats = pd.DataFrame(index=pd.Index(self.signals.symbols, name='symbol'))
+        stats['trades'] = trades.groupby('symbol').size()
+        stats['round_trips'] = sells.groupby('symbol').size()
+        stats['wins'] = sells[sells['pnl'] > 0].groupby('symbol').size()
+        stats['realized_pnl'] = sells.groupby('symbol')['pnl'].sum()
+        stats = stats.fillna(0)
+        stats['win_rate_pct'] = np.where(stats['round_trips'] > 0,
+                                         stats['wins'] / stats['round_trips'].replace(0, 1) * 100, 0).round(1)
+        return stats.astype({'trades': int, 'round_trips': int, 'wins': int}).round(2)
+
+
+def load_histories(symbols, years, data_dir=None):
+    """Daily bars for each symbol; symbols without data are reported and skipped."""
+    histories = {}
+    for symbol in symbols:
+        try:
+            bars = load_history(symbol, int(years * 365), data_dir)
+        except Exception as e:
+            print(f"Error loading history for {symbol}: {e}")
+            continue
+        if bars.empty:
+            print(f"No data for {symbol}")
+            continue
+        histories[symbol] = bars
+    return histories
+
+
+def add_setting_arguments(parser):
+    for name, default in DEFAULT_SETTINGS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest the trading bot over historical daily bars')
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--cash', type=float, default=100000.0, help='Starting wallet balance')
+    parser.add_argument('--symbols', nargs='*', help='Defaults to every symbol in stocks.json')
+    parser.add_argument('--data-dir', help='Directory of recorded <SYMBOL>.csv bars (filled from Yahoo if missing)')
+    parser.add_argument('--out', help='Directory to write equity.csv, trades.csv and symbols.csv')
+    add_setting_arguments(parser)
+    args = parser.parse_args()
+
+    settings = {name: getattr(args, name) for name in SETTING_NAMES}
+    symbols = args.symbols or load_symbols()
+
+    started = time.time()
+    histories = load_histories(symbols, args.years, args.data_dir)
+    loaded = time.time()
+    signals = prepare_signals(histories)
+    prepared = time.time()
+    result = simulate(signals, settings, args.cash)
+    finished = time.time()
+
+    print(f"\n{'='*60}")
+    print(f"Backtest of {len(signals.symbols)} symbols over {len(signals.dates)} days")
+    print(f"Settings: {settings}")
+    for key, value in result.summary().items():
+        print(f"{key}: {value}")
+    print(f"Load {loaded - started:.2f}s, signals {prepared - loaded:.2f}s, simulation {finished - prepared:.2f}s")
+    print(f"{'='*60}")
+    print(result.symbol_stats().sort_values('realized_pnl', ascending=False).to_string())
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        result.equity_frame().to_csv(os.path.join(args.out, 'equity.csv'))
+        result.trades_frame().to_csv(os.path.join(args.out, 'trades.csv'), index=False)
+        result.symbol_stats().to_csv(os.path.join(args.out, 'symbols.csv'))
+        print(f"Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Micro-benchmarks for the backend hot paths.
+
+Every case runs inside a temporary directory with its own data.db, links to the
+saved models and synthetic OHLCV bars, so no network access or real data is
+needed. Results are written as JSON; comparing against a saved baseline fails
+the run when a case's time regresses past the threshold.
+
+Usage:
+    python benchmark.py --out benchmark_results.json
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --threshold 0.25
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import wire
+
+from replay import prepare_workspace
+
+MODEL_SYMBOL = 'RELIANCE'
+# A year of chart rows with eight fields, requested in each encoding
+CHART_URL = f'/api/stock/{MODEL_SYMBOL}?period=max&fields=open,high,low,close,volume,sma50,rsi,macd'
+# Request headers of each encoding
+PAYLOAD_HEADERS = {
+    'json': {},
+    'json_gzip': {'Accept-Encoding': 'gzip'},
+    'msgpack': {'Accept': wire.MSGPACK},
+    'msgpack_gzip': {'Accept': wire.MSGPACK, 'Accept-Encoding': 'gzip'},
+}
+RULES_SYMBOL = 'NOMODEL'
+SEEDED_TRANSACTIONS = 1000
+
+
+def synthetic_bars(days=365, seed=0, start_price=1000.0):
+    """Random-walk daily OHLCV bars indexed like Yahoo Finance history."""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=pd.Timestamp('2026-10-16'), periods=days, tz='Asia/Kolkata')
+    close = start_price * np.exp(np.cumsum(rng.normal(0.0004, 0.015, days)))
+    open_ = close * (1 + rng.normal(0, 0.005, days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, days)))
+    volume = rng.integers(500_000, 5_000_000, days).astype(float)
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=index)
+
+
+def measure(func, repeat, number):
+    """Per-call times in milliseconds: the median and best of `repeat` rounds of `number` calls."""
+    func()
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - started) * 1000 / number)
+    return {'median_ms': round(float(np.median(rounds)), 4), 'min_ms': round(min(rounds), 4),
+            'repeat': repeat, 'number': number}
+
+
+def build_cases(app, bars):
+    """Ordered (name, func, number) benchmark cases against an imported app module."""
+    import model_store
+
+    app.fetch_history = lambda symbol, **kwargs: bars.copy()
+    client = app.app.test_client()
+
+    # 1. Funded wallet, active bot and a transaction history to list
+    session = app.Session()
+    session.query(app.Wallet).first().balance = 1e9
+    session.query(app.TradingBot).first().is_active = 1
+    now = datetime.now()
+    session.add_all([
+        app.Transaction(transaction_id=str(uuid.uuid4()), type='deposit', amount=100.0,
+                        description='Benchmark deposit', timestamp=now - timedelta(minutes=i))
+        for i in range(SEEDED_TRANSACTIONS)
+    ])
+    session.commit()
+    session.close()
+
+    with_model = app.compute_indicators(bars.copy(), app.signal_features(MODEL_SYMBOL))
+    rules_only = app.compute_indicators(bars.copy(), app.signal_features(RULES_SYMBOL))
+    model = model_store.get_model(MODEL_SYMBOL)
+    latest = with_model.tail(1)[model.features].values
+    price = round(float(bars['Close'].iloc[-1]), 2)
+    bot_session = app.Session()
+
+    def model_load():
+        model_store._models.clear()
+        model_store.get_model(MODEL_SYMBOL)
+
+    encodings = {name: client.get(CHART_URL, headers=headers).data for name, headers in PAYLOAD_HEADERS.items()}
+
+    def trade_round_trip():
+        for action in ('buy', 'sell'):
+            client.post('/api/trade', json={'symbol': MODEL_SYMBOL, 'action': action,
+                                            'quantity': 1, 'current_price': price})
+
+    cases = [
+        ('calculate_technical_indicators', lambda: app.calculate_technical_indicators(bars.copy()), 10),
+        ('calculate_adx', lambda: app.calculate_adx(bars.copy()), 20),
+        ('compute_indicators_signal_features',
+         lambda: app.compute_indicators(bars.copy(), app.signal_features(MODEL_SYMBOL)), 10),
+        ('predict_signal_model', lambda: app.predict_signal(MODEL_SYMBOL, with_model), 20),
+        ('predict_signal_rules_only', lambda: app.predict_signal(RULES_SYMBOL, rules_only), 20),
+        ('execute_bot_trade_hold', lambda: app.execute_bot_trade(MODEL_SYMBOL, 'Hold', price, bot_session), 10),
+        ('api_stock', lambda: client.get(f'/api/stock/{MODEL_SYMBOL}'), 5),
+        ('api_transactions', lambda: client.get('/api/transactions'), 5),
+        ('api_trade_round_trip', trade_round_trip, 10),
+        ('api_stock_chart_json', lambda: client.get(CHART_URL), 5),
+        ('api_stock_chart_json_gzip', lambda: client.get(CHART_URL, headers=PAYLOAD_HEADERS['json_gzip']), 5),
+        ('decode_chart_json', lambda: json.loads(encodings['json']), 20),
+        ('model_load', model_load, 20),
+        ('model_predict', lambda: model.predict(latest), 50),
+    ]
+    if wire.available():
+        cases += [
+            ('api_stock_chart_msgpack', lambda: client.get(CHART_URL, headers=PAYLOAD_HEADERS['msgpack']), 5),
+            ('decode_chart_msgpack', lambda: wire.msgpack.unpackb(encodings['msgpack']), 20),
+        ]
+    return cases
+
+
+def payload_sizes(client):
+    """Bytes of the same chart response in each encoding the client can ask for."""
+    names = PAYLOAD_HEADERS if wire.available() else ['json', 'json_gzip']
+    return {name: len(client.get(CHART_URL, headers=PAYLOAD_HEADERS[name]).data) for name in names}
+
+
+def run_benchmarks(repeat, only=None):
+    """Import the app in a throwaway workspace and time every case; returns the times and the payload sizes."""
+    workspace = tempfile.mkdtemp(prefix='benchmark-')
+    cwd = os.getcwd()
+    results, sizes = {}, {}
+    try:
+        prepare_workspace(workspace, {MODEL_SYMBOL: MODEL_SYMBOL, RULES_SYMBOL: RULES_SYMBOL})
+        os.chdir(workspace)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            import app
+            cases = build_cases(app, synthetic_bars())
+            sizes = payload_sizes(app.app.test_client())
+            for name, func, number in cases:
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                results[name] = measure(func, repeat, number)
+            app.logs.flush()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+    return results, sizes
+
+
+def compare(results, baseline, threshold, metric='min_ms'):
+    """Cases whose tracked time grew by more than threshold relative to the baseline."""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base and stats[metric] > base[metric] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the backend hot paths')
+    parser.add_argument('--repeat', type=int, default=7, help='Timed rounds per case')
+    parser.add_argument('--only', nargs='*', help='Run only cases whose name contains one of these')
+    parser.add_argument('--out', help='Write results as JSON')
+    parser.add_argument('--baseline', help='Compare against results saved with --save-baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown of a case over the baseline (0.25 = 25%%)')
+    parser.add_argument('--metric', choices=['min_ms', 'median_ms'], default='min_ms',
+                        help='Time compared against the baseline; the best round is least affected by other load')
+    parser.add_argument('--save-baseline', help='Write these results as the new baseline')
+    args = parser.parse_args()
+
+    paths = {name: os.path.abspath(path) for name, path in
+             (('out', args.out), ('baseline', args.baseline), ('save_baseline', args.save_baseline)) if path}
+    results, sizes = run_benchmarks(args.repeat, args.only)
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+        'payload_bytes': sizes,
+    }
+
+    baseline = {}
+    if 'baseline' in paths:
+        with open(paths['baseline']) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.metric)
+
+    print(f"{'case':<38}{'median ms':>12}{'min ms':>12}{'baseline':>12}{'change':>10}")
+    for name, stats in results.items():
+        base = baseline.get('results', {}).get(name)
+        line = f"{name:<38}{stats['median_ms']:>12.3f}{stats['min_ms']:>12.3f}"
+        if base:
+            change = stats[args.metric] / base[args.metric] - 1
+            line += f"{base[args.metric]:>12.3f}{change:>+10.1%}"
+            if name in regressions:
+                line += '  REGRESSION'
+        print(line)
+    print('chart payload bytes: ' + ', '.join(f'{name} {size}' for name, size in sizes.items()))
+
+    for key in ('out', 'save_baseline'):
+        if key in paths:
+            with open(paths[key], 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Results written to {paths[key]}")
+
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
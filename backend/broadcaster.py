@@ -0,0 +1,173 @@
+"""Change-detecting, batched stock update broadcasts to subscribed clients.
+
+The update loop hands every refreshed symbol to the broadcaster instead of
+emitting it straight away. The broadcaster keeps the last payload sent per
+symbol, drops updates where nothing changed and sends the rest once per loop
+pass as a ``stock_updates`` message. Only changed fields are sent, under short
+keys:
+
+    {"seq": 42, "t": 1767590100250, "u": {"TCS": {"p": 3510.2}, "INFY": {"p": 1490.0, "s": "Buy"}}}
+
+Clients only receive the symbols they subscribed to. Clients with the same
+subscriptions (usually every dashboard showing the same watch list) share one
+message, so each pass serializes one batch per distinct subscription set rather
+than one per client. A client gets a ``stock_snapshot`` of the symbols it
+subscribes to, in the same encoding. ``seq`` numbers the batches and ``t`` is
+the server time of the flush in epoch milliseconds.
+
+Clients that subscribe with ``binary`` get both messages as MessagePack in
+binary frames instead (see wire.py).
+
+With ``legacy`` on, clients that never subscribed (dashboards built before
+subscriptions) also get the old per-symbol ``stock_update`` event for every
+refreshed symbol, through LEGACY_ROOM: a client is in it from connect until
+its first subscribe.
+"""
+import math
+import time
+import threading
+
+import wire
+
+# Payload field -> key on the wire
+FIELDS = {'current_price': 'p', 'previous_day_price': 'c', 'signal': 's'}
+
+
+# Clients that have not subscribed yet; they get the legacy stock_update events
+LEGACY_ROOM = 'stock:legacy'
+
+
+def symbol_room(symbol):
+    """Socket.IO room of the clients subscribed to a symbol."""
+    return f'stock:{symbol}'
+
+
+def _clean(value):
+    """Plain JSON value: numpy floats become float and NaN becomes None."""
+    if isinstance(value, float) or hasattr(value, 'dtype'):
+        value = float(value)
+        return value if math.isfinite(value) else None
+    return value
+
+
+class Broadcaster:
+    """Last sent payload per symbol, the changes waiting for the next flush and who subscribed to what."""
+
+    def __init__(self, socketio, legacy=False):
+        self.socketio = socketio
+        self.legacy = legacy
+        self.seq = 0
+        self.stats = {'updates': 0, 'suppressed': 0, 'batches': 0, 'messages': 0}
+        self._last = {}
+        self._pending = {}
+        self._subscriptions = {}
+        self._subscribers = {}
+        self._binary = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, sid, symbols, binary=None):
+        """Add symbols to a client's subscriptions; returns the ones that are new.
+
+        binary True or False switches the client's messages to MessagePack or back to JSON.
+        """
+        with self._lock:
+            if binary is not None:
+                if binary and wire.available():
+                    self._binary.add(sid)
+                else:
+                    self._binary.discard(sid)
+            current = self._subscriptions.setdefault(sid, set())
+            added = [symbol for symbol in dict.fromkeys(symbols) if symbol not in current]
+            for symbol in added:
+                current.add(symbol)
+                self._subscribers[symbol] = self._subscribers.get(symbol, 0) + 1
+            return added
+
+    def unsubscribe(self, sid, symbols=None):
+        """Drop some (or, with None, all) of a client's subscriptions; returns the ones removed."""
+        with self._lock:
+            current = self._subscriptions.get(sid, set())
+            removed = [symbol for symbol in (current if symbols is None else dict.fromkeys(symbols))
+                       if symbol in current]
+            for symbol in removed:
+                current.discard(symbol)
+                self._subscribers[symbol] -= 1
+                if not self._subscribers[symbol]:
+                    del self._subscribers[symbol]
+            if symbols is None:
+                self._subscriptions.pop(sid, None)
+                self._binary.discard(sid)
+            return removed
+
+    def subscriptions(self, sid):
+        with self._lock:
+            return set(self._subscriptions.get(sid, ()))
+
+    def subscriber_counts(self):
+        """Number of subscribed clients per symbol, for symbols with at least one."""
+        with self._lock:
+            return dict(self._subscribers)
+
+    def update(self, symbol, payload):
+        """Queue the fields of payload that differ from what clients last saw; returns True if any did."""
+        with self._lock:
+            self.stats['updates'] += 1
+            last = self._last.setdefault(symbol, {})
+            changed = {}
+            for field, key in FIELDS.items():
+                value = _clean(payload.get(field))
+                if key not in last or last[key] != value:
+                    last[key] = changed[key] = value
+            if not changed:
+                self.stats['suppressed'] += 1
+                return False
+            self._pending.setdefault(symbol, {}).update(changed)
+        if self.legacy:
+            self.socketio.emit('stock_update', dict(payload, symbol=symbol), to=LEGACY_ROOM)
+        return True
+
+    def flush(self):
+        """Emit the queued changes, one stock_updates message per distinct subscription set; returns the messages sent."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            self.seq += 1
+            pending, self._pending = self._pending, {}
+            self.stats['batches'] += 1
+            groups = {}
+            for sid, symbols in self._subscriptions.items():
+                if symbols:
+                    groups.setdefault((frozenset(symbols), sid in self._binary), []).append(sid)
+
+        sent = 0
+        sent_at = int(time.time() * 1000)
+        for (symbols, binary), sids in groups.items():
+            changes = {symbol: fields for symbol, fields in pending.items() if symbol in symbols}
+            if changes:
+                self.socketio.emit('stock_updates', self.encode({'seq': self.seq, 't': sent_at, 'u': changes}, binary),
+                                   to=sids)
+                sent += 1
+        with self._lock:
+            self.stats['messages'] += sent
+        return sent
+
+    def retain(self, symbols):
+        """Forget symbols outside symbols, so snapshots drop them and they are sent in full if they return."""
+        symbols = set(symbols)
+        with self._lock:
+            for symbol in [s for s in self._last if s not in symbols]:
+                del self._last[symbol]
+                self._pending.pop(symbol, None)
+
+    def is_binary(self, sid):
+        return sid in self._binary
+
+    @staticmethod
+    def encode(message, binary):
+        return wire.packb(message) if binary else message
+
+    def snapshot(self, symbols):
+        """Last sent payload of each of symbols that has one, including changes not flushed yet."""
+        with self._lock:
+            return {'seq': self.seq,
+                    'u': {symbol: dict(self._last[symbol]) for symbol in symbols if symbol in self._last}}
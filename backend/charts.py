@@ -0,0 +1,249 @@
+"""Chart history for /api/stock: range queries, resolutions, field selection and LTTB downsampling.
+
+The daily bars of a symbol are downloaded once per CHART_TTL, together with
+their indicators. They are kept as plain numpy arrays, one per column, with
+the bar times as int64 nanoseconds. A request for any range then takes two
+binary searches and a slice. Weekly and monthly bars are aggregated from the
+slice with numpy, and long ranges are reduced to at most ``points`` points
+with Largest-Triangle-Three-Buckets. LTTB keeps the peaks and troughs a chart
+needs to look right, so the payload and render time stay the same whether the
+range is a month or ten years.
+"""
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from intraday import IST_OFFSET, TIMEZONE
+
+# Query field -> indicator frame column
+FIELDS = {
+    'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume',
+    'sma20': 'SMA20', 'sma50': 'SMA50', 'sma200': 'SMA200', 'rsi': 'RSI', 'macd': 'MACD',
+    'macd_signal': 'Signal_Line', 'bb_upper': 'BB_Upper', 'bb_lower': 'BB_Lower', 'adx': 'ADX',
+}
+DEFAULT_FIELDS = ['close', 'volume', 'sma50', 'rsi', 'macd']
+# The candles of /api/stock/<symbol>/intraday
+INTRADAY_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'sma20', 'rsi', 'macd']
+# How a field is combined when bars are aggregated to a coarser resolution; anything else takes the last value
+AGGREGATE = {'open': 'first', 'high': 'max', 'low': 'min', 'volume': 'sum'}
+
+PERIODS = {'1mo': 30, '3mo': 91, '6mo': 182, '1y': 365, '2y': 730, '5y': 1826, '10y': 3652}
+MAX_HISTORY_START = datetime(2000, 1, 1)
+DAILY_RESOLUTIONS = ['1d', '1wk', '1mo']
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+CHART_TTL = 900
+CAPACITY = 64
+
+
+def lttb(x, y, threshold):
+    """Indices of the Largest-Triangle-Three-Buckets downsample of (x, y) to `threshold` points.
+
+    The first and last points are always kept; every bucket in between keeps the
+    point forming the largest triangle with the previous pick and the next bucket's mean.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # NaNs (e.g. missing bars) would poison the areas; treat them as the series' mean
+    if np.isnan(y).any():
+        y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    picks = np.empty(threshold, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_end = next_start + 1
+        mean_x, mean_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - mean_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (mean_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        picks[bucket + 1] = previous
+    return picks
+
+
+def _period_keys(times, resolution):
+    """Group key per bar for a coarser resolution: Monday-based weeks or calendar months in IST."""
+    days = (times + IST_OFFSET * 10**9) // (86400 * 10**9)
+    if resolution == '1wk':
+        return (days + 3) // 7  # 1970-01-01 was a Thursday
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def aggregate(times, columns, resolution):
+    """Weekly or monthly bars from daily arrays; each period is stamped with its last bar's time."""
+    keys = _period_keys(times, resolution)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    combined = {}
+    for field, values in columns.items():
+        how = AGGREGATE.get(field, 'last')
+        if how == 'first':
+            combined[field] = values[starts]
+        elif how == 'max':
+            combined[field] = np.fmax.reduceat(values, starts)
+        elif how == 'min':
+            combined[field] = np.fmin.reduceat(values, starts)
+        elif how == 'sum':
+            combined[field] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            combined[field] = values[ends]
+    return times[ends], combined
+
+
+def parse_fields(spec):
+    """Requested field names, or ValueError naming the unknown ones."""
+    if not spec:
+        return list(DEFAULT_FIELDS)
+    fields = list(dict.fromkeys(f.strip().lower() for f in spec.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}; use any of {', '.join(FIELDS)}")
+    return fields
+
+
+def parse_time(value):
+    """A from/to ISO date or time as a naive IST datetime; one with an offset is converted to IST."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = pd.Timestamp(parsed).tz_convert(TIMEZONE).tz_localize(None).to_pydatetime()
+    return parsed
+
+
+def parse_range(period, start, end, now):
+    """(start, end) naive IST datetimes of a query from period or from/to ISO dates; end defaults to now."""
+    end = parse_time(end) if end else now
+    if start:
+        start = parse_time(start)
+    elif period == 'max':
+        start = MAX_HISTORY_START
+    elif period == 'ytd':
+        start = datetime(end.year, 1, 1)
+    elif period:
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period {period}; use one of {', '.join(list(PERIODS) + ['ytd', 'max'])}")
+        start = end - timedelta(days=PERIODS[period])
+    else:
+        start = end - timedelta(days=PERIODS['1y'])
+    if start >= end:
+        raise ValueError("from must be before to")
+    return start, end
+
+
+def frame_arrays(data):
+    """Bar times (int64 ns, UTC) and one float64 array per chart field of an indicator frame."""
+    index = pd.DatetimeIndex(data.index)
+    times = (index.tz_convert('UTC') if index.tz is not None else index).asi8
+    columns = {field: data[column].to_numpy(dtype=np.float64) if column in data else np.full(len(data), np.nan)
+               for field, column in FIELDS.items()}
+    return times, columns
+
+
+def _clean(values, digits):
+    return [None if math.isnan(v) else round(v, digits) for v in values.tolist()]
+
+
+def render(times, columns, fields, points, daily=True, tz=TIMEZONE, columnar=False, label='date'):
+    """Rows of the requested fields, downsampled on close to at most `points` rows.
+
+    With columnar, one list per field ({'date': [...], 'close': [...]}) instead of one dict per row.
+    The time of each row is under `label`.
+    """
+    total = len(times)
+    if total > points:
+        keep = lttb(times, columns['close'], points)
+        times = times[keep]
+        columns = {field: values[keep] for field, values in columns.items()}
+    stamps = pd.to_datetime(times, utc=True).tz_convert(tz)
+    labels = [str(stamp.date()) for stamp in stamps] if daily else [stamp.isoformat() for stamp in stamps]
+    values = [
+        [None if math.isnan(v) else int(v) for v in columns[field].tolist()] if field == 'volume'
+        else _clean(columns[field], 2)
+        for field in fields
+    ]
+    if columnar:
+        return dict(zip([label] + fields, [labels] + values)), total
+    rows = [dict(zip([label] + fields, row)) for row in zip(labels, *values)]
+    return rows, total
+
+
+class ChartStore:
+    """Per-symbol chart arrays covering the widest range asked for, refreshed after CHART_TTL seconds.
+
+    fetch(symbol, start, end) returns daily bars; build(symbol, bars) returns
+    (indicator frame, signal). Only the CAPACITY most recently used symbols are kept.
+    """
+
+    def __init__(self, fetch, build, ttl=CHART_TTL, capacity=CAPACITY, clock=datetime.now):
+        self.fetch = fetch
+        self.build = build
+        self.ttl = ttl
+        self.capacity = capacity
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._symbol_locks = {}
+
+    def get(self, symbol, start):
+        """Entry {'times', 'columns', 'signal', 'start', 'loaded'} covering start, or None without data."""
+        with self._lock:
+            lock = self._symbol_locks.setdefault(symbol, threading.Lock())
+        try:
+            with lock:
+                return self._load(symbol, start)
+        finally:
+            with self._lock:
+                if symbol not in self._entries:
+                    # Symbols without data (or evicted) keep no lock, so unknown names cannot pile up
+                    self._symbol_locks.pop(symbol, None)
+
+    def _load(self, symbol, start):
+        """Cached or freshly built entry of a symbol, under its lock."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                self._entries.move_to_end(symbol)
+        if entry is not None and entry['start'] <= start and (now - entry['loaded']).total_seconds() < self.ttl:
+            return entry
+
+        # Always fetch at least a year so indicators and the signal have their warm-up
+        fetch_start = min(start, now - timedelta(days=PERIODS['1y']))
+        if entry is not None:
+            fetch_start = min(fetch_start, entry['start'])
+        bars = self.fetch(symbol, fetch_start, now)
+        if bars is None or bars.empty:
+            return None
+        data, signal = self.build(symbol, bars)
+        times, columns = frame_arrays(data)
+        entry = {'times': times, 'columns': columns, 'signal': signal, 'start': fetch_start, 'loaded': now,
+                 'current_price': round(float(data['Close'].iloc[-1]), 2)}
+        with self._lock:
+            self._entries[symbol] = entry
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.capacity:
+                evicted, _ = self._entries.popitem(last=False)
+                self._symbol_locks.pop(evicted, None)
+        return entry
+
+
+def query(entry, start, end, resolution, fields, points, columnar=False):
+    """Rows of an entry between start and end (naive local datetimes) at a daily resolution."""
+    times = entry['times']
+    lo = np.searchsorted(times, pd.Timestamp(start, tz=TIMEZONE).value, side='left')
+    hi = np.searchsorted(times, pd.Timestamp(end, tz=TIMEZONE).value, side='right')
+    times = times[lo:hi]
+    columns = {field: values[lo:hi] for field, values in entry['columns'].items()}
+    if resolution != '1d' and len(times):
+        times, columns = aggregate(times, columns, resolution)
+    return render(times, columns, fields, points, columnar=columnar)
@@ -11,6 +11,10 @@ import json
 import os
 import glob
 
+# Bump whenever calculate_technical_indicators or the feature list changes so
+# run_model_update.py knows every existing model needs to be rebuilt.
+FEATURE_VERSION = 2
+
 def calculate_technical_indicators(data):
     """Calculate technical indicators for the stock data."""
     # Basic indicators from original model
@@ -69,8 +73,8 @@ def calculate_technical_indicators(data):
     
     return data
 
-def prepare_data(symbol):
-    """Prepare data for model training with enhanced features."""
+def fetch_history(symbol):
+    """Download the 5 year training window for a stock."""
     end_date = datetime.now()
     start_date = end_date - timedelta(days=5*365)  # 5 years
     print(f"Fetching data for {symbol} from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
@@ -79,7 +83,13 @@ def prepare_data(symbol):
         raise ValueError(f"No data for {symbol}")
     
     print(f"Retrieved {len(data)} rows of data for {symbol}")
-    data = calculate_technical_indicators(data)
+    return data
+
+def prepare_data(symbol, data=None):
+    """Prepare data for model training with enhanced features."""
+    if data is None:
+        data = fetch_history(symbol)
+    data = calculate_technical_indicators(data.copy())
     
     # More advanced target calculation with multiple timeframes
     for days in [5, 10, 20]:
@@ -110,9 +120,7 @@ def prepare_data(symbol):
                       data['Target_20d'].fillna(0))
     
     # Convert to discrete classes: >1 -> Buy, <-1 -> Sell, else Hold
-    data.loc[data['Target'] > 1, 'Target'] = 1
-    data.loc[data['Target'] < -1, 'Target'] = -1
-    data.loc[(data['Target'] >= -1) & (data['Target'] <= 1), 'Target'] = 0
+    data['Target'] = np.select([data['Target'] > 1, data['Target'] < -1], [1, -1], 0)
     
     # Enhanced feature set
     base_features = [
@@ -147,9 +155,16 @@ def prepare_data(symbol):
     
     return X, y, features
 
-def finetune_model(symbol):
+def feature_stats(X):
+    """Per-feature mean and standard deviation, stored with the model for drift checks."""
+    return {
+        feature: {'mean': float(X[feature].mean()), 'std': float(X[feature].std())}
+        for feature in X.columns
+    }
+
+def finetune_model(symbol, data=None):
     """Train an improved model for the given stock symbol."""
-    X, y, features = prepare_data(symbol)
+    X, y, features = prepare_data(symbol, data)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
     print(f"Fine-tuning model for {symbol} with {len(X_train)} samples...")
@@ -202,7 +217,10 @@ def finetune_model(symbol):
         'model': best_model,
         'features': features,
         'performance': best_score,
-        'model_type': best_model_name
+        'model_type': best_model_name,
+        'feature_version': FEATURE_VERSION,
+        'feature_stats': feature_stats(X),
+        'trained_at': datetime.now().isoformat()
     }
     model_path = f'models/{symbol}_model.pkl'
     joblib.dump(model_data, model_path)
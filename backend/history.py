@@ -0,0 +1,60 @@
+"""Daily bar history from Yahoo Finance or from recorded bar files.
+
+Recorded bars are plain CSV files named ``<SYMBOL>.csv`` with a ``Date`` index
+and Open/High/Low/Close/Volume columns, as written by ``save_recorded``. They
+let backtests and replays run offline and reproducibly.
+"""
+import os
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def load_symbols(path='stocks.json'):
+    """Symbols listed in stocks.json, in file order."""
+    with open(path) as f:
+        return [stock['symbol'] for stock in json.load(f)]
+
+
+def fetch_history(symbol, days):
+    """Download the last `days` calendar days of daily bars."""
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+    return yf.Ticker(symbol + ".NS").history(start=start_date, end=end_date)
+
+
+def recorded_path(symbol, data_dir):
+    return os.path.join(data_dir, f'{symbol}.csv')
+
+
+def load_recorded(symbol, data_dir):
+    """Read a recorded bar file, or return None if there is none."""
+    path = recorded_path(symbol, data_dir)
+    if not os.path.exists(path):
+        return None
+    data = pd.read_csv(path, index_col='Date')
+    data.index = pd.to_datetime(data.index, utc=True).tz_convert('Asia/Kolkata')
+    return data[BAR_COLUMNS]
+
+
+def save_recorded(symbol, data, data_dir):
+    """Write bars to data_dir so later runs can replay them offline."""
+    os.makedirs(data_dir, exist_ok=True)
+    data[BAR_COLUMNS].to_csv(recorded_path(symbol, data_dir), index_label='Date')
+
+
+def load_history(symbol, days, data_dir=None):
+    """Bars for a symbol, preferring a recorded file and recording fresh downloads."""
+    if data_dir:
+        data = load_recorded(symbol, data_dir)
+        if data is not None:
+            cutoff = data.index[-1] - pd.Timedelta(days=days) if len(data) else None
+            return data[data.index > cutoff] if cutoff is not None else data
+    data = fetch_history(symbol, days)
+    if data_dir and not data.empty:
+        save_recorded(symbol, data, data_dir)
+    return data
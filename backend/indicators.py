@@ -0,0 +1,260 @@
+"""Technical indicators declared as a dependency graph.
+
+Every indicator column is a node that names the columns it reads. Callers ask
+for a feature set, e.g. a model's ``features`` list plus ``RULE_FEATURES``,
+and only the nodes needed to produce it are computed, each exactly once, in
+dependency order. Asking for nothing in particular computes the full default
+set, which is what ``calculate_technical_indicators`` always returned.
+"""
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger('trader.indicators')
+
+RAW_COLUMNS = {'Open', 'High', 'Low', 'Close', 'Volume'}
+
+# Columns read by the rule-based scoring in app.predict_signal
+RULE_FEATURES = [
+    'SMA5', 'SMA20', 'SMA50', 'SMA200', 'RSI', 'MACD', 'Signal_Line', 'MACD_Hist',
+    'BB_Mid', 'BB_Upper', 'BB_Lower', 'BB_Width', '%K', '%D', 'Volume_Ratio',
+    'Pct_Change', 'OBV', 'ROC_5', 'ROC_20', 'Support_Level', 'Resistance_Level',
+    'ADX', 'Volatility_20'
+]
+
+# Columns read by the market-condition checks in app.execute_bot_trade
+MARKET_FEATURES = [
+    'SMA5', 'SMA20', 'SMA50', 'RSI', 'BB_Upper', 'BB_Lower', 'Volume_Ratio', 'Daily_Return'
+]
+
+
+class Node:
+    def __init__(self, name, deps, func, default):
+        self.name = name
+        self.deps = deps
+        self.func = func
+        self.default = default
+
+
+_NODES = {}
+
+
+def _add(name, deps, func, default=True):
+    """Register an indicator column computed by func(data) from the columns in deps."""
+    _NODES[name] = Node(name, tuple(deps), func, default)
+
+
+def _true_range(data):
+    return np.maximum(
+        data['High'] - data['Low'],
+        np.maximum(
+            abs(data['High'] - data['Close'].shift(1)),
+            abs(data['Low'] - data['Close'].shift(1))
+        )
+    )
+
+
+def _dm_plus(data):
+    return np.where(
+        (data['High'] - data['High'].shift(1)) > (data['Low'].shift(1) - data['Low']),
+        np.maximum(data['High'] - data['High'].shift(1), 0),
+        0
+    )
+
+
+def _dm_minus(data):
+    return np.where(
+        (data['Low'].shift(1) - data['Low']) > (data['High'] - data['High'].shift(1)),
+        np.maximum(data['Low'].shift(1) - data['Low'], 0),
+        0
+    )
+
+
+def _rsi(data):
+    delta = data['Close'].diff()
+    gain = delta.where(delta > 0, 0).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+
+def _macd(data):
+    exp1 = data['Close'].ewm(span=12, adjust=False).mean()
+    exp2 = data['Close'].ewm(span=26, adjust=False).mean()
+    return exp1 - exp2
+
+
+# Registration order is the column order of the full default computation
+
+# Basic Moving Averages
+for _window in (5, 10, 20, 50, 200):
+    _add(f'SMA{_window}', ['Close'], lambda d, w=_window: d['Close'].rolling(window=w).mean())
+
+# Exponential Moving Averages
+for _span in (5, 10, 20):
+    _add(f'EMA{_span}', ['Close'], lambda d, s=_span: d['Close'].ewm(span=s, adjust=False).mean())
+
+_add('RSI', ['Close'], _rsi)
+
+# MACD
+_add('MACD', ['Close'], _macd)
+_add('Signal_Line', ['MACD'], lambda d: d['MACD'].ewm(span=9, adjust=False).mean())
+_add('MACD_Hist', ['MACD', 'Signal_Line'], lambda d: d['MACD'] - d['Signal_Line'])
+
+# Bollinger Bands
+_add('BB_Mid', ['Close'], lambda d: d['Close'].rolling(window=20).mean())
+_add('BB_Std', ['Close'], lambda d: d['Close'].rolling(window=20).std())
+_add('BB_Upper', ['BB_Mid', 'BB_Std'], lambda d: d['BB_Mid'] + 2 * d['BB_Std'])
+_add('BB_Lower', ['BB_Mid', 'BB_Std'], lambda d: d['BB_Mid'] - 2 * d['BB_Std'])
+_add('BB_Width', ['BB_Upper', 'BB_Lower', 'BB_Mid'], lambda d: (d['BB_Upper'] - d['BB_Lower']) / d['BB_Mid'])
+_add('BB_Pct', ['Close', 'BB_Upper', 'BB_Lower'],
+     lambda d: (d['Close'] - d['BB_Lower']) / (d['BB_Upper'] - d['BB_Lower']))
+
+# Stochastic Oscillator
+_add('14-high', ['High'], lambda d: d['High'].rolling(14).max())
+_add('14-low', ['Low'], lambda d: d['Low'].rolling(14).min())
+_add('%K', ['Close', '14-high', '14-low'], lambda d: (d['Close'] - d['14-low']) * 100 / (d['14-high'] - d['14-low']))
+_add('%D', ['%K'], lambda d: d['%K'].rolling(3).mean())
+
+# Average True Range (ATR)
+_add('TR', ['High', 'Low', 'Close'], _true_range)
+_add('ATR', ['TR'], lambda d: d['TR'].rolling(14).mean())
+
+# On-Balance Volume (OBV)
+_add('OBV', ['Close', 'Volume'], lambda d: (np.sign(d['Close'].diff()) * d['Volume']).fillna(0).cumsum())
+
+# Price and Volume Metrics
+for _lag in range(1, 6):
+    _add(f'Close_Lag_{_lag}', ['Close'], lambda d, n=_lag: d['Close'].shift(n))
+    _add(f'Volume_Lag_{_lag}', ['Volume'], lambda d, n=_lag: d['Volume'].shift(n))
+
+_add('Pct_Change', ['Close'], lambda d: d['Close'].pct_change())
+_add('Volume_Pct_Change', ['Volume'], lambda d: d['Volume'].pct_change())
+
+# Price Momentum (percent rate of change)
+for _periods in (5, 10, 20):
+    _add(f'ROC_{_periods}', ['Close'], lambda d, p=_periods: d['Close'].pct_change(periods=p) * 100)
+
+# Volatility Indicators
+_add('Daily_Return', ['Close'], lambda d: d['Close'].pct_change())
+_add('Volatility_20', ['Daily_Return'], lambda d: d['Daily_Return'].rolling(window=20).std() * np.sqrt(252))
+
+# Volume Indicators
+_add('Volume_SMA_20', ['Volume'], lambda d: d['Volume'].rolling(window=20).mean())
+_add('Volume_Ratio', ['Volume', 'Volume_SMA_20'], lambda d: d['Volume'] / d['Volume_SMA_20'])
+
+# Trend Indicators (ADX, period 14)
+_add('DM_plus', ['High', 'Low'], _dm_plus)
+_add('DM_minus', ['High', 'Low'], _dm_minus)
+_add('DM_plus_smooth', ['DM_plus'], lambda d: d['DM_plus'].rolling(window=14).mean())
+_add('DM_minus_smooth', ['DM_minus'], lambda d: d['DM_minus'].rolling(window=14).mean())
+_add('DI_plus', ['DM_plus_smooth', 'ATR'], lambda d: 100 * d['DM_plus_smooth'] / d['ATR'])
+_add('DI_minus', ['DM_minus_smooth', 'ATR'], lambda d: 100 * d['DM_minus_smooth'] / d['ATR'])
+_add('DX', ['DI_plus', 'DI_minus'],
+     lambda d: 100 * abs(d['DI_plus'] - d['DI_minus']) / (d['DI_plus'] + d['DI_minus']))
+_add('ADX', ['DX'], lambda d: d['DX'].rolling(window=14).mean())
+
+# Support and Resistance
+_add('Support_Level', ['Low'], lambda d: d['Low'].rolling(window=20).min())
+_add('Resistance_Level', ['High'], lambda d: d['High'].rolling(window=20).max())
+
+# Extra features used by fine-tuned models, only computed on request
+for _lag in range(1, 6):
+    _add(f'Close_Change_{_lag}', ['Close', f'Close_Lag_{_lag}'],
+         lambda d, n=_lag: d['Close'] / d[f'Close_Lag_{n}'] - 1, default=False)
+
+
+class IndicatorPlan:
+    """Ordered set of nodes that produces a requested feature set."""
+
+    def __init__(self, nodes, unknown):
+        self.nodes = nodes
+        self.columns = [node.name for node in nodes]
+        computed = set(self.columns)
+        # Default columns the full computation would have produced but this plan does not
+        self.skipped = [name for name, node in _NODES.items() if node.default and name not in computed]
+        self.unknown = unknown
+
+    def apply(self, data):
+        """Add the planned columns to data in place and return it."""
+        for node in self.nodes:
+            data[node.name] = node.func(data)
+        return data
+
+
+@lru_cache(maxsize=256)
+def _plan(features):
+    if features is None:
+        requested = [name for name, node in _NODES.items() if node.default]
+    else:
+        requested = list(features)
+
+    needed = set()
+    unknown = []
+    stack = list(requested)
+    while stack:
+        name = stack.pop()
+        if name in needed or name in RAW_COLUMNS:
+            continue
+        node = _NODES.get(name)
+        if node is None:
+            unknown.append(name)
+            continue
+        needed.add(name)
+        stack.extend(node.deps)
+
+    # Registration order already respects dependencies
+    nodes = [node for name, node in _NODES.items() if name in needed]
+    plan = IndicatorPlan(nodes, sorted(set(unknown)))
+    if features is not None:
+        log.debug("Indicator plan for %s features: computing %s columns, skipped %s unused: %s",
+                  len(requested), len(plan.columns), len(plan.skipped), ', '.join(plan.skipped))
+    return plan
+
+
+def plan_indicators(features=None):
+    """Return the cached plan for a feature set; None means the full default set."""
+    return _plan(None if features is None else tuple(sorted(set(features))))
+
+
+def compute_indicators(data, features=None):
+    """Add the columns needed for features (or the full default set) to data."""
+    return plan_indicators(features).apply(data)
+
+
+def calculate_technical_indicators(data):
+    """Compute the full default indicator set."""
+    return compute_indicators(data)
+
+
+def calculate_adx(data, period=14):
+    """Calculate the Average Directional Index (ADX)"""
+    try:
+        # True Range
+        data['TR'] = _true_range(data)
+
+        # Directional Movement
+        data['DM_plus'] = _dm_plus(data)
+        data['DM_minus'] = _dm_minus(data)
+
+        # Smoothed TR and DM
+        data['ATR'] = data['TR'].rolling(window=period).mean()
+        data['DM_plus_smooth'] = data['DM_plus'].rolling(window=period).mean()
+        data['DM_minus_smooth'] = data['DM_minus'].rolling(window=period).mean()
+
+        # Directional Indicators
+        data['DI_plus'] = 100 * data['DM_plus_smooth'] / data['ATR']
+        data['DI_minus'] = 100 * data['DM_minus_smooth'] / data['ATR']
+
+        # Directional Index
+        data['DX'] = 100 * abs(data['DI_plus'] - data['DI_minus']) / (data['DI_plus'] + data['DI_minus'])
+
+        # Average Directional Index
+        data['ADX'] = data['DX'].rolling(window=period).mean()
+
+        return data['ADX']
+    except Exception as e:
+        log.warning("Error calculating ADX: %s", e)
+        return pd.Series(np.nan, index=data.index)
@@ -0,0 +1,241 @@
+"""Intraday candles kept in fixed-size in-memory ring buffers.
+
+Every symbol has one ring per interval (1m and 5m) holding the candles of the
+current NSE session only. A 09:15-15:30 session has 375 one-minute and 75
+five-minute candles, so each ring is preallocated at that size and memory never
+grows: about 22 KB per symbol for both intervals, or about 2 MB for 100 symbols.
+
+Candles are built from polled quotes (price plus the day's cumulative volume)
+or from recorded 1m bar files named ``<SYMBOL>_1m.csv``.
+
+Usage:
+    python intraday.py --data-dir bars     # record today's 1m bars for stocks.json
+"""
+import os
+import sys
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from history import BAR_COLUMNS, load_symbols
+
+TIMEZONE = 'Asia/Kolkata'
+IST_OFFSET = 19800  # seconds east of UTC; a multiple of both intervals, so buckets align to IST minutes
+SESSION_OPEN = 9 * 3600 + 15 * 60
+SESSION_CLOSE = 15 * 3600 + 30 * 60
+INTERVALS = {'1m': 60, '5m': 300}
+
+
+def session_seconds(timestamp):
+    """(IST day number, seconds since IST midnight) of unix timestamps (ints or an int array)."""
+    local = timestamp + IST_OFFSET
+    return local // 86400, local % 86400
+
+
+def to_epoch(when):
+    """Unix seconds of a datetime or Timestamp; naive values are taken as server local time."""
+    if isinstance(when, pd.Timestamp):
+        when = when.to_pydatetime()
+    return int(when.timestamp())
+
+
+class CandleRing:
+    """Fixed-capacity OHLCV candles of one session, oldest overwritten first."""
+
+    def __init__(self, interval, capacity=None):
+        self.interval = interval
+        self.capacity = capacity or (SESSION_CLOSE - SESSION_OPEN) // interval
+        self.time = np.zeros(self.capacity, dtype=np.int64)
+        self.ohlcv = np.zeros((self.capacity, 5), dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        self.day = None
+
+    @property
+    def nbytes(self):
+        return self.time.nbytes + self.ohlcv.nbytes
+
+    def _last(self):
+        return (self.start + self.count - 1) % self.capacity
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+        self.day = None
+
+    def add(self, timestamp, open_, high, low, close, volume):
+        """Merge a bar or quote into the candle of its interval; returns False if it was dropped."""
+        timestamp = int(timestamp)
+        day, seconds = session_seconds(timestamp)
+        if not SESSION_OPEN <= seconds < SESSION_CLOSE:
+            return False
+        if self.day is not None and day < self.day:
+            return False
+        if day != self.day:
+            self.clear()
+            self.day = day
+        bucket = timestamp - timestamp % self.interval
+
+        if self.count:
+            last = self._last()
+            if bucket == self.time[last]:
+                candle = self.ohlcv[last]
+                candle[1] = max(candle[1], high)
+                candle[2] = min(candle[2], low)
+                candle[3] = close
+                candle[4] += volume
+                return True
+            if bucket < self.time[last]:
+                return False  # late quote for a candle that is already closed
+
+        if self.count < self.capacity:
+            index = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.time[index] = bucket
+        self.ohlcv[index] = (open_, high, low, close, volume)
+        return True
+
+    def extend(self, times, ohlcv):
+        """Merge time-ordered bars, aggregating them per interval with numpy before adding."""
+        times = np.asarray(times, dtype=np.int64)
+        days, seconds = session_seconds(times)
+        keep = (seconds >= SESSION_OPEN) & (seconds < SESSION_CLOSE)
+        if not keep.any():
+            return
+        keep &= days == days[keep].max()
+        times, ohlcv = times[keep], ohlcv[keep]
+
+        buckets = times - times % self.interval
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)] - 1
+        candles = np.column_stack([
+            ohlcv[starts, 0],
+            np.maximum.reduceat(ohlcv[:, 1], starts),
+            np.minimum.reduceat(ohlcv[:, 2], starts),
+            ohlcv[ends, 3],
+            np.add.reduceat(ohlcv[:, 4], starts),
+        ])
+        for timestamp, candle in zip(buckets[starts], candles):
+            self.add(timestamp, *candle)
+
+    def arrays(self):
+        """(times, ohlcv) copies in chronological order."""
+        order = (self.start + np.arange(self.count)) % self.capacity
+        return self.time[order], self.ohlcv[order]
+
+    def to_frame(self):
+        """Candles as a DataFrame shaped like Yahoo Finance history, ready for compute_indicators."""
+        times, ohlcv = self.arrays()
+        index = pd.to_datetime(times, unit='s', utc=True).tz_convert(TIMEZONE)
+        return pd.DataFrame(ohlcv, index=index, columns=BAR_COLUMNS)
+
+
+class IntradayStore:
+    """Candle rings for every symbol and interval, safe to share between threads."""
+
+    def __init__(self, intervals=INTERVALS):
+        self.intervals = dict(intervals)
+        self._rings = {}
+        self._day_volume = {}
+        self._lock = threading.Lock()
+
+    def _symbol_rings(self, symbol):
+        rings = self._rings.get(symbol)
+        if rings is None:
+            rings = self._rings[symbol] = {name: CandleRing(seconds) for name, seconds in self.intervals.items()}
+        return rings
+
+    def add_quote(self, symbol, when, price, day_volume=None):
+        """Fold a polled quote into every interval; day_volume is the cumulative volume so far today."""
+        timestamp = to_epoch(when)
+        with self._lock:
+            volume = 0.0
+            if day_volume is not None:
+                day, _ = session_seconds(timestamp)
+                previous = self._day_volume.get(symbol)
+                if previous and previous[0] == day and day_volume >= previous[1]:
+                    volume = float(day_volume - previous[1])
+                self._day_volume[symbol] = (day, float(day_volume))
+            for ring in self._symbol_rings(symbol).values():
+                ring.add(timestamp, price, price, price, price, volume)
+
+    def add_bars(self, symbol, bars):
+        """Fold finished 1m (or coarser) bars into every interval at least as long as them; naive times are IST."""
+        index = pd.DatetimeIndex(bars.index)
+        if index.tz is None:
+            index = index.tz_localize(TIMEZONE)
+        times = index.asi8 // 10**9
+        values = bars[BAR_COLUMNS].to_numpy(dtype=np.float64)
+        step = np.diff(times).min() if len(times) > 1 else 60
+        with self._lock:
+            for ring in self._symbol_rings(symbol).values():
+                if ring.interval >= step:
+                    ring.extend(times, values)
+
+    def frame(self, symbol, interval):
+        """Current session candles for symbol at interval, or None if none were collected."""
+        if interval not in self.intervals:
+            raise ValueError(f"Unsupported interval {interval}; use one of {', '.join(self.intervals)}")
+        with self._lock:
+            rings = self._rings.get(symbol)
+            if not rings or not rings[interval].count:
+                return None
+            return rings[interval].to_frame()
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(ring.nbytes for rings in self._rings.values() for ring in rings.values())
+
+
+def recorded_path(symbol, data_dir):
+    return os.path.join(data_dir, f'{symbol}_1m.csv')
+
+
+def load_recorded(symbol, data_dir):
+    """Read a recorded 1m bar file, or return None if there is none."""
+    path = recorded_path(symbol, data_dir)
+    if not os.path.exists(path):
+        return None
+    data = pd.read_csv(path, index_col='Datetime')
+    data.index = pd.to_datetime(data.index, utc=True).tz_convert(TIMEZONE)
+    return data[BAR_COLUMNS]
+
+
+def fetch_minute_bars(symbol):
+    """Today's 1m bars from Yahoo Finance."""
+    import yfinance as yf
+    return yf.Ticker(symbol + ".NS").history(period='1d', interval='1m')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record today's 1m bars for replaying intraday candles")
+    parser.add_argument('--data-dir', required=True)
+    parser.add_argument('--symbols', nargs='*', help='Defaults to every symbol in stocks.json')
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    store = IntradayStore()
+    for symbol in args.symbols or load_symbols():
+        try:
+            bars = fetch_minute_bars(symbol)
+        except Exception as e:
+            print(f"Error fetching 1m bars for {symbol}: {e}")
+            continue
+        if bars.empty:
+            print(f"No 1m bars for {symbol}")
+            continue
+        bars[BAR_COLUMNS].to_csv(recorded_path(symbol, args.data_dir), index_label='Datetime')
+        store.add_bars(symbol, bars)
+        print(f"{symbol}: {len(bars)} bars recorded")
+    print(f"Candle rings use {store.nbytes / 1024:.1f} KB at {datetime.now():%H:%M}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Socket.IO load test: many concurrent dashboards and the latency of the updates they receive.
+
+Opens --clients WebSocket connections speaking the Engine.IO 4 / Socket.IO 5
+protocol directly (one asyncio task each, so the load generator itself needs
+no thread per connection), subscribes each to the same symbols and listens for
+--duration seconds. Every ``stock_updates`` batch carries the server time of
+its flush, so the emit latency is the receive time minus that stamp; run the
+load test on the server's machine so both use the same clock. The update
+loop's work over the same window is read from the server's /metrics, since it
+shares the CPU (and under gevent the event loop) with the connections.
+
+Usage:
+    python server.py &
+    python loadtest.py --clients 2000 --duration 60 --pid $!
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+import numpy as np
+from websockets.asyncio.client import connect
+
+PERCENTILES = (50, 95, 99)
+
+
+def socket_url(url):
+    parts = urlsplit(url)
+    scheme = 'wss' if parts.scheme == 'https' else 'ws'
+    return f'{scheme}://{parts.netloc}/socket.io/?EIO=4&transport=websocket'
+
+
+def rss_mb(pid):
+    """Resident memory of a local process in MB, or None."""
+    if not pid:
+        return None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a local process in seconds, or None."""
+    if not pid:
+        return None
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def loop_counters(url):
+    """Update loop totals from the server's /metrics: symbols refreshed, ticks and per-stage seconds."""
+    counters = {'symbols': 0.0, 'ticks': 0.0, 'tick_seconds': 0.0, 'stages': {}}
+    try:
+        with urlopen(url.rstrip('/') + '/metrics', timeout=10) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+    for line in text.splitlines():
+        name, _, value = line.rpartition(' ')
+        if name.startswith('stock_trader_tick_symbols_total'):
+            counters['symbols'] += float(value)
+        elif name.startswith('stock_trader_tick_seconds_count'):
+            counters['ticks'] += float(value)
+        elif name.startswith('stock_trader_tick_seconds_sum'):
+            counters['tick_seconds'] += float(value)
+        elif name.startswith('stock_trader_stage_seconds_sum'):
+            stage = name.split('stage="', 1)[1].split('"', 1)[0]
+            counters['stages'][stage] = float(value)
+    return counters
+
+
+def loop_load(before, after, seconds):
+    """What the update loop did between two loop_counters readings."""
+    if before is None or after is None:
+        return None
+    ticks = after['ticks'] - before['ticks']
+    return {
+        'symbols_refreshed': int(after['symbols'] - before['symbols']),
+        'symbols_per_second': round((after['symbols'] - before['symbols']) / seconds, 2),
+        'tick_seconds_mean': round((after['tick_seconds'] - before['tick_seconds']) / ticks, 3) if ticks else None,
+        'stage_seconds': {stage: round(total - before['stages'].get(stage, 0.0), 2)
+                          for stage, total in sorted(after['stages'].items())},
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.connect_seconds = []
+        self.latencies_ms = []
+        self.connected = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = {}
+
+
+async def client(url, symbols, stats, stop):
+    """One dashboard: connect, subscribe, answer pings and time stock_updates until stop is set."""
+    started = time.perf_counter()
+    connected = False
+    try:
+        async with connect(url, ping_interval=None, compression=None, open_timeout=30) as ws:
+            await ws.recv()  # Engine.IO open packet
+            await ws.send('40')
+            while not (await ws.recv()).startswith('40'):
+                pass
+            stats.connect_seconds.append(time.perf_counter() - started)
+            stats.connected += 1
+            connected = True
+            await ws.send('42' + json.dumps(['subscribe', {'symbols': symbols}]))
+            while not stop.is_set():
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=1)
+                except asyncio.TimeoutError:
+                    continue
+                if message == '2':
+                    await ws.send('3')
+                elif message.startswith('42["stock_updates"'):
+                    _, batch = json.loads(message[2:])
+                    stats.latencies_ms.append(time.time() * 1000 - batch['t'])
+                    stats.batches += 1
+    except Exception as e:
+        name = type(e).__name__
+        stats.errors[name] = stats.errors.get(name, 0) + 1
+        if connected:
+            stats.dropped += 1
+        else:
+            stats.failed += 1
+
+
+def summary(values, scale=1.0, digits=1):
+    if not values:
+        return None
+    values = np.asarray(values) * scale
+    row = {f'p{p}': round(float(np.percentile(values, p)), digits) for p in PERCENTILES}
+    row['max'] = round(float(values.max()), digits)
+    return row
+
+
+async def run(args):
+    url = socket_url(args.url)
+    symbols = [s.strip().upper() for s in args.symbols.split(',') if s.strip()]
+    stats = Stats()
+    stop = asyncio.Event()
+    rss_before = rss_mb(args.pid)
+
+    tasks = []
+    ramp_started = time.perf_counter()
+    for i in range(args.clients):
+        tasks.append(asyncio.create_task(client(url, symbols, stats, stop)))
+        if args.ramp and (i + 1) % args.ramp == 0:
+            await asyncio.sleep(1)
+    while stats.connected + stats.failed < args.clients and time.perf_counter() - ramp_started < 120:
+        await asyncio.sleep(0.2)
+    ramp_seconds = time.perf_counter() - ramp_started
+    rss_connected = rss_mb(args.pid)
+
+    # Only latencies measured with every client connected count
+    stats.latencies_ms.clear()
+    stats.batches = 0
+    counters_before, cpu_before = await asyncio.to_thread(loop_counters, args.url), cpu_seconds(args.pid)
+    await asyncio.sleep(args.duration)
+    counters_after, cpu_after = await asyncio.to_thread(loop_counters, args.url), cpu_seconds(args.pid)
+    connected_at_end = stats.connected - stats.dropped
+    rss_after = rss_mb(args.pid)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    report = {
+        'clients': args.clients,
+        'connected': stats.connected,
+        'failed': stats.failed,
+        'dropped': stats.dropped,
+        'connected_at_end': connected_at_end,
+        'ramp_seconds': round(ramp_seconds, 1),
+        'connect_ms': summary(stats.connect_seconds, 1000),
+        'duration_seconds': args.duration,
+        'batches_received': stats.batches,
+        'emit_latency_ms': summary(stats.latencies_ms),
+        'server_rss_mb': {'before': rss_before, 'connected': rss_connected, 'after': rss_after},
+        'update_loop': loop_load(counters_before, counters_after, args.duration),
+        'errors': stats.errors,
+    }
+    if cpu_before is not None and cpu_after is not None:
+        report['server_cpu_percent'] = round((cpu_after - cpu_before) / args.duration * 100, 1)
+    if rss_before and rss_connected and stats.connected:
+        report['server_kb_per_connection'] = round((rss_connected - rss_before) * 1024 / stats.connected, 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hold many Socket.IO dashboards open and time their updates')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--symbols', default='RELIANCE,TCS,HDFCBANK,INFY,ICICIBANK,SBIN,ITC,LT',
+                        help='Comma-separated symbols every client subscribes to')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to listen once every client is connected')
+    parser.add_argument('--ramp', type=int, default=200, help='New connections per second; 0 opens them all at once')
+    parser.add_argument('--pid', type=int, help='Server process id, to report its resident memory')
+    parser.add_argument('--out', help='Write the report as JSON')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""Structured, leveled and sampled logging for the server.
+
+Everything logs under the ``trader`` logger. Records go through a bounded
+queue to a background thread that formats and writes them, so the update loop
+never waits on stdout. If the queue fills up, records are dropped and counted
+instead of blocking.
+
+Output is one JSON object per line, with the ``symbol`` and ``stage`` fields
+when a record has them. Set ``LOG_FORMAT=text`` for plain lines instead.
+
+Repetitive records are sampled. Each message template and symbol may log
+``sample_burst`` records per ``sample_interval`` seconds, and the next record
+after a window reports how many were suppressed. Errors are never sampled.
+
+Level, sampling and per-symbol debug can be changed while the server runs
+through ``update_config``, e.g. ``{"debug_symbols": ["TCS"]}`` logs every
+debug record for TCS alone.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import metrics
+
+ROOT = 'trader'
+QUEUE_SIZE = 10000
+DEFAULTS = {'level': 'INFO', 'debug_symbols': [], 'sample_interval': 60.0, 'sample_burst': 1}
+FIELDS = ('symbol', 'stage', 'suppressed')
+
+LOG_RECORDS = metrics.Counter('stock_trader_log_records', 'Log records written, sampled out or dropped', ['result'])
+
+_config = dict(DEFAULTS)
+_config_lock = threading.Lock()
+_listener = None
+_queue = None
+# Records held back per thread ident while hold() is active there
+_held = {}
+
+
+def get_logger(stage=None):
+    """The logger for a stage of the server; its records carry the stage field."""
+    logger = logging.getLogger(ROOT if stage is None else f'{ROOT}.{stage}')
+    return StageAdapter(logger, {'stage': stage}) if stage else logger
+
+
+class StageAdapter(logging.LoggerAdapter):
+    """Adds the stage to every record while keeping the caller's own extra fields."""
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = dict(self.extra, **kwargs.get('extra', {}))
+        return msg, kwargs
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        suppressed = getattr(record, 'suppressed', None)
+        return f'{line} ({suppressed} similar suppressed)' if suppressed else line
+
+
+class HoldFilter(logging.Filter):
+    """Diverts records of threads inside hold() to their list, before the handler takes its lock."""
+
+    def filter(self, record):
+        held = _held.get(threading.get_ident())
+        if held is None:
+            return True
+        held.append(record)
+        return False
+
+
+@contextmanager
+def hold():
+    """Collect the calling thread's trader records in a list instead of queueing them; see replay.
+
+    For threads that must not touch the log queue, such as the gevent mode's worker threads.
+    """
+    records = _held[threading.get_ident()] = []
+    try:
+        yield records
+    finally:
+        del _held[threading.get_ident()]
+
+
+def replay(records):
+    """Log records collected by hold() as if they were logged now."""
+    for record in records:
+        logging.getLogger(record.name).handle(record)
+
+
+class RuntimeFilter(logging.Filter):
+    """Per-symbol debug and rate-limited sampling, both read from the runtime config."""
+
+    def __init__(self):
+        super().__init__()
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        symbol = getattr(record, 'symbol', None)
+        with _config_lock:
+            level = logging.getLevelName(_config['level'])
+            debug_symbols = _config['debug_symbols']
+            interval, burst = _config['sample_interval'], _config['sample_burst']
+
+        if record.levelno < level:
+            # Only here because some symbol has debug on
+            if symbol not in debug_symbols:
+                return False
+            LOG_RECORDS.labels('written').inc()
+            return True
+        if record.levelno >= logging.ERROR or symbol in debug_symbols or interval <= 0:
+            LOG_RECORDS.labels('written').inc()
+            return True
+
+        key = (record.name, record.msg, symbol)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started >= interval:
+                started, count = now, 0
+            if count >= burst:
+                self._windows[key] = (started, count, suppressed + 1)
+                LOG_RECORDS.labels('sampled').inc()
+                return False
+            self._windows[key] = (started, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        LOG_RECORDS.labels('written').inc()
+        return True
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time, so contextlib.redirect_stdout also captures logs."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records when the queue is full rather than blocking the caller."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS.labels('dropped').inc()
+
+
+def _apply_level():
+    """The root logger lets debug records through only when they can be written."""
+    with _config_lock:
+        level = logging.getLevelName(_config['level'])
+        if _config['debug_symbols']:
+            level = min(level, logging.DEBUG)
+    logging.getLogger(ROOT).setLevel(level)
+
+
+def configure(level=None, log_format=None):
+    """Send the trader loggers through the queue to stdout; safe to call twice."""
+    global _listener, _queue
+    if _listener is not None:
+        return
+    update_config({'level': level or os.getenv('LOG_LEVEL', DEFAULTS['level'])})
+    log_format = log_format or os.getenv('LOG_FORMAT', 'json')
+
+    output = StdoutHandler()
+    output.setFormatter(TextFormatter() if log_format == 'text' else JsonFormatter())
+    _queue = queue.Queue(QUEUE_SIZE)
+    handler = DroppingQueueHandler(_queue)
+    handler.addFilter(HoldFilter())
+    handler.addFilter(RuntimeFilter())
+
+    logger = logging.getLogger(ROOT)
+    logger.addHandler(handler)
+    logger.propagate = False
+    _listener = QueueListener(_queue, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def flush():
+    """Wait until every queued record has been written."""
+    if _queue is not None:
+        _queue.join()
+
+
+def get_config():
+    with _config_lock:
+        return dict(_config, debug_symbols=sorted(_config['debug_symbols']))
+
+
+def update_config(changes):
+    """Validate and apply config changes; returns the new config or raises ValueError."""
+    unknown = set(changes) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown logging settings: {', '.join(sorted(unknown))}")
+    updated = {}
+    if 'level' in changes:
+        level = str(changes['level']).upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level {changes['level']}")
+        updated['level'] = level
+    if 'debug_symbols' in changes:
+        symbols = changes['debug_symbols']
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        updated['debug_symbols'] = frozenset(str(symbol).upper() for symbol in symbols or [])
+    if 'sample_interval' in changes:
+        updated['sample_interval'] = float(changes['sample_interval'])
+    if 'sample_burst' in changes:
+        updated['sample_burst'] = max(int(changes['sample_burst']), 1)
+    with _config_lock:
+        _config.update(updated)
+    _apply_level()
+    return get_config()
@@ -0,0 +1,99 @@
+"""NSE trading calendar in IST.
+
+Regular sessions run 09:15-15:30 IST on weekdays that are not exchange
+holidays. The update loop polls from the start of pre-open (09:00) until a few
+minutes after the close, so the day's closing prices are picked up, and idles
+the rest of the time. Holidays are read from ``market_holidays.json``; update it
+each year from the NSE holiday circular.
+"""
+import os
+import json
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+
+IST = timezone(timedelta(hours=5, minutes=30), 'IST')
+PRE_OPEN = time(9, 0)
+SESSION_OPEN = time(9, 15)
+SESSION_CLOSE = time(15, 30)
+# Keep polling this long after the close so the final prices are captured
+CLOSE_GRACE = timedelta(minutes=10)
+HOLIDAYS_FILE = 'market_holidays.json'
+
+log = logging.getLogger('trader.calendar')
+
+
+def to_ist(when):
+    """A datetime in IST; naive values are taken as server local time."""
+    return when.astimezone(IST)
+
+
+class MarketCalendar:
+    def __init__(self, holidays=()):
+        self.holidays = {}
+        for holiday in holidays:
+            self.holidays[date.fromisoformat(holiday['date'])] = holiday.get('name', '')
+
+    @classmethod
+    def load(cls, path=None):
+        """Calendar with the holidays listed in path (default market_holidays.json), if it exists."""
+        path = path or os.getenv('MARKET_HOLIDAYS_FILE', HOLIDAYS_FILE)
+        if not os.path.exists(path):
+            log.warning("No market holiday file at %s; only weekends are treated as closed", path)
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays
+
+    def _window(self, day):
+        """Polling window (pre-open to close plus grace) of a trading day, as IST datetimes."""
+        start = datetime.combine(day, PRE_OPEN, IST)
+        end = datetime.combine(day, SESSION_CLOSE, IST) + CLOSE_GRACE
+        return start, end
+
+    def state(self, when):
+        """'pre_open', 'open', 'post_close' (within the grace period) or 'closed'."""
+        now = to_ist(when)
+        day = now.date()
+        if not self.is_trading_day(day):
+            return 'closed'
+        clock = now.time()
+        if PRE_OPEN <= clock < SESSION_OPEN:
+            return 'pre_open'
+        if SESSION_OPEN <= clock < SESSION_CLOSE:
+            return 'open'
+        if SESSION_CLOSE <= clock and now < self._window(day)[1]:
+            return 'post_close'
+        return 'closed'
+
+    def is_polling(self, when):
+        """True while prices can change: pre-open, the session and the grace after the close."""
+        return self.state(when) != 'closed'
+
+    def next_polling_start(self, when):
+        """Start of the next polling window after `when` (or `when` itself if polling now)."""
+        now = to_ist(when)
+        if self.is_polling(now):
+            return now
+        day = now.date()
+        for _ in range(30):
+            if self.is_trading_day(day):
+                start, _ = self._window(day)
+                if start > now:
+                    return start
+            day += timedelta(days=1)
+        raise ValueError("No trading day in the next 30 days; check the holiday list")
+
+    def seconds_until_polling(self, when):
+        return max((self.next_polling_start(when) - to_ist(when)).total_seconds(), 0.0)
+
+    def describe(self, when):
+        now = to_ist(when)
+        next_start = self.next_polling_start(now)
+        return {
+            'state': self.state(now),
+            'now_ist': now.isoformat(timespec='seconds'),
+            'next_polling_start': next_start.isoformat(timespec='seconds'),
+            'holiday': self.holidays.get(now.date()),
+        }
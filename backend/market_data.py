@@ -0,0 +1,168 @@
+"""Gateway in front of the Yahoo Finance history downloads.
+
+Every history request of the server (update loop, chart history, risk and
+the bot) goes through one ``Gateway``, which does three things in order:
+
+- a short-TTL result cache: a request repeated within ``ttl`` seconds is
+  answered from memory;
+- single-flight: concurrent identical requests share one download. The first
+  caller fetches, and the others wait for its result (or its exception);
+- a global token bucket: at most ``rate`` downloads per second on average,
+  with bursts of ``burst``. A download waits for a token, and gives up with
+  ``Throttled`` if that would take longer than ``max_wait`` seconds.
+
+Daily requests are keyed by calendar day, with start floored and end rounded
+up to midnight. So the many "last year up to now" requests made within a day
+are identical, and the shared result is right for each of them. Every caller
+gets its own copy of the frame, because callers add indicator columns in place.
+"""
+import time
+import threading
+from datetime import datetime, timedelta
+
+import metrics
+
+RATE = 10.0
+BURST = 40
+TTL = 2.0
+MAX_WAIT = 10.0
+DAILY_INTERVALS = {'1d', '5d', '1wk', '1mo', '3mo'}
+# Expired results are swept once the cache holds this many entries
+SWEEP_SIZE = 512
+
+MARKET_DATA_CALLS = metrics.Counter('stock_trader_market_data_calls',
+                                    'History requests by how they were answered', ['result'])
+UPSTREAM_THROTTLED = metrics.Counter('stock_trader_upstream_throttled',
+                                     'Downloads delayed or rejected by the upstream rate limit', ['result'])
+
+
+class Throttled(RuntimeError):
+    """The rate limiter could not grant a download within max_wait seconds."""
+
+
+def _day_floor(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def _day_ceiling(value):
+    floor = _day_floor(value)
+    return floor if floor == value else floor + timedelta(days=1)
+
+
+def normalize(kwargs):
+    """History kwargs with daily start/end aligned to midnight, and the cache key of the request."""
+    kwargs = dict(kwargs)
+    if kwargs.get('interval', '1d') in DAILY_INTERVALS:
+        if isinstance(kwargs.get('start'), datetime):
+            kwargs['start'] = _day_floor(kwargs['start'])
+        if isinstance(kwargs.get('end'), datetime):
+            kwargs['end'] = _day_ceiling(kwargs['end'])
+    key = tuple(sorted((name, value.isoformat() if isinstance(value, datetime) else value)
+                       for name, value in kwargs.items()))
+    return kwargs, key
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self, max_wait):
+        """Take a token, possibly ahead of time; returns the seconds to wait for it, or None if too long."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def acquire(self, max_wait):
+        """Block until a token is available; raises Throttled if that is more than max_wait seconds away."""
+        wait = self._reserve(max_wait)
+        if wait is None:
+            UPSTREAM_THROTTLED.labels('rejected').inc()
+            raise Throttled(f"Upstream rate limit of {self.rate:g}/s reached; try again shortly")
+        if wait > 0:
+            UPSTREAM_THROTTLED.labels('delayed').inc()
+            self.sleep(wait)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Gateway:
+    """Cached, coalesced and rate-limited calls of download(symbol, **kwargs)."""
+
+    def __init__(self, download, rate=RATE, burst=BURST, ttl=TTL, max_wait=MAX_WAIT, clock=time.monotonic):
+        self.download = download
+        self.ttl = ttl
+        self.max_wait = max_wait
+        self.clock = clock
+        self.limiter = TokenBucket(rate, burst, clock)
+        self._cache = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def history(self, symbol, **kwargs):
+        """Daily or intraday bars like Ticker.history; raises Throttled when the rate limit is exhausted."""
+        kwargs, key = normalize(kwargs)
+        key = (symbol,) + key
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and self.clock() - cached[0] < self.ttl:
+                MARKET_DATA_CALLS.labels('cached').inc()
+                return cached[1].copy()
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            MARKET_DATA_CALLS.labels('coalesced').inc()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result.copy()
+
+        try:
+            self.limiter.acquire(self.max_wait)
+            MARKET_DATA_CALLS.labels('downloaded').inc()
+            flight.result = self.download(symbol, **kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._store(key, flight.result)
+            return flight.result.copy()
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _store(self, key, result):
+        now = self.clock()
+        if len(self._cache) >= SWEEP_SIZE:
+            for stale in [k for k, (at, _) in self._cache.items() if now - at >= self.ttl]:
+                del self._cache[stale]
+        self._cache[key] = (now, result)
+
+    def stats(self):
+        with self._lock:
+            return {'cached_results': len(self._cache), 'in_flight': len(self._flights)}
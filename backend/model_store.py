@@ -0,0 +1,270 @@
+"""Shared, memory-mapped model store.
+
+Pickled scikit-learn models are unpickled into a private object graph in every
+process that loads them. This module flattens the tree ensembles saved in
+``models/<SYMBOL>_model.pkl`` into plain ``.npy`` arrays under ``models/mmap``
+and serves predictions straight from read-only memory maps of those arrays, so
+every web or worker process on a host shares the same physical pages.
+
+Usage:
+    python model_store.py            # export every model and print memory usage
+"""
+import os
+import sys
+import json
+import glob
+import shutil
+import threading
+
+import joblib
+import numpy as np
+
+import metrics
+
+MODEL_DIR = 'models'
+MMAP_DIR = os.path.join(MODEL_DIR, 'mmap')
+
+# Feature list used by models saved in the original format (a bare estimator)
+ORIGINAL_FEATURES = [
+    'SMA50', 'SMA200', 'RSI', 'MACD', 'Signal_Line', 'BB_Upper', 'BB_Lower',
+    'Close_Lag_1', 'Close_Lag_2', 'Close_Lag_3', 'Close_Lag_4', 'Close_Lag_5',
+    'Volume_Lag_1', 'Volume_Lag_2', 'Volume_Lag_3', 'Volume_Lag_4', 'Volume_Lag_5',
+    'Pct_Change'
+]
+
+ARRAYS = ['left', 'right', 'feature', 'threshold', 'value', 'roots', 'output']
+
+_models = {}
+_lock = threading.Lock()
+
+
+def model_path(symbol):
+    return os.path.join(MODEL_DIR, f'{symbol}_model.pkl')
+
+
+def _unpack(model_data):
+    """Split a saved model into (estimator, features, model_type)."""
+    if isinstance(model_data, dict) and 'model' in model_data:
+        return model_data['model'], model_data['features'], model_data.get('model_type', 'Unknown')
+    return model_data, ORIGINAL_FEATURES, 'original'
+
+
+def _flatten_trees(trees):
+    """Concatenate sklearn trees into global node arrays, one root offset per tree."""
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        t = tree.tree_
+        children_left = t.children_left.astype(np.int32)
+        children_right = t.children_right.astype(np.int32)
+        is_leaf = children_left == -1
+        left.append(np.where(is_leaf, -1, children_left + offset))
+        right.append(np.where(is_leaf, -1, children_right + offset))
+        feature.append(np.where(is_leaf, 0, t.feature).astype(np.int32))
+        threshold.append(t.threshold.astype(np.float64))
+        value.append(t.value[:, 0, :].astype(np.float64))
+        roots.append(offset)
+        offset += t.node_count
+    return {
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold),
+        'value': np.concatenate(value),
+        'roots': np.array(roots, dtype=np.int64),
+    }
+
+
+def _flatten(estimator):
+    """Return (arrays, meta) for a supported ensemble, or None."""
+    name = type(estimator).__name__
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+        arrays = _flatten_trees(estimator.estimators_)
+        # Leaves store class weights; predict_proba normalises each tree before averaging
+        totals = arrays['value'].sum(axis=1, keepdims=True)
+        arrays['value'] = np.divide(arrays['value'], totals, out=np.zeros_like(arrays['value']), where=totals > 0)
+        arrays['output'] = np.zeros(len(arrays['roots']), dtype=np.int32)
+        meta = {'kind': 'forest'}
+    elif name == 'GradientBoostingClassifier':
+        stages, outputs = estimator.estimators_.shape
+        arrays = _flatten_trees(estimator.estimators_.ravel())
+        arrays['output'] = np.tile(np.arange(outputs, dtype=np.int32), stages)
+        init_raw = estimator._raw_predict_init(np.zeros((1, estimator.n_features_in_), dtype=np.float32))[0]
+        meta = {
+            'kind': 'boosting',
+            'learning_rate': float(estimator.learning_rate),
+            'init_raw': [float(v) for v in init_raw],
+        }
+    else:
+        return None
+    meta['classes'] = [c.item() if hasattr(c, 'item') else c for c in estimator.classes_]
+    meta['max_depth'] = max(tree.tree_.max_depth for tree in np.ravel(estimator.estimators_))
+    return arrays, meta
+
+
+def export_model(symbol):
+    """Write the memory-mappable layout for a pickled model; returns its directory or None."""
+    path = model_path(symbol)
+    source_mtime = os.stat(path).st_mtime_ns
+    target = os.path.join(MMAP_DIR, f'{symbol}-{source_mtime}')
+    if os.path.exists(os.path.join(target, 'meta.json')):
+        return target
+
+    estimator, features, model_type = _unpack(joblib.load(path))
+    flattened = _flatten(estimator)
+    if flattened is None:
+        return None
+    arrays, meta = flattened
+    meta.update({'symbol': symbol, 'features': list(features), 'model_type': model_type,
+                 'source_mtime': source_mtime})
+
+    # Build in a private directory and rename it into place so concurrent
+    # exporters never expose a half-written model
+    os.makedirs(MMAP_DIR, exist_ok=True)
+    tmp_dir = os.path.join(MMAP_DIR, f'.{symbol}-{source_mtime}.{os.getpid()}.tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(arrays[name]))
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # Remove layouts exported from older versions of the pickle; processes still
+    # mapping them keep their pages until they reload
+    for old in glob.glob(os.path.join(MMAP_DIR, f'{symbol}-*')):
+        if old != target:
+            shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+class MappedModel:
+    """Tree ensemble evaluated directly over read-only memory-mapped arrays."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.directory = directory
+        self.features = self.meta['features']
+        self.model_type = self.meta['model_type']
+        self.classes = np.array(self.meta['classes'])
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r'))
+        if self.meta['kind'] == 'boosting':
+            # One-hot map from each boosting tree to the class column it contributes to
+            self.output_matrix = np.eye(len(self.meta['init_raw']))[self.output]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def _leaves(self, X):
+        """Walk every tree for every row at once; returns leaf indices (n_trees, n_rows)."""
+        rows = np.arange(X.shape[0])
+        nodes = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        for _ in range(self.meta['max_depth']):
+            left = self.left[nodes]
+            active = left != -1
+            if not active.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(active, np.where(go_left, left, self.right[nodes]), nodes)
+        return nodes
+
+    def predict(self, X):
+        # Trees compare float32 feature values, exactly as scikit-learn does
+        X = np.asarray(X, dtype=np.float32)
+        leaves = self._leaves(X)
+        if self.meta['kind'] == 'forest':
+            proba = self.value[leaves].mean(axis=0)
+            return self.classes[proba.argmax(axis=1)]
+
+        contributions = self.value[leaves][:, :, 0]
+        raw = np.asarray(self.meta['init_raw']) + self.meta['learning_rate'] * (contributions.T @ self.output_matrix)
+        if raw.shape[1] == 1:
+            return self.classes[(raw[:, 0] > 0).astype(int)]
+        return self.classes[raw.argmax(axis=1)]
+
+
+class PickledModel:
+    """Fallback for estimators that cannot be flattened; loaded with joblib's mmap_mode."""
+
+    def __init__(self, path):
+        self.estimator, self.features, self.model_type = _unpack(joblib.load(path, mmap_mode='r'))
+        self.nbytes = 0
+
+    def predict(self, X):
+        if hasattr(self.estimator, 'feature_names_in_'):
+            import pandas as pd
+            X = pd.DataFrame(X, columns=self.features)
+        return self.estimator.predict(X)
+
+
+def get_model(symbol):
+    """Return the shared model for a symbol, or None if it has no saved model.
+
+    The mapped layout is exported on first use and re-exported whenever the
+    pickle is replaced, so retrained models are picked up without a restart.
+    """
+    path = model_path(symbol)
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _models.get(symbol)
+    if cached and cached[0] == source_mtime:
+        metrics.CACHE_LOOKUPS.labels('model', 'hit').inc()
+        return cached[1]
+
+    metrics.CACHE_LOOKUPS.labels('model', 'miss').inc()
+    with _lock:
+        cached = _models.get(symbol)
+        if cached and cached[0] == source_mtime:
+            return cached[1]
+        directory = export_model(symbol)
+        model = MappedModel(directory) if directory else PickledModel(path)
+        _models[symbol] = (source_mtime, model)
+        return model
+
+
+def _proc_status():
+    """Resident memory counters for this process from /proc, in bytes."""
+    counters = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'RssAnon', 'RssFile', 'RssShmem'):
+                    counters[key] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+        # ru_maxrss is the peak, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        counters['VmRSS'] = peak if sys.platform == 'darwin' else peak * 1024
+    return counters
+
+
+def memory_usage():
+    """Per-process resident memory and the size of the models it has mapped."""
+    counters = _proc_status()
+    return {
+        'pid': os.getpid(),
+        'rss_bytes': counters.get('VmRSS'),
+        'rss_anon_bytes': counters.get('RssAnon'),
+        'rss_file_bytes': counters.get('RssFile'),
+        'rss_shmem_bytes': counters.get('RssShmem'),
+        'models_loaded': len(_models),
+        'models_mapped_bytes': sum(model.nbytes for _, model in _models.values()),
+    }
+
+
+if __name__ == '__main__':
+    for path in sorted(glob.glob(os.path.join(MODEL_DIR, '*_model.pkl'))):
+        symbol = os.path.basename(path)[:-len('_model.pkl')]
+        directory = export_model(symbol)
+        print(f"{symbol}: {directory or 'not flattenable, served with joblib mmap_mode'}")
+        get_model(symbol)
+    print(json.dumps(memory_usage(), indent=2))
@@ -0,0 +1,162 @@
+"""Keeping blocking and CPU-heavy work off the event loop in the gevent server mode.
+
+With ``ASYNC_MODE=gevent`` (see server.py) every connection is a greenlet
+on one event loop, and ``monkey.patch_all()`` turns ``threading.Lock``,
+``Event``, ``Queue`` and the like into gevent primitives. Those only work
+between greenlets of one thread: a patched lock that two native threads
+contend for, or an event one of them waits on, hangs them for good. So:
+
+- the update loops and the warm-up run as greenlets (``spawn``). They do
+  their downloads through the market data gateway, and their database, cache
+  and broadcast work, on the loop, taking turns with the requests (``cooperate``);
+- the CPU work of indicators, predictions, risk simulations and chart
+  rendering runs on a pool of native worker threads (``run``). numpy, pandas
+  and scikit-learn release the GIL for much of it, and the loop gets the GIL
+  back at least every switch interval, so sockets keep being served. What
+  runs there takes no lock, event or queue at all: its inputs (bars, the
+  symbol's model, the returns window) are looked up on the loop and passed
+  in, and its trader log records are held and written by the loop once it
+  returns;
+- yfinance blocks in curl_cffi, which gevent cannot patch, so its calls run
+  on a thread of their own (``download``). yfinance takes module-wide locks
+  on every call, which is safe on one thread and would hang two, so downloads
+  go one at a time (a few per second); the gateway's cache and coalescing keep
+  their number down;
+- ``call_in_loop`` / ``LoopEmitter`` hand emits made outside the loop
+  thread back to it. Socket.IO's queues and sockets belong to the loop.
+
+In the default threading mode every function here calls straight through,
+and ``spawn`` starts a daemon thread.
+"""
+import os
+import sys
+import weakref
+import functools
+import threading
+
+import logs
+
+# Worker threads for CPU work; OFFLOAD_THREADS overrides
+THREADS = os.cpu_count() or 1
+
+_hub = None
+_workers = None
+_downloads = None
+_loop_ident = None
+_native_ident = None
+# Native idents of the threads inside a run or download call, for the sampling profiler
+_busy = set()
+# Greenlets started by spawn, by name, and those serving HTTP requests, for the sampling profiler
+_tasks = {}
+_requests = weakref.WeakSet()
+
+
+def configure(mode, threads=THREADS):
+    """Enable offloading for the gevent async mode; call from the thread that runs the event loop."""
+    global _hub, _workers, _downloads, _loop_ident, _native_ident
+    if mode != 'gevent':
+        return
+    import gevent
+    from gevent.monkey import get_original
+    from gevent.threadpool import ThreadPool
+    _native_ident = get_original('_thread', 'get_ident')
+    _hub = gevent.get_hub()
+    _workers = ThreadPool(max(1, threads))
+    _downloads = ThreadPool(1)
+    _loop_ident = threading.get_ident()
+
+
+def active():
+    return _hub is not None
+
+
+def _call_holding_logs(func, args, kwargs):
+    ident = _native_ident()
+    _busy.add(ident)
+    try:
+        with logs.hold() as records:
+            try:
+                return records, func(*args, **kwargs), None
+            except Exception as e:
+                return records, None, e
+    finally:
+        _busy.discard(ident)
+
+
+def _apply(pool, func, args, kwargs):
+    if _hub is None:
+        return func(*args, **kwargs)
+    records, result, error = pool.apply(_call_holding_logs, (func, args, kwargs))
+    logs.replay(records)
+    if error is not None:
+        raise error
+    return result
+
+
+def run(func, *args, **kwargs):
+    """func(*args, **kwargs) on a worker thread, waiting without blocking the loop.
+
+    func must not take any lock, event or queue (see above); its log records are written once it returns.
+    """
+    return _apply(_workers, func, args, kwargs)
+
+
+def download(func, *args, **kwargs):
+    """func(*args, **kwargs) on the download thread, waiting without blocking the loop."""
+    return _apply(_downloads, func, args, kwargs)
+
+
+def cooperate():
+    """Let other greenlets run; a no-op in threading mode."""
+    if _hub is not None:
+        import gevent
+        gevent.sleep(0)
+
+
+def call_in_loop(func, *args, **kwargs):
+    """Run func on the event loop; from other threads it is queued and this returns at once."""
+    if _hub is None or threading.get_ident() == _loop_ident:
+        return func(*args, **kwargs)
+    _hub.loop.run_callback_threadsafe(functools.partial(func, *args, **kwargs))
+
+
+class LoopEmitter:
+    """Stands in for the SocketIO object where emit may be called outside the loop thread."""
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+
+    def emit(self, *args, **kwargs):
+        call_in_loop(self.socketio.emit, *args, **kwargs)
+
+
+def spawn(target, *args, name):
+    """Run target(*args) in the background: a greenlet with gevent, else a daemon thread."""
+    if _hub is None:
+        threading.Thread(target=target, args=args, name=name, daemon=True).start()
+        return
+    import gevent
+    task = _tasks[name] = gevent.spawn(target, *args)
+    task.name = name
+
+
+def track_request():
+    """Note the calling greenlet as a request handler for the sampling profiler; a no-op in threading mode."""
+    if _hub is not None:
+        import greenlet
+        _requests.add(greenlet.getcurrent())
+
+
+def task_frames():
+    """(name, current frame) of the live greenlets started by spawn or serving requests ('request'),
+    and of the worker and download threads while they run a call ('offload').
+
+    The calling greenlet is left out. Empty in threading mode.
+    """
+    import greenlet
+    current = greenlet.getcurrent()
+    tasks = list(_tasks.items()) + [('request', task) for task in list(_requests)]
+    frames = [(name, task.gr_frame) for name, task in tasks
+              if task is not current and not task.dead and task.gr_frame is not None]
+    threads = sys._current_frames()
+    return frames + [('offload', threads[ident]) for ident in list(_busy) if ident in threads]
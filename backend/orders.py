@@ -0,0 +1,272 @@
+"""Resting limit, stop, take-profit and trailing-stop orders, kept in per-symbol trigger books.
+
+An order fires the first time the price crosses its trigger:
+
+=============  ===========================  ===========================
+type           buy fires when price is      sell fires when price is
+=============  ===========================  ===========================
+limit          at or below trigger_price    at or above trigger_price
+stop           at or above trigger_price    at or below trigger_price
+take_profit    (sell only)                  at or above trigger_price
+trailing_stop  trail_percent above the low  trail_percent below the high
+=============  ===========================  ===========================
+
+Each symbol's ``TriggerBook`` keeps fixed triggers in two heaps, one for
+orders that fire on a rise and one for orders that fire on a fall. A price
+update pops only the orders it crosses.
+
+Trailing stops share their best price (the high for sells, the low for buys)
+with every order placed before the last time that price was beaten. So they
+form groups on a stack, oldest at the bottom, with the best price falling from
+bottom to top. A new best price merges the groups at the top of the stack into
+one, and never looks at single orders. Each group keeps its orders ordered by
+trail, and a heap of group thresholds finds the groups a price crosses. The
+cost of an update is the fills plus amortized merges, not the open orders.
+
+Fills are the caller's job: ``OrderBooks.cross`` returns the orders that
+fired, with the best and stop price of the trailing stops among them, and
+forgets them.
+"""
+import heapq
+import itertools
+import threading
+
+SIDES = ('buy', 'sell')
+TYPES = ('limit', 'stop', 'take_profit', 'trailing_stop')
+MAX_TRAIL_PERCENT = 50.0
+
+
+def validate(side, order_type, quantity, trigger_price=None, trail_percent=None):
+    """Raise ValueError unless the fields describe a valid order."""
+    if side not in SIDES:
+        raise ValueError(f"side must be one of {', '.join(SIDES)}")
+    if order_type not in TYPES:
+        raise ValueError(f"type must be one of {', '.join(TYPES)}")
+    if order_type == 'take_profit' and side != 'sell':
+        raise ValueError("take_profit orders sell a holding")
+    if quantity is None or quantity <= 0:
+        raise ValueError("quantity must be a positive number of shares")
+    if order_type == 'trailing_stop':
+        if trail_percent is None or not 0 < trail_percent < MAX_TRAIL_PERCENT:
+            raise ValueError(f"trailing_stop orders need trail_percent between 0 and {MAX_TRAIL_PERCENT:g}")
+    elif trigger_price is None or trigger_price <= 0:
+        raise ValueError(f"{order_type} orders need a positive trigger_price")
+
+
+def fires_on_rise(side, order_type):
+    """True for orders that fire when the price reaches their trigger from below."""
+    return (side == 'sell') == (order_type in ('limit', 'take_profit'))
+
+
+class _Group:
+    """Trailing stops sharing one best price, as a heap of (trail, seq, order id)."""
+    __slots__ = ('best', 'orders', 'version', 'merged')
+
+    def __init__(self, best):
+        self.best = best
+        self.orders = []
+        self.version = 0
+        self.merged = False
+
+
+class _TrailingBook:
+    """Trailing stops of one side of a symbol.
+
+    Prices are handled as x = sign * price, so that both sides trail the
+    highest x seen: sells (sign 1) the high, buys (sign -1) the low. An order
+    with trail t fires when x <= best * (1 - sign * t).
+    """
+
+    def __init__(self, sign):
+        self.sign = sign
+        self.stack = []
+        self.thresholds = []
+        self.group_of = {}
+        self.changed = set()
+        self._seq = itertools.count()
+
+    def _threshold(self, group):
+        return group.best * (1 - self.sign * group.orders[0][0])
+
+    def _prices(self, group, trail):
+        """(best price, stop price) of an order of group."""
+        return self.sign * group.best, self.sign * group.best * (1 - self.sign * trail)
+
+    def _requeue(self, group):
+        group.version += 1
+        if group.orders:
+            heapq.heappush(self.thresholds, (-self._threshold(group), next(self._seq), group.version, group))
+        if len(self.thresholds) > 2 * len(self.stack) + 64:
+            # Drop the entries of merged or since-changed groups
+            self.thresholds = [entry for entry in self.thresholds
+                               if entry[2] == entry[3].version and not entry[3].merged]
+            heapq.heapify(self.thresholds)
+
+    def _merge(self, into, group):
+        """Move the smaller group's orders into the larger one's heap; returns the one kept."""
+        if len(into.orders) < len(group.orders):
+            into, group = group, into
+        for entry in group.orders:
+            heapq.heappush(into.orders, entry)
+            self.group_of[entry[2]] = into
+        group.orders = []
+        group.merged = True
+        self.changed.discard(group)
+        return into
+
+    def observe(self, price):
+        x = self.sign * price
+        merged = None
+        moved = False
+        while self.stack and self.stack[-1].best <= x:
+            group = self.stack.pop()
+            moved = moved or group.best != x
+            merged = group if merged is None else self._merge(merged, group)
+        if merged is not None:
+            merged.best = x
+            if moved:
+                self.changed.add(merged)
+            self.stack.append(merged)
+            self._requeue(merged)
+
+    def add(self, order_id, trail, best_price):
+        """Add an order whose best price so far is best_price (the current price for a new order)."""
+        self.observe(best_price)
+        x = self.sign * best_price
+        if not self.stack or self.stack[-1].best != x:
+            self.stack.append(_Group(x))
+        group = self.stack[-1]
+        heapq.heappush(group.orders, (trail, next(self._seq), order_id))
+        self.group_of[order_id] = group
+        self._requeue(group)
+
+    def cross(self, price):
+        """Pop the orders that fire at price, after moving the best prices to it, as (id, (best, stop))."""
+        self.observe(price)
+        x = self.sign * price
+        fired = []
+        while self.thresholds and -self.thresholds[0][0] >= x:
+            _, _, version, group = heapq.heappop(self.thresholds)
+            if version != group.version or group.merged:
+                continue
+            while group.orders and self._threshold(group) >= x:
+                trail, _, order_id = heapq.heappop(group.orders)
+                self.group_of.pop(order_id, None)
+                fired.append((order_id, self._prices(group, trail)))
+            self._requeue(group)
+        return fired
+
+    def discard(self, order_id):
+        # Cancelled orders stay in their heap; cross skips ids that are no longer open
+        self.group_of.pop(order_id, None)
+
+    def state(self, order_id, trail):
+        """(best price, stop price) of an open order."""
+        return self._prices(self.group_of[order_id], trail)
+
+    def take_changed(self):
+        """Order ids whose best price moved since the last call."""
+        changed, self.changed = self.changed, set()
+        return [entry[2] for group in changed for entry in group.orders]
+
+
+class TriggerBook:
+    """Resting orders of one symbol."""
+
+    def __init__(self):
+        self.rise = []
+        self.fall = []
+        self.trailing = {'sell': _TrailingBook(1), 'buy': _TrailingBook(-1)}
+        self._seq = itertools.count()
+
+    def add(self, order_id, side, order_type, trigger_price=None, trail_percent=None, best_price=None):
+        if order_type == 'trailing_stop':
+            self.trailing[side].add(order_id, trail_percent / 100, best_price)
+        elif fires_on_rise(side, order_type):
+            heapq.heappush(self.rise, (trigger_price, next(self._seq), order_id))
+        else:
+            heapq.heappush(self.fall, (-trigger_price, next(self._seq), order_id))
+
+    def cross(self, price):
+        """The orders that fire at price, removed from the book, as (id, (best, stop) or None for fixed triggers)."""
+        fired = []
+        while self.rise and self.rise[0][0] <= price:
+            fired.append((heapq.heappop(self.rise)[2], None))
+        while self.fall and -self.fall[0][0] >= price:
+            fired.append((heapq.heappop(self.fall)[2], None))
+        for book in self.trailing.values():
+            fired += book.cross(price)
+        return fired
+
+
+class OrderBooks:
+    """Trigger books of every symbol with open orders, plus what the caller needs to know of each order."""
+
+    def __init__(self):
+        self.books = {}
+        self.open = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.open)
+
+    def add(self, order_id, symbol, side, order_type, trigger_price=None, trail_percent=None, best_price=None):
+        with self._lock:
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = TriggerBook()
+            book.add(order_id, side, order_type, trigger_price, trail_percent, best_price)
+            self.open[order_id] = (symbol, side, order_type, trail_percent)
+
+    def load(self, rows):
+        """Replace the books with open orders read from the database.
+
+        rows are (id, symbol, side, type, trigger_price, trail_percent, peak_price).
+        """
+        with self._lock:
+            self.books = {}
+            self.open = {}
+        # Trailing stops go in best price first, the order the stack keeps them in
+        for row in sorted(rows, key=lambda row: -(row[6] or 0) if row[2] == 'sell' else (row[6] or 0)):
+            self.add(*row)
+        self.loaded = True
+
+    def cancel(self, order_id):
+        with self._lock:
+            entry = self.open.pop(order_id, None)
+            if entry is not None and entry[2] == 'trailing_stop':
+                self.books[entry[0]].trailing[entry[1]].discard(order_id)
+            return entry is not None
+
+    def cross(self, symbol, price):
+        """{id: (best, stop) for trailing stops, else None} of the open orders of symbol that fire at price.
+
+        They are no longer open after this.
+        """
+        with self._lock:
+            book = self.books.get(symbol)
+            if book is None:
+                return {}
+            return {order_id: state for order_id, state in book.cross(price)
+                    if self.open.pop(order_id, None) is not None}
+
+    def trailing_state(self, order_id):
+        """(best price, stop price) of an open trailing stop, or None."""
+        with self._lock:
+            entry = self.open.get(order_id)
+            if entry is None or entry[2] != 'trailing_stop':
+                return None
+            return self.books[entry[0]].trailing[entry[1]].state(order_id, entry[3] / 100)
+
+    def changed_trailing(self):
+        """{order id: (best price, stop price)} of the open trailing stops that moved since the last call."""
+        with self._lock:
+            changed = {}
+            for book in self.books.values():
+                for trailing in book.trailing.values():
+                    for order_id in trailing.take_changed():
+                        entry = self.open.get(order_id)
+                        if entry is not None:
+                            changed[order_id] = trailing.state(order_id, entry[3] / 100)
+            return changed
@@ -0,0 +1,63 @@
+"""Write .gz and .br siblings of the React build's text files, for static_assets to send as they are.
+
+Run after every build (``npm run build`` does). Brotli files are written only
+when the ``brotli`` package is installed; browsers that do not accept brotli
+get the gzip file.
+
+Usage:
+    python precompress.py            # backend/static
+    python precompress.py path/to/build
+"""
+import os
+import sys
+import gzip
+import argparse
+
+from static_assets import COMPRESSIBLE, MIN_COMPRESS_BYTES
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+
+def compress_file(path):
+    """Write the smaller-than-original encodings of one file; returns {suffix: bytes written}."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    encoded = {'.gz': gzip.compress(data, 9)}
+    if brotli is not None:
+        encoded['.br'] = brotli.compress(data, quality=11)
+    written = {}
+    for suffix, body in encoded.items():
+        if len(body) >= len(data):
+            continue
+        with open(path + suffix, 'wb') as f:
+            f.write(body)
+        written[suffix] = len(body)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompress the static build for static_assets')
+    parser.add_argument('root', nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+
+    total = {'': 0, '.gz': 0, '.br': 0}
+    for directory, _, files in os.walk(args.root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE or os.path.getsize(path) < MIN_COMPRESS_BYTES:
+                continue
+            written = compress_file(path)
+            total[''] += os.path.getsize(path)
+            for suffix, size in written.items():
+                total[suffix] += size
+            print(f"{os.path.relpath(path, args.root)}: {os.path.getsize(path)} -> "
+                  + ', '.join(f'{suffix} {size}' for suffix, size in written.items()))
+    print(f"Total {total['']} bytes -> gzip {total['.gz']}" + (f", brotli {total['.br']}" if brotli else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""On-demand profiling of the running server.
+
+Two tools, both usable in production without a restart:
+
+- ``sample``: a wall-clock sampling profiler. The calling thread reads every
+  other thread's stack with ``sys._current_frames()`` at a fixed interval for a
+  few seconds. Profiled threads are not instrumented; only the sampler does
+  work, so at the default 100 Hz the overhead is small. The result is in the
+  collapsed stack format that flamegraph.pl and speedscope read, plus the top
+  functions by self time.
+- ``SymbolProfiles``: deterministic cProfile capture of one full pipeline pass
+  for a symbol. The update loop checks for a pending request before refreshing
+  each symbol, which costs a dict lookup when nothing is requested.
+"""
+import io
+import os
+import math
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+import offload
+
+DEFAULT_INTERVAL = 0.01
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+MAX_SECONDS = 60
+TOP = 30
+
+# One sampling run at a time; overlapping runs would double the overhead and split the samples
+_sampling = threading.Lock()
+
+
+def thread_group(name):
+    """'update' for the update workers, 'requests' for request threads (or greenlets), else 'other'."""
+    if name.startswith('update'):
+        return 'update'
+    return 'requests' if 'process_request' in name or name == 'request' else 'other'
+
+
+def _frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def sample(seconds, interval=DEFAULT_INTERVAL, group=None):
+    """Sample thread stacks for `seconds`; group limits it to one thread_group.
+
+    interval is clamped to [MIN_INTERVAL, MAX_INTERVAL]. Under gevent the
+    sampler is itself a greenlet: it sees the other greenlets where they last
+    yielded, and a greenlet that runs without yielding delays its samples.
+    Raises RuntimeError if another sampling run is in progress.
+    """
+    interval = float(interval)
+    interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL) if math.isfinite(interval) else DEFAULT_INTERVAL
+    seconds = float(seconds)
+    seconds = min(max(seconds, interval), MAX_SECONDS) if math.isfinite(seconds) else interval
+    if not _sampling.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        leaves = Counter()
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = [(names.get(ident), frame) for ident, frame in sys._current_frames().items() if ident != me]
+            # With gevent the update workers and requests are greenlets of the main thread,
+            # and their CPU work runs on offload's worker threads
+            frames += offload.task_frames()
+            for name, frame in frames:
+                if name is None or name == 'MainThread':
+                    continue
+                if group and thread_group(name) != group:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.reverse()
+                stacks[';'.join([thread_group(name)] + labels)] += 1
+                leaves[labels[-1]] += 1
+            samples += 1
+            time.sleep(interval)
+        elapsed = time.perf_counter() - started
+    finally:
+        _sampling.release()
+
+    total = sum(leaves.values()) or 1
+    return {
+        'seconds': round(elapsed, 3),
+        'interval': interval,
+        'samples': samples,
+        'collapsed': '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common()),
+        'top_self': [
+            {'function': label, 'samples': count, 'percent': round(100 * count / total, 2),
+             'seconds': round(count * interval, 3)}
+            for label, count in leaves.most_common(TOP)
+        ],
+    }
+
+
+def stats_report(profile, sort='cumulative', limit=TOP):
+    """pstats text of a cProfile run, plus the top functions by self time as data."""
+    text = io.StringIO()
+    stats = pstats.Stats(profile, stream=text)
+    stats.sort_stats(sort).print_stats(limit)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return {
+        'total_seconds': round(stats.total_tt, 4),
+        'top_self': [
+            {'function': f'{func} ({os.path.basename(path)}:{line})', 'calls': calls,
+             'self_seconds': round(tottime, 4), 'cumulative_seconds': round(cumtime, 4)}
+            for (path, line, func), (_, calls, tottime, cumtime, _) in rows
+        ],
+        'text': text.getvalue(),
+    }
+
+
+class SymbolProfiles:
+    """cProfile captures of the next pipeline pass of requested symbols."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def request(self, symbol):
+        """Ask for the next pass of symbol to be profiled; returns a slot whose 'done' event is set with its 'report'."""
+        with self._lock:
+            slot = self._pending.get(symbol)
+            if slot is None:
+                slot = self._pending[symbol] = {'done': threading.Event(), 'report': None}
+            return slot
+
+    def cancel(self, symbol, slot):
+        with self._lock:
+            if self._pending.get(symbol) is slot:
+                del self._pending[symbol]
+
+    def run(self, symbol, func, *args):
+        """Call func(*args), under cProfile if a capture of symbol was requested."""
+        if symbol not in self._pending:
+            return func(*args)
+        with self._lock:
+            slot = self._pending.pop(symbol, None)
+        if slot is None:
+            return func(*args)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            slot['report'] = stats_report(profile)
+            slot['done'].set()
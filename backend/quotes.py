@@ -0,0 +1,85 @@
+"""Latest quote per symbol, kept by the update loop and served in bulk.
+
+Each refresh replaces the symbol's row and serializes it to JSON right away.
+So a request for any subset of the universe only joins pre-built strings:
+no DataFrame access and no per-field encoding. The whole table of a few
+hundred symbols is ready in well under a millisecond.
+"""
+import json
+import math
+import threading
+
+# Indicator columns copied into every quote, under these names
+INDICATORS = {
+    'RSI': 'rsi', 'MACD': 'macd', 'Signal_Line': 'macd_signal', 'SMA20': 'sma20', 'SMA50': 'sma50',
+    'SMA200': 'sma200', 'BB_Upper': 'bb_upper', 'BB_Lower': 'bb_lower', 'ADX': 'adx',
+    'Volatility_20': 'volatility_20', 'Volume_Ratio': 'volume_ratio',
+}
+
+
+def _number(value, digits=2):
+    if value is None:
+        return None
+    value = float(value)
+    return round(value, digits) if math.isfinite(value) else None
+
+
+def build_quote(symbol, data, signal, details, as_of):
+    """Quote row of the latest bar of an indicator frame."""
+    latest = data.iloc[-1]
+    price = _number(latest['Close'])
+    previous_close = _number(data['Close'].iloc[-2]) if len(data) > 1 else None
+    return {
+        'symbol': symbol,
+        'price': price,
+        'previous_close': previous_close,
+        'change_pct': round((price / previous_close - 1) * 100, 2) if price and previous_close else None,
+        'volume': int(latest['Volume']) if math.isfinite(latest['Volume']) else None,
+        'signal': signal,
+        'model_signal': details.get('model_signal'),
+        'rule_signal': details.get('rule_signal'),
+        'buy_score': details.get('buy_score'),
+        'sell_score': details.get('sell_score'),
+        'indicators': {name: _number(latest[column], 4) for column, name in INDICATORS.items() if column in latest},
+        'bar_date': str(data.index[-1].date()),
+        'as_of': as_of.isoformat(timespec='seconds'),
+    }
+
+
+class QuoteTable:
+    """Symbol -> (quote dict, its JSON text), replaced whole on every update."""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def update(self, symbol, quote):
+        encoded = json.dumps(quote, separators=(',', ':'))
+        with self._lock:
+            self._rows[symbol] = (quote, encoded)
+
+    def retain(self, symbols):
+        """Drop symbols that left the universe."""
+        symbols = set(symbols)
+        with self._lock:
+            for symbol in [s for s in self._rows if s not in symbols]:
+                del self._rows[symbol]
+
+    def get(self, symbol):
+        row = self._rows.get(symbol)
+        return row[0] if row else None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def to_json(self, symbols=None):
+        """JSON object {"quotes": {...}, "missing": [...]} for symbols (default every symbol)."""
+        with self._lock:
+            rows = self._rows
+            if symbols is None:
+                found, missing = list(rows.items()), []
+            else:
+                found = [(symbol, rows[symbol]) for symbol in symbols if symbol in rows]
+                missing = [symbol for symbol in symbols if symbol not in rows]
+        body = ','.join(f'{json.dumps(symbol)}:{encoded}' for symbol, (_, encoded) in found)
+        return f'{{"quotes":{{{body}}},"missing":{json.dumps(missing)}}}'
@@ -0,0 +1,291 @@
+"""Accelerated end-to-end replay of the live update loop.
+
+Runs the real ``app.update_stock_data`` loop (fetch -> indicators -> predict ->
+emit -> bot trade) against recorded daily bars instead of Yahoo Finance. A
+virtual clock replaces the loop's sleeps, so every 5 second pause advances
+virtual time by ``5 * speedup`` seconds without waiting. The app runs in a
+temporary directory with its own stocks.json, links to the saved models and a
+throwaway data.db, so the real database is never touched.
+
+Usage:
+    python replay.py --data-dir bars --days 20 --symbols 40
+    python replay.py --data-dir bars --days 60 --symbols 200 --out replay.json --min-ticks-per-second 20
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from backtest import SETTING_NAMES, add_setting_arguments
+from history import BAR_COLUMNS, load_history, load_symbols
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ['fetch', 'indicators', 'predict', 'emit', 'trade']
+WARMUP_DAYS = 400
+
+
+class StopReplay(BaseException):
+    """Raised by the virtual clock to leave the endless update loop.
+
+    It derives from BaseException so the loop's ``except Exception`` handlers
+    do not swallow it.
+    """
+
+
+class VirtualClock:
+    """Clock whose sleeps advance virtual time instantly, scaled by speedup."""
+
+    def __init__(self, start, end, speedup):
+        self.current = start
+        self.end = end
+        self.speedup = speedup
+        self.cycles = 0
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.cycles += 1
+        self.current += timedelta(seconds=seconds * self.speedup)
+        if self.current > self.end:
+            raise StopReplay()
+
+
+class RecordedFeed:
+    """Stand-in for app.fetch_history that serves recorded bars up to the virtual date."""
+
+    def __init__(self, bars, sources, clock):
+        self.bars = {}
+        self.days = {}
+        for symbol, source in sources.items():
+            data = bars[source]
+            self.bars[symbol] = data
+            self.days[symbol] = data.index.tz_localize(None).normalize()
+        self.clock = clock
+
+    def __call__(self, symbol, start=None, end=None, period=None):
+        data = self.bars.get(symbol)
+        if data is None:
+            return pd.DataFrame(columns=BAR_COLUMNS)
+        days = self.days[symbol]
+        last_day = min(self.clock.now(), end) if end is not None else self.clock.now()
+        stop = days.searchsorted(pd.Timestamp(last_day.date()), side='right')
+        if period is not None:
+            return data.iloc[max(stop - 1, 0):stop].copy()
+        begin = days.searchsorted(pd.Timestamp(start.date()), side='left') if start is not None else 0
+        return data.iloc[begin:stop].copy()
+
+
+def _timed(samples, func):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+    return wrapper
+
+
+def replay_symbols(symbols, count):
+    """Map `count` replay symbols onto the recorded ones, cloning as SYMBOL_2, SYMBOL_3, ... when needed."""
+    sources = {}
+    for i in range(count):
+        base = symbols[i % len(symbols)]
+        copy = i // len(symbols)
+        sources[base if copy == 0 else f'{base}_{copy + 1}'] = base
+    return sources
+
+
+def prepare_workspace(directory, sources):
+    """Write stocks.json and link each replay symbol to its source symbol's saved model."""
+    with open(os.path.join(directory, 'stocks.json'), 'w') as f:
+        json.dump([{'symbol': symbol, 'name': symbol} for symbol in sources], f, indent=2)
+    os.makedirs(os.path.join(directory, 'models'))
+    for symbol, source in sources.items():
+        model = os.path.join(BACKEND_DIR, 'models', f'{source}_model.pkl')
+        if os.path.exists(model):
+            os.symlink(model, os.path.join(directory, 'models', f'{symbol}_model.pkl'))
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    if not len(values):
+        return {'calls': 0}
+    return {
+        'calls': len(values),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+        'total_s': round(float(values.sum()) / 1000, 3),
+    }
+
+
+def run_replay(bars, sources, days, speedup, settings, cash, verbose=False, intraday_dir=None, accounts=1):
+    """Drive app.update_stock_data over the last `days` days of the recorded bars."""
+    import app
+    import intraday
+
+    # Recorded 1m sessions go into the app's candle rings before the loop starts
+    if intraday_dir:
+        for symbol, source in sources.items():
+            minute_bars = intraday.load_recorded(source, intraday_dir)
+            if minute_bars is not None:
+                app.intraday_store.add_bars(symbol, minute_bars)
+
+    last_day = max(data.index[-1] for data in bars.values()).tz_localize(None).date()
+    start = datetime.combine(last_day - timedelta(days=days), datetime.min.time()) + timedelta(hours=10)
+    end = datetime.combine(last_day, datetime.min.time()) + timedelta(hours=16)
+    clock = VirtualClock(start, end, speedup)
+
+    # 1. Bot settings and funds in the throwaway database
+    session = app.Session()
+    bot = session.query(app.TradingBot).first()
+    bot.is_active = 1
+    for name in SETTING_NAMES:
+        setattr(bot, name, settings[name])
+    session.query(app.Wallet).first().balance = cash
+    # Extra accounts get the same bot and funds, so every one of them trades
+    for index in range(1, accounts):
+        account_id = f'replay-{index}'
+        session.add(app.Wallet(account_id=account_id, balance=cash))
+        session.add(app.TradingBot(account_id=account_id, is_active=1, last_updated=datetime.now(), **settings))
+    session.commit()
+    session.close()
+
+    # 2. Swap the data source and clock, and time every stage of the pipeline
+    samples = {stage: [] for stage in STAGES}
+    app.clock = clock
+    app.trading_calendar = None  # recorded days are replayed back to back
+    app.fetch_history = _timed(samples['fetch'], RecordedFeed(bars, sources, clock))
+    app.compute_indicators = _timed(samples['indicators'], app.compute_indicators)
+    app.predict_signal = _timed(samples['predict'], app.predict_signal)
+    app.execute_bot_trade = _timed(samples['trade'], app.execute_bot_trade)
+    app.socketio.emit = _timed(samples['emit'], app.socketio.emit)
+
+    # 3. Run the real loop until the virtual clock passes the last recorded day
+    started = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        try:
+            app.update_stock_data()
+        except StopReplay:
+            pass
+        finally:
+            app.logs.flush()  # queued log records still go to the redirected stdout
+    elapsed = time.perf_counter() - started
+
+    # 4. Trades the bot produced
+    session = app.Session()
+    trades = session.query(app.Transaction).filter(app.Transaction.description.like('%[BOT]%')).all()
+    open_positions = session.query(app.Portfolio).filter_by(account_id=app.DEFAULT_ACCOUNT).count()
+    balance = session.query(app.Wallet).filter_by(account_id=app.DEFAULT_ACCOUNT).first().balance
+    session.close()
+
+    ticks = len(samples['predict'])
+    return {
+        'symbols': len(sources),
+        'accounts': accounts,
+        'virtual_days': days,
+        'cycles': clock.cycles,
+        'speedup': speedup,
+        'elapsed_s': round(elapsed, 3),
+        'ticks': ticks,
+        'ticks_per_second': round(ticks / elapsed, 2) if elapsed else None,
+        'stages': {stage: percentiles(samples[stage]) for stage in STAGES},
+        'trades': {
+            'total': len(trades),
+            'buy': sum(1 for t in trades if t.type == 'buy'),
+            'sell': sum(1 for t in trades if t.type == 'sell'),
+        },
+        'open_positions': open_positions,
+        'wallet_balance': round(balance, 2),
+        'intraday_bytes': app.intraday_store.nbytes,
+    }
+
+
+def print_report(report):
+    print(f"\n{'='*60}")
+    print(f"Replayed {report['virtual_days']} virtual days ({report['cycles']} cycles) for "
+          f"{report['symbols']} symbols and {report['accounts']} accounts in {report['elapsed_s']:.2f}s")
+    print(f"Ticks: {report['ticks']} ({report['ticks_per_second']} ticks/s)")
+    print(f"{'='*60}")
+    print(f"{'stage':<12}{'calls':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>10}")
+    for stage, stats in report['stages'].items():
+        if not stats['calls']:
+            print(f"{stage:<12}{0:>8}")
+            continue
+        print(f"{stage:<12}{stats['calls']:>8}{stats['p50_ms']:>10.2f}{stats['p90_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}{stats['total_s']:>10.2f}")
+    print("(trade includes its own market-history fetch and indicators)")
+    trades = report['trades']
+    print(f"Trades: {trades['total']} (buy {trades['buy']}, sell {trades['sell']}), "
+          f"default account's open positions {report['open_positions']}, wallet ₹{report['wallet_balance']:,.2f}")
+    print(f"Intraday candle rings: {report['intraday_bytes'] / 1024:.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the live update loop over recorded bars')
+    parser.add_argument('--data-dir', help='Directory of recorded <SYMBOL>.csv bars (filled from Yahoo if missing)')
+    parser.add_argument('--days', type=int, default=20, help='Virtual calendar days to replay')
+    parser.add_argument('--symbols', type=int, help='Number of symbols to replay; recorded ones are cloned '
+                                                     'to reach it. Defaults to every symbol in stocks.json')
+    parser.add_argument('--speedup', type=float, default=17280.0,
+                        help='Virtual seconds per real second of loop sleep (default: one day per cycle)')
+    parser.add_argument('--cash', type=float, default=100000.0)
+    parser.add_argument('--accounts', type=int, default=1,
+                        help='Paper-trading accounts with the same bot settings and cash; trades count all of them')
+    parser.add_argument('--intraday-dir', help='Directory of recorded <SYMBOL>_1m.csv bars to load into the candle rings')
+    parser.add_argument('--out', help='Write the report as JSON')
+    parser.add_argument('--min-ticks-per-second', type=float, help='Exit with status 1 below this throughput')
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's own output")
+    add_setting_arguments(parser)
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir) if args.data_dir else None
+    out = os.path.abspath(args.out) if args.out else None
+    intraday_dir = os.path.abspath(args.intraday_dir) if args.intraday_dir else None
+    symbols = load_symbols(os.path.join(BACKEND_DIR, 'stocks.json'))
+    bars = {}
+    for symbol in symbols:
+        data = load_history(symbol, args.days + WARMUP_DAYS, data_dir)
+        if data.empty:
+            print(f"No data for {symbol}")
+            continue
+        bars[symbol] = data
+    sources = replay_symbols(list(bars), args.symbols or len(bars))
+    settings = {name: getattr(args, name) for name in SETTING_NAMES}
+
+    workspace = tempfile.mkdtemp(prefix='replay-')
+    cwd = os.getcwd()
+    try:
+        prepare_workspace(workspace, sources)
+        os.chdir(workspace)
+        report = run_replay(bars, sources, args.days, args.speedup, settings, args.cash, args.verbose, intraday_dir,
+                            args.accounts)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    print_report(report)
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {out}")
+    if args.min_ticks_per_second and report['ticks_per_second'] < args.min_ticks_per_second:
+        print(f"Throughput {report['ticks_per_second']} ticks/s is below {args.min_ticks_per_second}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
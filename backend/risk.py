@@ -0,0 +1,308 @@
+"""Portfolio risk over the current holdings.
+
+One-day Value at Risk and Conditional VaR (expected shortfall) from two
+vectorized simulations over the aligned daily returns of the held symbols:
+
+- historical: the portfolio P&L of every day in the returns window
+- Monte Carlo: correlated normal scenarios built from the window's mean and
+  covariance, using standard normal draws that are generated once and reused
+  for the default scenario count
+
+CVaR is also split per symbol and per sector, and a set of stress scenarios is
+applied to the positions. The returns window keeps running sums, so new daily
+bars update the mean and covariance incrementally instead of recomputing them.
+"""
+import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+WINDOW = 250
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SCENARIOS = 100000
+MAX_SCENARIOS = 500000
+# Running sums drift slightly with every add/remove; rebuild them from the rows this often
+REBUILD_EVERY = 500
+
+# Shocks by sector from stocks.json; '*' applies to every sector not listed
+STRESS_SCENARIOS = [
+    ('market_down_10', 'Broad market falls 10%', {'*': -0.10}),
+    ('market_crash_25', 'Broad market falls 25%, as in March 2020', {'*': -0.25}),
+    ('banking_stress', 'Banks and lenders fall 15%, the rest of the market 5%',
+     {'Banking': -0.15, 'Finance': -0.15, '*': -0.05}),
+    ('it_selloff', 'IT falls 12% on a global tech selloff', {'IT': -0.12}),
+    ('oil_shock', 'Energy rises 8%, Automotive, FMCG and Infrastructure fall 6%',
+     {'Energy': 0.08, 'Automotive': -0.06, 'FMCG': -0.06, 'Infrastructure': -0.06}),
+    ('metals_slump', 'Metals fall 15% on weak global demand', {'Metals': -0.15}),
+]
+
+
+def _generate_draws(scenarios, dimensions, seed):
+    draws = np.random.default_rng(seed).standard_normal((scenarios, dimensions), dtype=np.float32)
+    draws.flags.writeable = False
+    return draws
+
+
+@lru_cache(maxsize=4)
+def _default_draws(dimensions, seed):
+    return _generate_draws(DEFAULT_SCENARIOS, dimensions, seed)
+
+
+def normal_draws(scenarios, dimensions, seed=7):
+    """Standard normal draws (read-only) for a Monte Carlo run.
+
+    Only the DEFAULT_SCENARIOS size is generated once and shared. Other sizes are
+    picked by the client, so caching them would let requests pin memory.
+    """
+    if scenarios == DEFAULT_SCENARIOS:
+        return _default_draws(dimensions, seed)
+    return _generate_draws(scenarios, dimensions, seed)
+
+
+def _closes(data):
+    """Daily closes indexed by date, keeping the last row of any repeated date."""
+    close = pd.Series(data['Close'].to_numpy(), index=data.index.normalize())
+    return close[~close.index.duplicated(keep='last')]
+
+
+class ReturnsWindow:
+    """Last WINDOW aligned daily returns of a fixed set of symbols, with running sums."""
+
+    def __init__(self, symbols, window=WINDOW):
+        self.symbols = list(symbols)
+        self.window = window
+        self.signature = None
+        self.version = 0
+        self._reset()
+
+    def _reset(self):
+        n = len(self.symbols)
+        self.dates = []
+        self.rows = []
+        self.total = np.zeros(n)
+        self.cross = np.zeros((n, n))
+        self.changes = 0
+
+    def _add(self, date, row):
+        self.dates.append(date)
+        self.rows.append(row)
+        self.total += row
+        self.cross += np.outer(row, row)
+        self.changes += 1
+
+    def _remove(self, index):
+        row = self.rows.pop(index)
+        self.dates.pop(index)
+        self.total -= row
+        self.cross -= np.outer(row, row)
+        self.changes += 1
+
+    def sync(self, histories):
+        """Bring the window up to date with {symbol: bars}; returns True if it changed."""
+        signature = tuple((len(histories[s]), histories[s].index[-1], float(histories[s]['Close'].iloc[-1]))
+                          for s in self.symbols)
+        if signature == self.signature:
+            return False
+
+        # Align only the tail that can still matter
+        closes = pd.concat({s: _closes(histories[s].tail(self.window + 10)) for s in self.symbols}, axis=1)
+        returns = closes.dropna().pct_change().dropna()
+
+        if not self.dates or self.changes >= REBUILD_EVERY or returns.index[0] > self.dates[-1]:
+            self._reset()
+            fresh = returns
+        else:
+            # The latest stored day can still change intraday, so re-derive it with the new days
+            last = self.dates[-1]
+            self._remove(len(self.rows) - 1)
+            fresh = returns[returns.index >= last]
+
+        for date, row in zip(fresh.index, fresh.to_numpy()):
+            self._add(date, row)
+        while len(self.rows) > self.window:
+            self._remove(0)
+
+        self.signature = signature
+        self.version += 1
+        return True
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+    def matrix(self):
+        return np.array(self.rows)
+
+    def mean(self):
+        return self.total / self.count
+
+    def covariance(self):
+        n = self.count
+        mean = self.mean()
+        return (self.cross - n * np.outer(mean, mean)) / (n - 1)
+
+
+def _cholesky(covariance):
+    """Lower-triangular factor of a covariance matrix, clipping it to positive semi-definite if needed."""
+    try:
+        return np.linalg.cholesky(covariance + np.eye(len(covariance)) * 1e-12)
+    except np.linalg.LinAlgError:
+        values, vectors = np.linalg.eigh(covariance)
+        return vectors * np.sqrt(np.clip(values, 0, None))
+
+
+def _tail(pnl, confidence):
+    """(VaR, CVaR, tail mask) of a scenario P&L vector, losses reported as positive numbers."""
+    cutoff = np.quantile(pnl, 1 - confidence)
+    tail = pnl <= cutoff
+    return -float(cutoff), -float(pnl[tail].mean()), tail
+
+
+class RiskEngine:
+    """Caches returns windows per held symbol set and answers risk reports for holdings."""
+
+    def __init__(self, history, window=WINDOW, cached_sets=4):
+        self.history = history
+        self.window = window
+        self.cached_sets = cached_sets
+        self._windows = OrderedDict()
+        self._factors = {}
+        self._lock = threading.Lock()
+
+    def _window(self, symbols):
+        key = tuple(symbols)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = ReturnsWindow(symbols, self.window)
+            while len(self._windows) > self.cached_sets:
+                old_key, _ = self._windows.popitem(last=False)
+                self._factors.pop(old_key, None)
+        self._windows.move_to_end(key)
+        return window
+
+    def _factor(self, window):
+        """Cholesky factor of the window covariance, recomputed only when the window changes."""
+        key = tuple(window.symbols)
+        cached = self._factors.get(key)
+        if cached is None or cached[0] != window.version:
+            cached = self._factors[key] = (window.version, _cholesky(window.covariance()))
+        return cached[1]
+
+    def report(self, holdings, sectors, confidence=DEFAULT_CONFIDENCE, scenarios=DEFAULT_SCENARIOS):
+        """Risk report for {symbol: quantity} holdings; sectors maps symbol to sector name."""
+        return simulate(self.prepare(holdings), holdings, sectors, confidence, scenarios)
+
+    def prepare(self, holdings):
+        """Fetched histories and window statistics of the held symbols, the input of simulate()."""
+        started = time.perf_counter()
+        histories = {}
+        missing = []
+        for symbol in sorted(s for s, quantity in holdings.items() if quantity > 0):
+            data = self.history(symbol)
+            if data is None or len(data) < 3:
+                missing.append(symbol)
+            else:
+                histories[symbol] = data
+        symbols = list(histories)
+        if not symbols:
+            return {'missing': missing, 'error': 'No holdings with price history'}
+
+        with self._lock:
+            window = self._window(symbols)
+            window.sync(histories)
+            if window.count < 2:
+                return {'missing': missing, 'error': 'Not enough overlapping history for the held symbols'}
+            return {
+                'symbols': symbols,
+                'missing': missing,
+                'prices': np.array([float(histories[s]['Close'].iloc[-1]) for s in symbols]),
+                'returns': window.matrix(),
+                'mean': window.mean(),
+                'factor': self._factor(window),
+                'dates': list(window.dates),
+                'started': started,
+            }
+
+
+def simulate(inputs, holdings, sectors, confidence=DEFAULT_CONFIDENCE, scenarios=DEFAULT_SCENARIOS):
+    """Risk report from RiskEngine.prepare's inputs; pure computation, safe on any thread."""
+    if 'error' in inputs:
+        return {'positions': [], 'portfolio_value': 0.0, 'missing': inputs['missing'], 'error': inputs['error']}
+    confidence = min(max(confidence, 0.5), 0.999)
+    scenarios = min(max(scenarios, 1000), MAX_SCENARIOS)
+    symbols, missing, prices = inputs['symbols'], inputs['missing'], inputs['prices']
+    returns, mean, factor, dates = inputs['returns'], inputs['mean'], inputs['factor'], inputs['dates']
+    as_of = dates[-1]
+
+    # 1. Positions and exposures
+    quantities = np.array([holdings[s] for s in symbols], dtype=float)
+    values = prices * quantities
+    total_value = float(values.sum())
+    symbol_sectors = [sectors.get(s, 'Unknown') for s in symbols]
+
+    # 2. Historical simulation: P&L of every day in the window
+    historical_pnl = returns @ values
+    hist_var, hist_cvar, hist_tail = _tail(historical_pnl, confidence)
+    hist_contrib = -(returns[hist_tail] * values).mean(axis=0)
+
+    # 3. Monte Carlo: P&L = (mean + z L^T) . values, so only z . (L^T values) is needed per scenario
+    draws = normal_draws(scenarios, len(symbols))
+    loadings = (factor.T @ values).astype(np.float32)
+    mc_pnl = draws @ loadings + float(mean @ values)
+    mc_var, mc_cvar, mc_tail = _tail(mc_pnl, confidence)
+    tail_returns = draws[mc_tail] @ factor.T + mean
+    mc_contrib = -(tail_returns * values).mean(axis=0)
+
+    # 4. Stress scenarios
+    stress = []
+    for name, description, shocks in STRESS_SCENARIOS:
+        moves = np.array([shocks.get(sector, shocks.get('*', 0.0)) for sector in symbol_sectors])
+        pnl = float(moves @ values)
+        stress.append({'name': name, 'description': description, 'pnl': round(pnl, 2),
+                       'pnl_pct': round(pnl / total_value * 100, 2)})
+    worst = int(historical_pnl.argmin())
+    stress.append({'name': 'worst_day_in_window',
+                   'description': f"Repeat of the worst day in the window ({dates[worst].date()})",
+                   'pnl': round(float(historical_pnl[worst]), 2),
+                   'pnl_pct': round(float(historical_pnl[worst]) / total_value * 100, 2)})
+
+    positions = []
+    sector_totals = {}
+    for i, symbol in enumerate(symbols):
+        positions.append({
+            'symbol': symbol,
+            'sector': symbol_sectors[i],
+            'quantity': int(quantities[i]),
+            'price': round(float(prices[i]), 2),
+            'value': round(float(values[i]), 2),
+            'weight': round(float(values[i]) / total_value, 4),
+            'cvar_contribution': {'historical': round(float(hist_contrib[i]), 2),
+                                  'monte_carlo': round(float(mc_contrib[i]), 2)},
+        })
+        totals = sector_totals.setdefault(symbol_sectors[i], {'value': 0.0, 'historical': 0.0, 'monte_carlo': 0.0})
+        totals['value'] += float(values[i])
+        totals['historical'] += float(hist_contrib[i])
+        totals['monte_carlo'] += float(mc_contrib[i])
+
+    def summary(var, cvar):
+        return {'var': round(var, 2), 'cvar': round(cvar, 2),
+                'var_pct': round(var / total_value * 100, 3), 'cvar_pct': round(cvar / total_value * 100, 3)}
+
+    return {
+        'as_of': str(as_of.date()),
+        'confidence': confidence,
+        'horizon_days': 1,
+        'observations': len(returns),
+        'portfolio_value': round(total_value, 2),
+        'historical': summary(hist_var, hist_cvar),
+        'monte_carlo': dict(summary(mc_var, mc_cvar), scenarios=scenarios),
+        'positions': positions,
+        'sectors': {sector: {key: round(value, 2) for key, value in totals.items()}
+                    for sector, totals in sorted(sector_totals.items())},
+        'stress': stress,
+        'missing': missing,
+        'elapsed_ms': round((time.perf_counter() - inputs['started']) * 1000, 2),
+    }
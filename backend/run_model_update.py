@@ -1,55 +1,284 @@
 import os
 import sys
 import time
-import subprocess
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+
+import finetune_models
+import model_store
+from finetune_models import FEATURE_VERSION
+
+STATE_FILE = 'models/update_state.json'
+
+# A model is rebuilt once this many new daily bars have arrived since it was trained
+MIN_NEW_BARS = 20
+# Rise in the drift metric (mean absolute z-score of recent feature means against
+# the training distribution) since the model was built that forces a rebuild
+DRIFT_THRESHOLD = 0.5
+DRIFT_WINDOW = 60
+# Number of bars hashed to detect upstream revisions (splits, dividend adjustments)
+REVISION_WINDOW = 30
+
+
+class StageTimer:
+    """Accumulate wall-clock time per named stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self.order = []
+
+    def start(self, name):
+        if name not in self.stages:
+            self.stages[name] = 0.0
+            self.order.append(name)
+        return time.time()
+
+    def stop(self, name, started):
+        self.stages[name] += time.time() - started
+
+    def report(self, total):
+        print(f"\n{'='*80}")
+        print("STAGE TIMINGS")
+        print(f"{'='*80}")
+        for name in self.order:
+            seconds = self.stages[name]
+            share = seconds / total * 100 if total > 0 else 0
+            print(f"{name:<20} {seconds:>10.2f}s {share:>6.1f}%")
+        print(f"{'total':<20} {total:>10.2f}s")
+
+
+def load_state():
+    """Load the per-symbol build checkpoint, or an empty one."""
+    if not os.path.exists(STATE_FILE):
+        return {'symbols': {}}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    """Write the checkpoint atomically so an interrupted run never corrupts it."""
+    tmp_path = STATE_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def revision_hash(data, through_date):
+    """Hash the closes of the last REVISION_WINDOW bars up to through_date."""
+    closes = data.loc[data.index.strftime('%Y-%m-%d') <= through_date, 'Close'].tail(REVISION_WINDOW)
+    return hashlib.sha1(np.round(closes.to_numpy(dtype=float), 4).tobytes()).hexdigest()
+
+
+def data_signature(data):
+    """Fingerprint of the history a model is trained on."""
+    last_date = data.index[-1].strftime('%Y-%m-%d')
+    return {
+        'last_date': last_date,
+        'rows': len(data),
+        'revision_hash': revision_hash(data, last_date)
+    }
+
+
+def load_model_data(symbol):
+    """Load a saved model, normalising the original format into the dict format."""
+    model_data = joblib.load(f'models/{symbol}_model.pkl')
+    if not (isinstance(model_data, dict) and 'model' in model_data):
+        model_data = {'model': model_data, 'feature_version': 1}
+    return model_data
+
+
+def drift_metric(model_data, data):
+    """Mean absolute z-score of the recent feature means against the training statistics."""
+    stats = model_data.get('feature_stats')
+    if not stats:
+        return None
+    features = finetune_models.calculate_technical_indicators(data.copy())
+    recent = features[list(stats)].tail(DRIFT_WINDOW).mean()
+    z_scores = [
+        abs(recent[feature] - s['mean']) / s['std']
+        for feature, s in stats.items()
+        if s['std'] and not np.isnan(recent[feature])
+    ]
+    return float(np.mean(z_scores)) if z_scores else None
+
+
+def stale_reasons(symbol, data, entry, min_new_bars, drift_threshold):
+    """Return why a symbol's model must be rebuilt; an empty list means it is current."""
+    if not os.path.exists(f'models/{symbol}_model.pkl'):
+        return ['missing']
+
+    model_data = load_model_data(symbol)
+    if model_data.get('feature_version', 1) != FEATURE_VERSION:
+        return ['feature_version']
+    if not entry or entry.get('status') != 'built':
+        return ['untracked']
+
+    reasons = []
+    new_bars = int((data.index.strftime('%Y-%m-%d') > entry['last_date']).sum())
+    if new_bars >= min_new_bars:
+        reasons.append(f'data (+{new_bars} bars)')
+    elif revision_hash(data, entry['last_date']) != entry['revision_hash']:
+        reasons.append('data (revised)')
+
+    drift = drift_metric(model_data, data)
+    baseline = entry.get('drift')
+    if drift is not None and baseline is not None and drift - baseline >= drift_threshold:
+        reasons.append(f'drift ({baseline:.2f} -> {drift:.2f})')
+    return reasons
+
+
+def _limit_worker_threads():
+    """Keep each training process on one core so the CPU budget holds."""
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+
+def _train_symbol(symbol, data):
+    """Worker entry point: fine-tune one model, export its mapped layout and measure its drift baseline."""
+    started = time.time()
+    _, score = finetune_models.finetune_model(symbol, data)
+    model_store.export_model(symbol)
+    drift = drift_metric(load_model_data(symbol), data)
+    return score, drift, time.time() - started
+
+
+def fetch_all(symbols, workers):
+    """Download training history for all symbols concurrently."""
+    histories = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(finetune_models.fetch_history, symbol): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                histories[symbol] = future.result()
+            except Exception as e:
+                errors[symbol] = str(e)
+                print(f"Error fetching {symbol}: {e}")
+    return histories, errors
 
-def run_command(command, description):
-    """Run a command and print its output in real-time."""
-    print(f"\n{'='*80}")
-    print(f"STARTING: {description}")
-    print(f"{'='*80}\n")
-    
-    process = subprocess.Popen(
-        command, 
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        shell=True
-    )
-    
-    # Print output in real-time
-    for line in process.stdout:
-        print(line, end='')
-    
-    # Wait for process to complete
-    process.wait()
-    
-    if process.returncode != 0:
-        print(f"\nERROR: {description} failed with return code {process.returncode}")
-    else:
-        print(f"\nSUCCESS: {description} completed successfully")
-    
-    return process.returncode
 
 def main():
-    """Main function to run all model training and fine-tuning steps."""
+    """Rebuild only the models whose inputs changed, resuming any interrupted run."""
+    parser = argparse.ArgumentParser(description='Incrementally retrain stock models')
+    parser.add_argument('--symbols', nargs='*', help='Limit the run to these symbols')
+    parser.add_argument('--force', action='store_true', help='Retrain every symbol regardless of state')
+    parser.add_argument('--cpus', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help='Maximum number of models trained in parallel')
+    parser.add_argument('--fetch-workers', type=int, default=8, help='Concurrent history downloads')
+    parser.add_argument('--min-new-bars', type=int, default=MIN_NEW_BARS)
+    parser.add_argument('--drift-threshold', type=float, default=DRIFT_THRESHOLD)
+    parser.add_argument('--dry-run', action='store_true', help='Only report which symbols are stale')
+    args = parser.parse_args()
+
     start_time = time.time()
-    
-    # Step 1: Train models for missing stocks
-    run_command("python train_missing_models.py", "Training models for missing stocks")
-    
-    # Step 2: Fine-tune all models (including newly created ones)
-    run_command("python finetune_models.py", "Fine-tuning all stock models")
-    
-    # Print summary
+    timer = StageTimer()
+
+    if not os.path.exists('models'):
+        os.makedirs('models')
+
+    state = load_state()
+    symbols = args.symbols or finetune_models.get_all_stocks()
+
+    interrupted = state.get('run')
+    resumed = set(interrupted.get('pending', [])) if interrupted else set()
+    if resumed:
+        print(f"Resuming run started {interrupted['started_at']}: "
+              f"{len(resumed)} symbols were still pending")
+
+    # Stage 1: fetch history
+    started = timer.start('fetch')
+    histories, fetch_errors = fetch_all(symbols, args.fetch_workers)
+    timer.stop('fetch', started)
+
+    # Stage 2: decide what is stale
+    started = timer.start('plan')
+    stale = {}
+    for symbol in symbols:
+        if symbol not in histories:
+            continue
+        if args.force:
+            stale[symbol] = ['forced']
+            continue
+        if symbol in resumed:
+            # The interrupted run may have been forced, so its pending symbols are rebuilt whatever their state
+            stale[symbol] = ['resumed']
+            continue
+        try:
+            reasons = stale_reasons(symbol, histories[symbol], state['symbols'].get(symbol),
+                                    args.min_new_bars, args.drift_threshold)
+        except Exception as e:
+            reasons = [f'unreadable model ({e})']
+        if reasons:
+            stale[symbol] = reasons
+    timer.stop('plan', started)
+
+    print(f"\n{len(stale)} of {len(symbols)} models need rebuilding")
+    for symbol, reasons in stale.items():
+        print(f"  {symbol}: {', '.join(reasons)}")
+
+    if args.dry_run or not stale:
+        timer.report(time.time() - start_time)
+        return 0
+
+    # Stage 3: train stale symbols within the CPU budget, checkpointing each result.
+    # Pending symbols outside this run (not requested or not fetched) stay pending for the next one.
+    state['run'] = {'started_at': datetime.now().isoformat(), 'pending': sorted(set(stale) | resumed)}
+    save_state(state)
+
+    started = timer.start('train')
+    train_times = {}
+    failed = {}
+    with ProcessPoolExecutor(max_workers=args.cpus, initializer=_limit_worker_threads) as executor:
+        futures = {executor.submit(_train_symbol, symbol, histories[symbol]): symbol for symbol in stale}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                score, drift, seconds = future.result()
+            except Exception as e:
+                print(f"Error fine-tuning model for {symbol}: {e}")
+                failed[symbol] = str(e)
+                state['symbols'][symbol] = {'status': 'failed', 'error': str(e),
+                                            'attempted_at': datetime.now().isoformat()}
+            else:
+                train_times[symbol] = seconds
+                state['symbols'][symbol] = dict(
+                    data_signature(histories[symbol]),
+                    status='built',
+                    feature_version=FEATURE_VERSION,
+                    drift=drift,
+                    score=score,
+                    train_seconds=round(seconds, 2),
+                    built_at=datetime.now().isoformat()
+                )
+            state['run']['pending'].remove(symbol)
+            save_state(state)
+    timer.stop('train', started)
+
+    if not state['run']['pending']:
+        state.pop('run')
+    save_state(state)
+
     elapsed_time = time.time() - start_time
-    hours, rem = divmod(elapsed_time, 3600)
-    minutes, seconds = divmod(rem, 60)
-    
     print(f"\n{'='*80}")
     print("MODEL UPDATE COMPLETE")
-    print(f"Total time: {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}")
+    print(f"Rebuilt {len(train_times)} models, {len(failed)} failed, "
+          f"{len(symbols) - len(stale) - len(fetch_errors)} already current, {len(fetch_errors)} not fetched")
+    for symbol, seconds in sorted(train_times.items(), key=lambda x: x[1], reverse=True)[:10]:
+        print(f"  {symbol:<15} {seconds:>8.2f}s")
+    timer.report(elapsed_time)
     print(f"{'='*80}")
+    return 1 if failed else 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
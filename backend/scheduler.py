@@ -0,0 +1,208 @@
+"""Prioritized, sharded refresh scheduling for the update loop.
+
+Every symbol gets its own refresh interval from the tier it is in:
+
+- held: in the portfolio, so the bot's profit target and stop loss stay current
+- watched: subscribed to by a Socket.IO client, or recently requested through /api/stock
+- volatile: annualized 20-day volatility at or above VOLATILE_THRESHOLD
+- default: everything else in the universe
+
+Symbols are split into shards by a stable hash, one per update worker, and each
+shard keeps a heap of due times. So a worker only wakes for symbols that are
+due, and a large universe of quiet symbols does not delay the ones that matter.
+"""
+import heapq
+import threading
+import zlib
+
+import numpy as np
+
+REFRESH_INTERVALS = {'held': 5, 'watched': 5, 'volatile': 15, 'default': 60}
+TIERS = ['held', 'watched', 'volatile', 'default']
+WATCH_TTL = 120
+VOLATILE_THRESHOLD = 0.4
+MIN_WAIT = 0.2
+MAX_WAIT = 5
+
+
+def shard_of(symbol, shards):
+    """Stable shard index of a symbol (Python's hash() changes between processes)."""
+    return zlib.crc32(symbol.encode()) % shards
+
+
+def parse_shard(spec):
+    """'i/n' -> (i, n); None or '' means the whole universe."""
+    if not spec:
+        return 0, 1
+    index, _, count = spec.partition('/')
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard {spec}; expected i/n with 0 <= i < n")
+    return index, count
+
+
+class RefreshScheduler:
+    """Due times per symbol, kept in one heap per shard with lazy invalidation."""
+
+    def __init__(self, shards=1, intervals=None, watch_ttl=WATCH_TTL):
+        self.shards = shards
+        self.intervals = dict(REFRESH_INTERVALS, **(intervals or {}))
+        self.watch_ttl = watch_ttl
+        self._heaps = [[] for _ in range(shards)]
+        self._due = {}
+        self._refreshed = {}
+        self._volatility = {}
+        self._watched = {}
+        self._subscribers = {}
+        self._held = set()
+        self._lock = threading.Lock()
+
+    def _push(self, symbol, due):
+        self._due[symbol] = due
+        heapq.heappush(self._heaps[shard_of(symbol, self.shards)], (due, symbol))
+
+    def _tier(self, symbol, now):
+        if symbol in self._held:
+            return 'held'
+        if self._subscribers.get(symbol):
+            return 'watched'
+        watched_until = self._watched.get(symbol)
+        if watched_until is not None and watched_until > now:
+            return 'watched'
+        volatility = self._volatility.get(symbol)
+        if volatility is not None and volatility >= VOLATILE_THRESHOLD:
+            return 'volatile'
+        return 'default'
+
+    def _interval(self, symbol, now):
+        return self.intervals[self._tier(symbol, now)]
+
+    def _reprioritize(self, symbol, now):
+        """Pull a symbol's next refresh forward if its tier now asks for a shorter interval."""
+        if symbol not in self._due:
+            return
+        refreshed = self._refreshed.get(symbol)
+        target = now if refreshed is None else max(now, refreshed + self._interval(symbol, now))
+        if target < self._due[symbol]:
+            self._push(symbol, target)
+
+    def set_universe(self, symbols, now):
+        """Track exactly these symbols; new ones are due immediately."""
+        with self._lock:
+            symbols = set(symbols)
+            for symbol in list(self._due):
+                if symbol not in symbols:
+                    del self._due[symbol]
+                    self._refreshed.pop(symbol, None)
+                    self._volatility.pop(symbol, None)
+                    self._watched.pop(symbol, None)
+            for symbol in symbols:
+                if symbol not in self._due:
+                    self._push(symbol, now)
+
+    def set_held(self, symbols, now):
+        with self._lock:
+            self._held = set(symbols)
+            for symbol in self._held:
+                self._reprioritize(symbol, now)
+
+    def watch(self, symbol, now):
+        """Mark a symbol in the universe as watched by a client for watch_ttl seconds."""
+        with self._lock:
+            if symbol not in self._due:
+                return
+            self._watched[symbol] = now + self.watch_ttl
+            self._reprioritize(symbol, now)
+
+    def set_subscribers(self, counts, now):
+        """Subscribed clients per symbol; symbols with any stay watched for as long as they are subscribed."""
+        with self._lock:
+            self._subscribers = dict(counts)
+            for symbol in self._subscribers:
+                self._reprioritize(symbol, now)
+
+    def expedite(self, symbol, now):
+        """Make a tracked symbol due now unless it is being refreshed; returns False if it is not tracked."""
+        with self._lock:
+            if symbol not in self._due:
+                return False
+            if self._due[symbol] != float('inf') and self._due[symbol] > now:
+                self._push(symbol, now)
+            return True
+
+    def due(self, now, shard=None):
+        """Pop every symbol due by now, in one shard or across all of them."""
+        ready = []
+        with self._lock:
+            for index in range(self.shards) if shard is None else [shard]:
+                heap = self._heaps[index]
+                while heap and heap[0][0] <= now:
+                    due, symbol = heapq.heappop(heap)
+                    if self._due.get(symbol) == due:
+                        # In flight until record() schedules it again
+                        self._due[symbol] = float('inf')
+                        ready.append(symbol)
+        return ready
+
+    def record(self, symbol, now, volatility=None):
+        """Note a finished refresh attempt and schedule the symbol's next one."""
+        with self._lock:
+            if symbol not in self._due:
+                return
+            self._refreshed[symbol] = now
+            if volatility is not None and np.isfinite(volatility):
+                self._volatility[symbol] = float(volatility)
+            self._push(symbol, now + self._interval(symbol, now))
+
+    def wait(self, now, shard=None):
+        """Seconds until the next symbol in the shard (or any shard) is due."""
+        with self._lock:
+            heads = [heap[0][0] for index, heap in enumerate(self._heaps)
+                     if heap and (shard is None or index == shard)]
+        if not heads:
+            return MAX_WAIT
+        return min(max(min(heads) - now, MIN_WAIT), MAX_WAIT)
+
+    def expected_refreshes(self, seconds, now, shard=None):
+        """Refreshes the tracked symbols in a shard (or all) would need over `seconds` at their intervals."""
+        with self._lock:
+            return sum(seconds / self._interval(symbol, now) for symbol in self._due
+                       if shard is None or shard_of(symbol, self.shards) == shard)
+
+    def staleness(self, now):
+        """Per-symbol seconds since the last refresh (None if never refreshed) and tier."""
+        with self._lock:
+            return {
+                symbol: {
+                    'tier': self._tier(symbol, now),
+                    'interval': self._interval(symbol, now),
+                    'shard': shard_of(symbol, self.shards),
+                    'subscribers': self._subscribers.get(symbol, 0),
+                    'staleness': (now - self._refreshed[symbol]) if symbol in self._refreshed else None,
+                }
+                for symbol in sorted(self._due)
+            }
+
+    def summary(self, now):
+        """Staleness percentiles per tier, plus the stalest symbols."""
+        symbols = self.staleness(now)
+        tiers = {}
+        for tier in TIERS:
+            members = [s for s in symbols.values() if s['tier'] == tier]
+            ages = np.array([s['staleness'] for s in members if s['staleness'] is not None])
+            tiers[tier] = {
+                'symbols': len(members),
+                'interval': self.intervals[tier],
+                'never_refreshed': sum(1 for s in members if s['staleness'] is None),
+                'staleness_p50': round(float(np.percentile(ages, 50)), 2) if len(ages) else None,
+                'staleness_p95': round(float(np.percentile(ages, 95)), 2) if len(ages) else None,
+                'staleness_max': round(float(ages.max()), 2) if len(ages) else None,
+            }
+        stalest = sorted(((s['staleness'], symbol) for symbol, s in symbols.items() if s['staleness'] is not None),
+                         reverse=True)[:10]
+        return {
+            'symbols': len(symbols),
+            'shards': self.shards,
+            'tiers': tiers,
+            'stalest': [{'symbol': symbol, 'staleness': round(age, 2)} for age, symbol in stalest],
+        }
@@ -0,0 +1,24 @@
+"""Production server: gevent event loop, with the update loop as greenlets and CPU work and downloads on threads.
+
+    python server.py
+    gunicorn -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker -w 1 -b 0.0.0.0:5000 server:app
+
+Each Socket.IO connection is a greenlet of a few tens of kilobytes instead of
+an OS thread, so the number of open dashboards is bounded by memory and file
+descriptors rather than threads. See offload.py for what runs where. Keep one
+worker process: Socket.IO clients and rooms live in the process's memory.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+
+os.environ.setdefault('ASYNC_MODE', 'gevent')
+
+from app import app, socketio, start_server  # noqa: E402
+
+start_server()
+
+if __name__ == '__main__':
+    socketio.run(app, host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', '5000')))
@@ -0,0 +1,169 @@
+"""Serving the bundled React build with long-lived caching and precompressed files.
+
+- Files whose names carry a content hash (everything listed in
+  ``asset-manifest.json``, e.g. ``static/js/main.95df94b8.js``) are sent with
+  ``Cache-Control: immutable`` for a year, so a browser downloads each build
+  once. ``index.html`` is always revalidated, so a new build is picked up on
+  the next load.
+- A ``.br`` or ``.gz`` sibling written at build time by ``precompress.py`` is
+  sent instead of the file when the client accepts that encoding. A small file
+  without a gzip sibling is compressed once when it is first loaded.
+- Files up to CACHE_FILE_BYTES are read once and kept in memory with all their
+  encodings, so the dashboard's assets cost no disk reads or compression per
+  request. Larger files, such as source maps, are streamed from disk.
+- A path without a file extension that is not a file is a client-side route,
+  and gets ``index.html``.
+
+A new build is detected by the mtime of ``index.html``, which drops the cache.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import mimetypes
+import threading
+
+from flask import Response, send_file
+from werkzeug.security import safe_join
+
+INDEX = 'index.html'
+MANIFEST = 'asset-manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+SHORT = 'public, max-age=3600'
+CACHE_FILE_BYTES = 1 << 20
+CACHE_BYTES = 32 << 20
+# Preferred first; the sibling file of each encoding has this suffix
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE = {'.js', '.css', '.html', '.json', '.map', '.txt', '.svg', '.ico'}
+MIN_COMPRESS_BYTES = 1024
+# Create React App names hashed files name.<8 hex>[.chunk].ext
+HASHED = re.compile(r'\.[0-9a-f]{8}(\.chunk)?\.[a-z0-9]+$')
+
+mimetypes.add_type('application/json', '.map')
+
+
+class Asset:
+    """One file of the build: headers, and its body per encoding (bytes in memory, or a path on disk)."""
+    __slots__ = ('content_type', 'cache_control', 'etag', 'bodies')
+
+    def __init__(self, content_type, cache_control, etag, bodies):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = etag
+        self.bodies = bodies
+
+    def encoding_for(self, accept_encodings):
+        for encoding, _ in ENCODINGS:
+            if encoding in self.bodies and encoding in accept_encodings:
+                return encoding
+        return None
+
+
+class AssetServer:
+    """Responses for the files under root, loaded on first request."""
+
+    def __init__(self, root):
+        self.root = root
+        self._assets = {}
+        self._hashed = set()
+        self._cached_bytes = 0
+        self._build = None
+        self._lock = threading.Lock()
+
+    def _check_build(self):
+        """Drop everything loaded from an older build."""
+        try:
+            build = os.stat(os.path.join(self.root, INDEX)).st_mtime_ns
+        except OSError:
+            build = None
+        if build == self._build:
+            return
+        with self._lock:
+            self._assets.clear()
+            self._cached_bytes = 0
+            self._hashed = set()
+            try:
+                with open(os.path.join(self.root, MANIFEST)) as f:
+                    self._hashed = {path.lstrip('/') for path in json.load(f).get('files', {}).values()}
+            except (OSError, ValueError):
+                pass
+            self._build = build
+
+    def _cache_control(self, path):
+        if path == INDEX:
+            return REVALIDATE
+        if path in self._hashed or HASHED.search(path):
+            return IMMUTABLE
+        return SHORT
+
+    def _load(self, path, full_path):
+        stat = os.stat(full_path)
+        extension = os.path.splitext(path)[1]
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        bodies = {None: full_path}
+        for encoding, suffix in ENCODINGS:
+            sibling = full_path + suffix
+            # A sibling older than its file is left over from a previous build
+            if os.path.isfile(sibling) and os.stat(sibling).st_mtime_ns >= stat.st_mtime_ns:
+                bodies[encoding] = sibling
+
+        cache = stat.st_size <= CACHE_FILE_BYTES and self._cached_bytes + stat.st_size <= CACHE_BYTES
+        if cache:
+            bodies = {encoding: _read(body) for encoding, body in bodies.items()}
+            if 'gzip' not in bodies and extension in COMPRESSIBLE and stat.st_size >= MIN_COMPRESS_BYTES:
+                compressed = gzip.compress(bodies[None], 9)
+                if len(compressed) < stat.st_size:
+                    bodies['gzip'] = compressed
+            self._cached_bytes += sum(len(body) for body in bodies.values())
+            etag = hashlib.sha1(bodies[None]).hexdigest()[:20]
+        else:
+            etag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+        return Asset(content_type, self._cache_control(path), etag, bodies)
+
+    def get(self, path):
+        """The Asset of a file under root, or None if there is no such file."""
+        asset = self._assets.get(path)
+        if asset is not None:
+            return asset
+        full_path = safe_join(self.root, path)
+        if full_path is None or not os.path.isfile(full_path):
+            return None
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is None:
+                asset = self._assets[path] = self._load(path, full_path)
+        return asset
+
+    def response(self, path, request):
+        """Response for a request path (without the leading /), or None for a missing file."""
+        self._check_build()
+        path = path or INDEX
+        asset = self.get(path)
+        if asset is None:
+            if os.path.splitext(path)[1]:
+                return None
+            asset = self.get(INDEX)
+            if asset is None:
+                return None
+
+        encoding = asset.encoding_for(request.accept_encodings)
+        body = asset.bodies[encoding]
+        etag = asset.etag if encoding is None else f'{asset.etag}-{encoding}'
+        if isinstance(body, bytes):
+            response = Response(body, mimetype=asset.content_type)
+            response.set_etag(etag)
+        else:
+            response = send_file(body, mimetype=asset.content_type, etag=etag, conditional=False)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        if len(asset.bodies) > 1:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = asset.cache_control
+        return response.make_conditional(request)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
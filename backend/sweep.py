@@ -0,0 +1,213 @@
+"""Parameter sweep over TradingBot settings.
+
+Signals and indicators are computed once, written to ``.npy`` files and
+memory-mapped read-only by every worker in a process pool, so each worker only
+runs the cheap portfolio simulation of ``backtest.simulate`` per configuration.
+
+Usage:
+    python sweep.py run --data-dir bars --out sweep_results.csv
+    python sweep.py run --samples 5000 --range profit_target_percentage=1:15
+    python sweep.py apply sweep_results.csv --rank 1
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import SignalSet, SETTING_NAMES, load_histories, prepare_signals, simulate
+from history import load_symbols
+
+DEFAULT_GRID = {
+    'profit_target_percentage': [2.0, 3.0, 5.0, 8.0, 10.0],
+    'stop_loss_percentage': [1.0, 2.0, 3.0, 5.0],
+    'max_investment_per_trade': [2000.0, 5000.0, 10000.0],
+    'max_trades_per_day': [2, 5, 10],
+    'max_open_positions': [3, 5, 10, 20],
+}
+
+DEFAULT_RANGES = {
+    'profit_target_percentage': (1.0, 15.0),
+    'stop_loss_percentage': (0.5, 10.0),
+    'max_investment_per_trade': (1000.0, 20000.0),
+    'max_trades_per_day': (1, 20),
+    'max_open_positions': (1, 40),
+}
+
+INTEGER_SETTINGS = {'max_trades_per_day', 'max_open_positions'}
+
+_signals = None
+_initial_cash = None
+
+
+def save_signals(signals, directory):
+    """Write a SignalSet as plain arrays that workers can memory-map."""
+    np.save(os.path.join(directory, 'close.npy'), signals.close)
+    np.save(os.path.join(directory, 'signal.npy'), signals.signal)
+    np.save(os.path.join(directory, 'dates.npy'), signals.dates.asi8)
+    with open(os.path.join(directory, 'symbols.json'), 'w') as f:
+        json.dump(signals.symbols, f)
+
+
+def load_signals(directory):
+    with open(os.path.join(directory, 'symbols.json')) as f:
+        symbols = json.load(f)
+    return SignalSet(
+        symbols,
+        pd.DatetimeIndex(np.load(os.path.join(directory, 'dates.npy'))),
+        np.load(os.path.join(directory, 'close.npy'), mmap_mode='r'),
+        np.load(os.path.join(directory, 'signal.npy'), mmap_mode='r'),
+    )
+
+
+def _init_worker(directory, initial_cash):
+    global _signals, _initial_cash
+    _signals = load_signals(directory)
+    _initial_cash = initial_cash
+
+
+def _evaluate(settings):
+    result = simulate(_signals, settings, _initial_cash, record_trades=False)
+    return dict(settings,
+                return_pct=round(result.total_return * 100, 2),
+                max_drawdown_pct=round(result.max_drawdown * 100, 2),
+                trades=result.trade_count)
+
+
+def _parse_values(name, text):
+    cast = int if name in INTEGER_SETTINGS else float
+    return [cast(value) for value in text.split(',')]
+
+
+def grid_configs(overrides):
+    """Cartesian product of DEFAULT_GRID with any overridden value lists."""
+    grid = dict(DEFAULT_GRID, **overrides)
+    return [dict(zip(SETTING_NAMES, values)) for values in itertools.product(*(grid[n] for n in SETTING_NAMES))]
+
+
+def random_configs(samples, ranges, seed):
+    """Uniform random settings within each range."""
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(samples):
+        config = {}
+        for name in SETTING_NAMES:
+            low, high = ranges[name]
+            if name in INTEGER_SETTINGS:
+                config[name] = rng.randint(int(low), int(high))
+            else:
+                config[name] = round(rng.uniform(low, high), 2)
+        configs.append(config)
+    return configs
+
+
+def run_sweep(signals, configs, initial_cash, workers):
+    """Evaluate every configuration in a process pool sharing the mapped signals."""
+    with tempfile.TemporaryDirectory(prefix='sweep-') as directory:
+        save_signals(signals, directory)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(directory, initial_cash)) as executor:
+            chunksize = max(1, len(configs) // (workers * 8))
+            rows = list(executor.map(_evaluate, configs, chunksize=chunksize))
+    results = pd.DataFrame(rows)
+    results = results.sort_values(['return_pct', 'max_drawdown_pct'], ascending=[False, False])
+    results.insert(0, 'rank', range(1, len(results) + 1))
+    return results.reset_index(drop=True)
+
+
+def apply_settings(settings, account_id=None):
+    """Store settings on an account's TradingBot row (the default account's if none is given)."""
+    from datetime import datetime
+    from app import Session, DEFAULT_ACCOUNT, ensure_account
+
+    session = Session()
+    try:
+        _, bot = ensure_account(session, account_id or DEFAULT_ACCOUNT)
+        for name in SETTING_NAMES:
+            setattr(bot, name, settings[name])
+        bot.last_updated = datetime.now()
+        session.commit()
+    finally:
+        session.close()
+
+
+def command_run(args):
+    overrides = {}
+    for spec in args.grid or []:
+        name, _, values = spec.partition('=')
+        overrides[name] = _parse_values(name, values)
+    ranges = dict(DEFAULT_RANGES)
+    for spec in args.range or []:
+        name, _, bounds = spec.partition('=')
+        low, high = bounds.split(':')
+        ranges[name] = (float(low), float(high))
+    configs = random_configs(args.samples, ranges, args.seed) if args.samples else grid_configs(overrides)
+
+    started = time.time()
+    histories = load_histories(args.symbols or load_symbols(), args.years, args.data_dir)
+    signals = prepare_signals(histories)
+    prepared = time.time()
+    results = run_sweep(signals, configs, args.cash, args.workers)
+    finished = time.time()
+
+    print(f"\n{'='*60}")
+    print(f"Evaluated {len(configs)} configurations over {len(signals.symbols)} symbols "
+          f"and {len(signals.dates)} days")
+    print(f"Signals {prepared - started:.2f}s, sweep {finished - prepared:.2f}s "
+          f"({len(configs) / max(finished - prepared, 1e-9):.0f} configs/s on {args.workers} workers)")
+    print(f"{'='*60}")
+    print(results.head(args.top).to_string(index=False))
+    results.to_csv(args.out, index=False)
+    print(f"\nFull ranking written to {args.out}. Apply one with: python sweep.py apply {args.out} --rank N")
+
+
+def command_apply(args):
+    results = pd.read_csv(args.results)
+    row = results[results['rank'] == args.rank]
+    if row.empty:
+        print(f"No configuration with rank {args.rank} in {args.results}")
+        return 1
+    settings = {name: (int if name in INTEGER_SETTINGS else float)(row.iloc[0][name]) for name in SETTING_NAMES}
+    apply_settings(settings, args.account)
+    print(f"Trading bot settings updated: {settings}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep TradingBot settings over historical data')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Evaluate a grid or random sample of settings')
+    run.add_argument('--years', type=float, default=5)
+    run.add_argument('--cash', type=float, default=100000.0)
+    run.add_argument('--symbols', nargs='*')
+    run.add_argument('--data-dir', help='Directory of recorded <SYMBOL>.csv bars')
+    run.add_argument('--grid', action='append', metavar='NAME=V1,V2',
+                     help='Replace the default grid values of one setting')
+    run.add_argument('--samples', type=int, help='Evaluate this many random settings instead of the grid')
+    run.add_argument('--range', action='append', metavar='NAME=LOW:HIGH', help='Sampling range of one setting')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    run.add_argument('--top', type=int, default=20, help='Rows of the ranking to print')
+    run.add_argument('--out', default='sweep_results.csv')
+    run.set_defaults(func=command_run)
+
+    apply = commands.add_parser('apply', help='Store a ranked configuration as the live bot settings')
+    apply.add_argument('results', help='CSV written by the run command')
+    apply.add_argument('--rank', type=int, default=1)
+    apply.add_argument('--account', help='Account whose bot gets the settings (default: the default account)')
+    apply.set_defaults(func=command_apply)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
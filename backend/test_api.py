@@ -1,4 +1,8 @@
+import os
+import sys
+import time
 import unittest
+import subprocess
 import requests
 
 class TestAPI(unittest.TestCase):
@@ -27,5 +31,107 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIsInstance(response.json(), list)
 
+    def test_risk(self):
+        response = requests.get(f'{self.BASE_URL}/api/risk?confidence=0.99')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIn('positions', data)
+        self.assertIn('portfolio_value', data)
+
+    def test_metrics(self):
+        requests.get(f'{self.BASE_URL}/api/stocks')
+        response = requests.get(f'{self.BASE_URL}/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('stock_trader_http_request_seconds_count{method="GET",route="/api/stocks"', response.text)
+
+    def test_accounts_are_separate(self):
+        account = {'X-Account-Id': 'test-account'}
+        before = requests.get(f'{self.BASE_URL}/api/wallet').json()['balance']
+        response = requests.post(f'{self.BASE_URL}/api/wallet/deposit', json={'amount': 100}, headers=account)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(requests.get(f'{self.BASE_URL}/api/wallet').json()['balance'], before)
+        response = requests.get(f'{self.BASE_URL}/api/wallet', headers={'X-Account-Id': 'not valid'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_orders(self):
+        account = {'X-Account-Id': 'test-orders'}
+        requests.post(f'{self.BASE_URL}/api/wallet/deposit', json={'amount': 1000}, headers=account)
+        payload = {'symbol': 'RELIANCE', 'side': 'buy', 'type': 'limit', 'quantity': 1, 'trigger_price': 1}
+        response = requests.post(f'{self.BASE_URL}/api/orders', json=payload, headers=account)
+        self.assertEqual(response.status_code, 200)
+        order_id = response.json()['id']
+        response = requests.delete(f'{self.BASE_URL}/api/orders/{order_id}', headers=account)
+        self.assertEqual(response.json()['status'], 'cancelled')
+        payload['type'] = 'take_profit'
+        response = requests.post(f'{self.BASE_URL}/api/orders', json=payload, headers=account)
+        self.assertEqual(response.status_code, 400)
+
+    def test_probes(self):
+        self.assertEqual(requests.get(f'{self.BASE_URL}/healthz').status_code, 200)
+        response = requests.get(f'{self.BASE_URL}/readyz')
+        self.assertIn(response.status_code, (200, 503))
+        self.assertEqual(response.json()['ready'], response.status_code == 200)
+
+class TestOrderFills(unittest.TestCase):
+    """Drives the order engine in-process: price moves fill resting orders through the ledger."""
+
+    def test_price_moves_fill_orders(self):
+        import app
+        client = app.app.test_client()
+        account = {'X-Account-Id': f'test-fills-{int(time.time() * 1000)}'}
+        client.post('/api/wallet/deposit', json={'amount': 10000}, headers=account)
+        client.post('/api/trade', json={'symbol': 'TCS', 'action': 'buy', 'quantity': 10, 'current_price': 100},
+                    headers=account)
+        app.quote_table.update('TCS', {'symbol': 'TCS', 'price': 100.0})
+        limit = client.post('/api/orders', json={'symbol': 'TCS', 'side': 'sell', 'type': 'limit', 'quantity': 4,
+                                                 'trigger_price': 108}, headers=account).json
+        trailing = client.post('/api/orders', json={'symbol': 'TCS', 'side': 'sell', 'type': 'trailing_stop',
+                                                    'quantity': 6, 'trail_percent': 5}, headers=account).json
+        self.assertEqual(client.post('/api/orders', data='{', content_type='application/json',
+                                     headers=account).status_code, 400)
+
+        session = app.Session()
+        try:
+            for price in (105, 110, 104.4):
+                app.fill_orders('TCS', price, session)
+        finally:
+            session.close()
+
+        placed = {order['id']: order for order in client.get('/api/orders', headers=account).json}
+        self.assertEqual((placed[limit['id']]['status'], placed[limit['id']]['fill_price']), ('filled', 110))
+        trailing = placed[trailing['id']]
+        self.assertEqual((trailing['status'], trailing['fill_price']), ('filled', 104.4))
+        self.assertEqual((trailing['peak_price'], trailing['trigger_price']), (110, 104.5))
+        self.assertEqual(client.get('/api/portfolio', headers=account).json, [])
+        self.assertAlmostEqual(client.get('/api/wallet', headers=account).json['balance'],
+                               10000 - 1000 + 4 * 110 + 6 * 104.4)
+
+
+class TestServer(unittest.TestCase):
+    """Starts server.py (gevent) on its own port and waits for the startup warm-up to finish."""
+    PORT = 5001
+
+    def test_gevent_server_becomes_ready(self):
+        # A timeout longer than the deadline, so a stuck warm-up shows up as a failure instead of timed_out
+        env = dict(os.environ, PORT=str(self.PORT), WARMUP_TIMEOUT='600')
+        server = subprocess.Popen([sys.executable, 'server.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            status = None
+            deadline = time.monotonic() + 180
+            while time.monotonic() < deadline:
+                try:
+                    status = requests.get(f'http://localhost:{self.PORT}/readyz', timeout=5).json()
+                except requests.ConnectionError:
+                    pass
+                if status and status['ready']:
+                    break
+                time.sleep(1)
+            self.assertEqual(status and status['phase'], 'ready', status)
+            self.assertEqual(requests.get(f'http://localhost:{self.PORT}/api/stocks').status_code, 200)
+        finally:
+            server.terminate()
+            server.wait()
+
 if __name__ == '__main__':
     unittest.main()
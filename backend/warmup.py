@@ -0,0 +1,109 @@
+"""Startup warm-up of the per-symbol caches, and the readiness state behind /readyz.
+
+After a restart every cache is cold: the first request or loop pass for a
+symbol waits for a year of bars, a model load and a full indicator run. The
+warm-up does all of that for the hot set up front, on WORKERS threads (greenlets
+under gevent, where patched locks hang native threads; see offload.py). Held
+symbols go first. Until it is done, ``ready`` is False. /readyz returns 503,
+so a load balancer or Kubernetes keeps sending traffic to the old instance,
+and API requests that reach this one are turned away with a Retry-After.
+
+A symbol without data counts as failed and does not hold up readiness. A
+warm-up that is still running after ``timeout`` seconds is declared ready
+anyway, so one hung download cannot keep an instance out of rotation forever.
+Before ``start`` is called (tests, replay, benchmarks) the state is ready.
+"""
+import time
+import logging
+import threading
+
+import offload
+
+WORKERS = 8
+TIMEOUT = 120.0
+
+log = logging.getLogger('trader.warmup')
+
+
+class Warmup:
+    """Progress of warming symbols in parallel with warm(symbol), which returns False if it has no data.
+
+    The coordinator and workers are started with offload.spawn, so under gevent they are greenlets.
+    """
+
+    def __init__(self, warm, workers=WORKERS, timeout=TIMEOUT):
+        self.warm = warm
+        self.workers = workers
+        self.timeout = timeout
+        self.phase = 'idle'
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.started_at = None
+        self.finished_at = None
+        self._pending = []
+        self._all_done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.phase in ('idle', 'ready', 'timed_out')
+
+    def start(self, symbols, on_ready=None):
+        """Warm symbols in the background; on_ready() runs once they are done or the timeout passed."""
+        with self._lock:
+            if self.phase != 'idle':
+                return
+            self._pending = list(dict.fromkeys(symbols))
+            self.total = len(self._pending)
+            self.phase = 'warming'
+            self.started_at = time.monotonic()
+        log.info("Warming %s symbols on %s threads", self.total, self.workers)
+        offload.spawn(self._run, on_ready, name='warmup')
+
+    def _run(self, on_ready):
+        if self.total:
+            for index in range(min(self.workers, self.total)):
+                offload.spawn(self._work, name=f'warmup-{index}')
+            finished = self._all_done.wait(self.timeout)
+        else:
+            finished = True
+        with self._lock:
+            self.phase = 'ready' if finished else 'timed_out'
+            self.finished_at = time.monotonic()
+        if finished:
+            log.info("Warm-up done in %.1fs: %s symbols, %s without data",
+                     self.finished_at - self.started_at, self.done, self.failed)
+        else:
+            log.warning("Warm-up timed out after %.0fs with %s of %s symbols done; serving anyway",
+                        self.timeout, self.done + self.failed, self.total)
+        if on_ready is not None:
+            on_ready()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                symbol = self._pending.pop(0)
+            try:
+                warmed = self.warm(symbol)
+            except Exception as e:
+                log.warning("Warm-up of %s failed: %s", symbol, e, extra={'symbol': symbol})
+                warmed = False
+            with self._lock:
+                if warmed:
+                    self.done += 1
+                else:
+                    self.failed += 1
+                if self.done + self.failed == self.total:
+                    self._all_done.set()
+
+    def status(self):
+        with self._lock:
+            if self.started_at is None:
+                elapsed = None
+            else:
+                elapsed = round((self.finished_at or time.monotonic()) - self.started_at, 2)
+            return {'ready': self.ready, 'phase': self.phase, 'symbols': self.total, 'warmed': self.done,
+                    'without_data': self.failed, 'elapsed_seconds': elapsed}
@@ -0,0 +1,53 @@
+"""Compact encodings for REST responses and Socket.IO events.
+
+JSON stays the default. Two things make payloads smaller:
+
+- MessagePack, for clients that send ``Accept: application/msgpack``. Chart and
+  candle series are sent as columns (``{"date": [...], "close": [...]}``)
+  instead of one object per row, so the field names appear once, not once per
+  row. Floats are packed as 32-bit, about 7 significant digits, which is
+  plenty for prices and indicators shown to 2 decimals.
+- gzip, for any JSON, MessagePack or text response over MIN_COMPRESS_BYTES
+  when the client sends ``Accept-Encoding: gzip``. Browsers do that by default.
+
+MessagePack is optional: without the ``msgpack`` package, every client gets JSON.
+"""
+import gzip
+
+try:
+    import msgpack
+except ImportError:  # optional dependency; JSON only
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+MIN_COMPRESS_BYTES = 1024
+COMPRESS_LEVEL = 5
+COMPRESSIBLE = (JSON, MSGPACK, 'text/')
+
+
+def available():
+    return msgpack is not None
+
+
+def wants_msgpack(accept_mimetypes):
+    """True if the request prefers MessagePack over JSON and it can be produced."""
+    return msgpack is not None and accept_mimetypes.best_match([JSON, MSGPACK]) == MSGPACK
+
+
+def packb(payload):
+    return msgpack.packb(payload, use_single_float=True)
+
+
+def compress(response, accept_encodings):
+    """gzip a large response body in place if the client accepts it and it is not encoded yet."""
+    if (response.direct_passthrough or response.status_code != 200 or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE) or 'gzip' not in accept_encodings):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+    response.set_data(gzip.compress(body, COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -7,6 +7,7 @@ import PortfolioTable from './components/PortfolioTable';
 import Wallet from './components/Wallet';
 import TradingBot from './components/TradingBot';
 import TransactionHistory from './components/TransactionHistory';
+import { subscribeStockUpdates } from './stockStream';
 import { FaSun, FaMoon, FaRobot, FaChartLine, FaWallet, FaHistory, FaBriefcase, FaInfoCircle } from 'react-icons/fa';
 import { Tooltip } from 'react-tooltip';
 
@@ -54,25 +55,46 @@ function App() {
           setSelectedStock(response.data[0].symbol);
         }
         setLoading(false);
+        // Latest prices and signals for every stock in one request
+        return axios.get('http://localhost:5000/api/quotes');
+      })
+      .then(response => {
+        if (!response) return;
+        const { quotes } = response.data;
+        setStocks(prevStocks =>
+          prevStocks.map(stock =>
+            quotes[stock.symbol]
+              ? { ...stock, price: quotes[stock.symbol].price, signal: quotes[stock.symbol].signal }
+              : stock
+          )
+        );
       })
       .catch(error => {
         console.error('Error fetching stocks:', error);
         setLoading(false);
       });
+  }, []);
 
-    socket.on('stock_update', (data) => {
-      console.log('Received stock update:', data);
+  // Live prices and signals for the listed stocks
+  const symbolList = stocks.map(stock => stock.symbol).join(',');
+  useEffect(() => {
+    if (!symbolList) return undefined;
+    const unsubscribe = subscribeStockUpdates(socket, symbolList.split(','), (changes) => {
       setStocks(prevStocks =>
-        prevStocks.map(stock =>
-          stock.symbol === data.symbol
-            ? { ...stock, price: data.current_price, signal: data.signal }
-            : stock
-        )
+        prevStocks.map(stock => {
+          const change = changes[stock.symbol];
+          if (!change) return stock;
+          return {
+            ...stock,
+            price: change.current_price !== undefined ? change.current_price : stock.price,
+            signal: change.signal !== undefined ? change.signal : stock.signal
+          };
+        })
       );
     });
 
-    return () => socket.off('stock_update');
-  }, []);
+    return unsubscribe;
+  }, [symbolList]);
 
   const handleTrade = (symbol, action, currentPrice) => {
     const quantity = prompt(`Enter quantity to ${action}:`);
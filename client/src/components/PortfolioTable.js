@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import io from 'socket.io-client';
 import { FaInfoCircle } from 'react-icons/fa';
+import { subscribeStockUpdates } from '../stockStream';
 
 const socket = io('http://localhost:5000', {
   reconnection: true,
@@ -63,13 +64,6 @@ function PortfolioTable({ selectedSymbol, stocks = [], showSummary = false, summ
   useEffect(() => {
     fetchPortfolio();
 
-    socket.on('stock_update', (data) => {
-      setCurrentPrices(prev => ({ ...prev, [data.symbol]: data.current_price }));
-      if (data.previous_day_price) {
-        setPreviousDayPrices(prev => ({ ...prev, [data.symbol]: data.previous_day_price }));
-      }
-    });
-    
     // Listen for trade events to update portfolio
     socket.on('trade_executed', (data) => {
       console.log('Trade executed, updating portfolio:', data);
@@ -80,12 +74,27 @@ function PortfolioTable({ selectedSymbol, stocks = [], showSummary = false, summ
     const intervalId = setInterval(fetchPortfolio, 30000);
 
     return () => {
-      socket.off('stock_update');
       socket.off('trade_executed');
       clearInterval(intervalId);
     };
   }, []);
 
+  // Live prices for the symbols held
+  const heldSymbols = [...new Set(portfolio.map(entry => entry.symbol))].sort().join(',');
+  useEffect(() => {
+    if (!heldSymbols) return undefined;
+    return subscribeStockUpdates(socket, heldSymbols.split(','), (changes) => {
+      const prices = {};
+      const previousPrices = {};
+      Object.entries(changes).forEach(([symbol, change]) => {
+        if (change.current_price !== undefined) prices[symbol] = change.current_price;
+        if (change.previous_day_price) previousPrices[symbol] = change.previous_day_price;
+      });
+      setCurrentPrices(prev => ({ ...prev, ...prices }));
+      setPreviousDayPrices(prev => ({ ...prev, ...previousPrices }));
+    });
+  }, [heldSymbols]);
+
   // Calculate total portfolio value and P&L
   const calculateTotals = () => {
     let totalInvestment = 0;
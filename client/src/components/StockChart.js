@@ -7,6 +7,11 @@ import { FaInfoCircle } from 'react-icons/fa';
 
 ChartJS.register(LineElement, PointElement, LinearScale, TimeScale, Title, ChartTooltip, Legend);
 
+// Chart ranges; the server downsamples each to at most CHART_POINTS points
+const PERIODS = ['3mo', '6mo', '1y', '5y', 'max'];
+const TIME_UNITS = { '3mo': 'week', '6mo': 'month', '1y': 'month', '5y': 'year', max: 'year' };
+const CHART_POINTS = 400;
+
 function StockChart({ symbol }) {
   const [stockData, setStockData] = useState([]);
   const [currentPrice, setCurrentPrice] = useState(0);
@@ -14,6 +19,7 @@ function StockChart({ symbol }) {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [showChart, setShowChart] = useState(true);
+  const [period, setPeriod] = useState('6mo');
 
   useEffect(() => {
     if (!symbol) return;
@@ -21,7 +27,9 @@ function StockChart({ symbol }) {
     setLoading(true);
     setError(null);
     
-    axios.get(`http://localhost:5000/api/stock/${symbol}`)
+    axios.get(`http://localhost:5000/api/stock/${symbol}`, {
+      params: { period, points: CHART_POINTS, fields: 'close,sma50' }
+    })
       .then(response => {
         console.log(`Stock data for ${symbol}:`, response.data);
         setStockData(response.data.prices || []);
@@ -34,7 +42,7 @@ function StockChart({ symbol }) {
         setError(`Failed to load data for ${symbol}`);
         setLoading(false);
       });
-  }, [symbol]);
+  }, [symbol, period]);
 
   const chartData = {
     labels: stockData.map(d => d.date),
@@ -60,7 +68,7 @@ function StockChart({ symbol }) {
     scales: {
       x: { 
         type: 'time', 
-        time: { unit: 'day' },
+        time: { unit: TIME_UNITS[period] },
         grid: {
           color: 'rgba(0, 0, 0, 0.1)'
         }
@@ -180,6 +188,14 @@ function StockChart({ symbol }) {
               data-tooltip-content="Trading signal generated by our AI algorithm based on technical analysis indicators"
             />
           </p>
+          <select
+            value={period}
+            onChange={e => setPeriod(e.target.value)}
+            className="mr-2 border rounded px-2 py-1 text-black"
+            aria-label="Chart range"
+          >
+            {PERIODS.map(p => <option key={p} value={p}>{p}</option>)}
+          </select>
           <button 
             onClick={() => setShowChart(!showChart)}
             className="bg-blue-500 hover:bg-blue-600 text-white px-3 py-1 rounded"
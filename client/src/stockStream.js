@@ -0,0 +1,35 @@
+// Subscribes to symbols and decodes the server's stock_snapshot and stock_updates
+// messages. Both carry {seq, u: {SYMBOL: {p: price, c: previous close, s: signal}}},
+// with only the changed fields in an update.
+const FIELDS = { p: 'current_price', c: 'previous_day_price', s: 'signal' };
+
+const decode = (updates) => {
+  const changes = {};
+  Object.entries(updates).forEach(([symbol, fields]) => {
+    changes[symbol] = {};
+    Object.entries(fields).forEach(([key, value]) => {
+      changes[symbol][FIELDS[key]] = value;
+    });
+  });
+  return changes;
+};
+
+// Calls onChanges({SYMBOL: {current_price, ...}}) with a snapshot of symbols and then
+// with every batch of changes to them. Subscriptions are renewed after a reconnect.
+// Returns a function that unsubscribes and removes the listeners.
+export const subscribeStockUpdates = (socket, symbols, onChanges) => {
+  const handleChanges = (message) => onChanges(decode(message.u));
+  const subscribe = () => socket.emit('subscribe', { symbols });
+
+  socket.on('stock_snapshot', handleChanges);
+  socket.on('stock_updates', handleChanges);
+  socket.on('connect', subscribe);
+  if (socket.connected) subscribe();
+
+  return () => {
+    socket.emit('unsubscribe', { symbols });
+    socket.off('stock_snapshot', handleChanges);
+    socket.off('stock_updates', handleChanges);
+    socket.off('connect', subscribe);
+  };
+};